@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像编码性能测试脚本
+比较各格式在OpenCV默认参数和fast/balanced/archival编码配置下的编码耗时、吞吐量和文件大小，
+用于选择连续拍照的保存格式与编码配置
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from hikvision_camera_controller_linux import ENCODE_PROFILES, encode_params
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "../calibration/20250910_232046/undistorted_samples/undistorted_1.jpg")
+FORMATS = ('jpg', 'png', 'webp', 'tiff', 'bmp')
+
+
+def run(name, image, extension, params, frames, workers):
+    """编码frames次，返回并打印每帧耗时、帧率和文件大小"""
+    ok, data = cv2.imencode(extension, image, params)
+    if not ok:
+        print(f"  {name:<22} 编码失败")
+        return None
+    
+    encode = lambda _: cv2.imencode(extension, image, params)
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(encode, range(frames)))
+    else:
+        for index in range(frames):
+            encode(index)
+    elapsed = (time.perf_counter() - start) / frames
+    print(f"  {name:<22} {elapsed * 1000:8.2f} ms/帧 {1 / elapsed:8.1f} fps {len(data) / 1024:9.1f} KB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图像编码性能测试')
+    parser.add_argument('--image', type=str, default=DEFAULT_IMAGE,
+                       help='测试图像，默认使用校准目录中的去畸变样本')
+    parser.add_argument('--width', type=int, default=1440, help='图像缩放到的宽度，默认1440')
+    parser.add_argument('--height', type=int, default=1080, help='图像缩放到的高度，默认1080')
+    parser.add_argument('--mono', action='store_true', help='使用单通道图像（默认BGR）')
+    parser.add_argument('--formats', type=str, nargs='+', default=list(FORMATS), choices=FORMATS,
+                       help='测试的格式，默认全部')
+    parser.add_argument('--frames', type=int, default=20, help='每种组合编码的帧数，默认20')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='并行编码线程数（与--writer-threads对应），默认1')
+    args = parser.parse_args()
+    
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"无法读取图像: {args.image}")
+        sys.exit(1)
+    image = cv2.resize(image, (args.width, args.height))
+    if args.mono:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = np.ascontiguousarray(image)
+    
+    print(f"图像: {args.width}x{args.height} {'Mono8' if args.mono else 'BGR8'}, CPU核数: {os.cpu_count()}, "
+          f"编码线程: {args.workers}, 帧数: {args.frames}")
+    for format in args.formats:
+        print(f"{format}:")
+        extension = f".{format}"
+        run('OpenCV默认参数', image, extension, [], args.frames, args.workers)
+        for profile in ENCODE_PROFILES:
+            run(profile, image, extension, encode_params(format, profile), args.frames, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线相机标定脚本
+从拍摄的棋盘格图像目录或录像文件（与--replay相同的回放源）中检测角点并标定，
+输出与calibration/目录下相同格式的 calibration_result.json、camera_parameters.xml 和 report.txt
+
+角点检测在多进程中并行：先在缩小的金字塔层上粗定位棋盘格，再回到原始分辨率做亚像素精化
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from hikvision_camera_controller_linux import CameraCalibration, ReplaySource
+
+DEFAULT_OUTPUT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../calibration")
+
+# 粗定位使用的检测标志，FAST_CHECK让不含棋盘格的图像快速返回
+DETECT_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+SAMPLE_COUNT = 5
+
+
+def _init_worker():
+    # 并行由进程池提供，每个进程内OpenCV只用一个线程，避免线程过度订阅
+    cv2.setNumThreads(1)
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def find_corners(gray, pattern_size, detect_width):
+    """在金字塔层上检测棋盘格角点并在原图上亚像素精化，未找到时返回None
+    
+    图像宽度大于detect_width时逐级pyrDown后检测，缩小图上未找到再在原图上检测一次
+    """
+    levels = [gray]
+    while levels[-1].shape[1] > detect_width and min(levels[-1].shape[:2]) >= 2 * max(pattern_size):
+        levels.append(cv2.pyrDown(levels[-1]))
+    
+    corners = None
+    for level in sorted({len(levels) - 1, 0}, reverse=True):
+        found, corners = cv2.findChessboardCorners(levels[level], pattern_size, DETECT_FLAGS)
+        if found:
+            # pyrDown每级缩小一半，像素中心 x -> (x + 0.5) * 2 - 0.5
+            scale = 2 ** level
+            corners = (corners + 0.5) * scale - 0.5
+            break
+    else:
+        return None
+    
+    # 精化窗口不超过相邻角点间距的一半，且能覆盖粗定位的误差
+    spacing = np.linalg.norm(np.diff(corners.reshape(-1, 2), axis=0), axis=1).min()
+    half = int(np.clip(spacing * 0.4, 3, 11))
+    corners = cv2.cornerSubPix(gray, corners.astype(np.float32), (half, half), (-1, -1), SUBPIX_CRITERIA)
+    return corners
+
+
+def _detect(name, image, pattern_size, detect_width):
+    """进程池任务：image为图像路径或图像，返回 (名称, 角点或None, (宽, 高))"""
+    if isinstance(image, str):
+        image = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return name, None, None
+    gray = _to_gray(image)
+    return name, find_corners(gray, pattern_size, detect_width), (gray.shape[1], gray.shape[0])
+
+
+def iter_sources(source, step):
+    """依次产生 (名称, 图像路径或图像)；目录直接交给子进程读取，录像文件每step帧取一帧"""
+    replay = ReplaySource(source)
+    if replay.files is not None:
+        for path in replay.files:
+            yield os.path.basename(path), path
+        return
+    
+    for index, (image, _) in enumerate(replay.frames()):
+        if index % step == 0:
+            yield f"frame_{index:06d}", _to_gray(image)
+
+
+def detect_all(source, pattern_size, detect_width, workers, step):
+    """并行检测所有图像，返回 [(名称, 角点)]（按输入顺序）、图像尺寸和处理的图像数"""
+    results = {}
+    order = []
+    image_size = None
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        
+        def collect(future):
+            nonlocal image_size
+            name, corners, size = future.result()
+            if size is None:
+                print(f"  跳过无法读取的图像: {name}")
+                return
+            if image_size is None:
+                image_size = size
+            if size != image_size:
+                print(f"  跳过尺寸不一致的图像: {name} ({size[0]}x{size[1]})")
+                return
+            print(f"  {name}: {'找到角点' if corners is not None else '未找到棋盘格'}")
+            if corners is not None:
+                results[name] = corners
+        
+        # 限制在途任务数，录像文件解码的帧不会在内存中堆积
+        for name, image in iter_sources(source, step):
+            order.append(name)
+            pending.append(pool.submit(_detect, name, image, pattern_size, detect_width))
+            if len(pending) >= max_pending:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    
+    return [(name, results[name]) for name in order if name in results], image_size, len(order)
+
+
+def calibrate(detections, pattern_size, square_size, image_size):
+    """标定相机，返回标定结果字典"""
+    object_points = np.zeros((pattern_size[0] * pattern_size[1], 3), np.float32)
+    object_points[:, :2] = np.mgrid[0:pattern_size[0], 0:pattern_size[1]].T.reshape(-1, 2) * square_size
+    
+    image_points = [corners for _, corners in detections]
+    all_object_points = [object_points] * len(image_points)
+    reprojection_error, camera_matrix, distortion, rvecs, tvecs = cv2.calibrateCamera(
+        all_object_points, image_points, image_size, None, None)
+    
+    individual_errors = []
+    for corners, rvec, tvec in zip(image_points, rvecs, tvecs):
+        projected, _ = cv2.projectPoints(object_points, rvec, tvec, camera_matrix, distortion)
+        # 与OpenCV标定教程相同：所有角点残差的L2范数除以角点数
+        individual_errors.append(float(np.linalg.norm(corners.reshape(-1, 2) - projected.reshape(-1, 2)))
+                                 / len(projected))
+    
+    return {
+        'camera_matrix': camera_matrix,
+        'distortion_coefficients': distortion.ravel(),
+        'reprojection_error': reprojection_error,
+        'mean_error': float(np.mean(individual_errors)),
+        'individual_errors': individual_errors,
+    }
+
+
+def save_results(output_dir, result, detections, pattern_size, square_size, image_size, date):
+    """保存JSON、XML和文本报告，返回JSON文件路径"""
+    os.makedirs(output_dir, exist_ok=True)
+    camera_matrix = result['camera_matrix']
+    distortion = result['distortion_coefficients']
+    k1, k2, p1, p2, k3 = distortion[:5]
+    
+    data = {
+        'calibration_info': {
+            'date': date.isoformat(),
+            'pattern_size': list(pattern_size),
+            'square_size': square_size,
+            'num_images': len(detections),
+            'image_size': list(image_size),
+        },
+        'camera_matrix': camera_matrix.tolist(),
+        'distortion_coefficients': distortion.tolist(),
+        'reprojection_error': result['reprojection_error'],
+        'mean_error': result['mean_error'],
+        'individual_errors': result['individual_errors'],
+        'camera_parameters': {
+            'fx': camera_matrix[0, 0], 'fy': camera_matrix[1, 1],
+            'cx': camera_matrix[0, 2], 'cy': camera_matrix[1, 2],
+            'k1': k1, 'k2': k2, 'p1': p1, 'p2': p2, 'k3': k3,
+        },
+        'valid_images': [name for name, _ in detections],
+    }
+    json_path = os.path.join(output_dir, 'calibration_result.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    
+    fs = cv2.FileStorage(os.path.join(output_dir, 'camera_parameters.xml'), cv2.FILE_STORAGE_WRITE)
+    fs.write('camera_matrix', camera_matrix)
+    fs.write('distortion_coefficients', distortion.reshape(1, -1))
+    fs.write('image_width', image_size[0])
+    fs.write('image_height', image_size[1])
+    fs.write('reprojection_error', result['reprojection_error'])
+    fs.release()
+    
+    lines = [
+        "海康威视工业相机标定报告",
+        "=" * 50,
+        f"标定时间: {date.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"棋盘格尺寸: {pattern_size[0]}x{pattern_size[1]}",
+        f"方格大小: {square_size}mm",
+        f"使用图像: {len(detections)}张",
+        f"图像尺寸: {image_size[0]}x{image_size[1]}",
+        "",
+        "标定结果:",
+        f"重投影误差: {result['reprojection_error']:.6f} 像素",
+        f"平均误差: {result['mean_error']:.6f} 像素",
+        "",
+        "相机内参:",
+        f"fx = {camera_matrix[0, 0]:.2f}",
+        f"fy = {camera_matrix[1, 1]:.2f}",
+        f"cx = {camera_matrix[0, 2]:.2f}",
+        f"cy = {camera_matrix[1, 2]:.2f}",
+        "",
+        "畸变系数:",
+    ] + [f"{name} = {value:.6f}" for name, value in zip(('k1', 'k2', 'p1', 'p2', 'k3'), distortion)]
+    with open(os.path.join(output_dir, 'report.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    
+    return json_path
+
+
+def save_samples(output_dir, json_path, source, detections, step):
+    """用刚保存的校准参数对前几张有效图像去畸变，保存到undistorted_samples/"""
+    calibration = CameraCalibration()
+    if not calibration.load_calibration(json_path):
+        return
+    
+    names = {name for name, _ in detections[:SAMPLE_COUNT]}
+    sample_dir = os.path.join(output_dir, 'undistorted_samples')
+    os.makedirs(sample_dir, exist_ok=True)
+    index = 0
+    replay = ReplaySource(source)
+    if replay.files is not None:
+        images = ((os.path.basename(path), cv2.imread(path)) for path in replay.files
+                  if os.path.basename(path) in names)
+    else:
+        images = ((f"frame_{frame_index:06d}", image) for frame_index, (image, _) in enumerate(replay.frames())
+                  if frame_index % step == 0 and f"frame_{frame_index:06d}" in names)
+    for _, image in images:
+        if image is None:
+            continue
+        index += 1
+        cv2.imwrite(os.path.join(sample_dir, f'undistorted_{index}.jpg'), calibration.undistort_image(image))
+        if index >= SAMPLE_COUNT:
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description='棋盘格离线标定')
+    parser.add_argument('source', type=str, help='棋盘格图像目录或录像文件')
+    parser.add_argument('--pattern', type=int, nargs=2, default=[11, 8], metavar=('COLS', 'ROWS'),
+                       help='棋盘格内角点数（列 行），默认 11 8')
+    parser.add_argument('--square-size', type=float, default=15.0, help='方格边长（毫米），默认15.0')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                       help='输出目录，默认 calibration/<标定时间>')
+    parser.add_argument('--workers', type=int, default=None, help='检测进程数，默认CPU核数')
+    parser.add_argument('--detect-width', type=int, default=800,
+                       help='粗定位时图像缩小到不超过此宽度（逐级减半），默认800')
+    parser.add_argument('--step', type=int, default=15, help='录像文件每隔多少帧取一帧，默认15')
+    parser.add_argument('--min-images', type=int, default=10, help='至少需要的有效图像数，默认10')
+    parser.add_argument('--no-samples', action='store_true', help='不保存去畸变样本图像')
+    args = parser.parse_args()
+    
+    if args.step < 1 or args.workers is not None and args.workers < 1:
+        parser.error('--step 和 --workers 必须为正整数')
+    pattern_size = tuple(args.pattern)
+    workers = args.workers or os.cpu_count() or 1
+    date = datetime.now()
+    output_dir = args.output or os.path.join(DEFAULT_OUTPUT_ROOT, date.strftime('%Y%m%d_%H%M%S'))
+    
+    print(f"检测棋盘格角点: {args.source}，棋盘格 {pattern_size[0]}x{pattern_size[1]}，{workers} 个进程")
+    start = time.perf_counter()
+    try:
+        detections, image_size, total = detect_all(args.source, pattern_size, args.detect_width,
+                                                   workers, args.step)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"读取图像失败: {e}")
+        sys.exit(1)
+    print(f"有效图像 {len(detections)}/{total}，检测耗时 {time.perf_counter() - start:.1f} 秒")
+    if len(detections) < args.min_images:
+        print(f"有效图像不足 {args.min_images} 张，无法标定")
+        sys.exit(1)
+    
+    start = time.perf_counter()
+    result = calibrate(detections, pattern_size, args.square_size, image_size)
+    print(f"标定完成，耗时 {time.perf_counter() - start:.1f} 秒，重投影误差 {result['reprojection_error']:.6f} 像素")
+    
+    json_path = save_results(output_dir, result, detections, pattern_size, args.square_size, image_size, date)
+    if not args.no_samples:
+        save_samples(output_dir, json_path, args.source, detections, args.step)
+    print(f"标定结果已保存到: {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,224 +9,858 @@
 
 import os
 import sys
+import hashlib
+import itertools
 import json
-
-# 设置环境变量以避免X11相关错误
-os.environ['QT_QPA_PLATFORM'] = 'offscreen'
-os.environ['DISPLAY'] = ''
+import re
 
 import cv2
+import ctypes
 import numpy as np
 import time
 import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from multiprocessing import shared_memory
+from queue import Empty
 from pathlib import Path
 import argparse
+import copy
+import multiprocessing
+import platform
 import signal
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# 海康威视SDK导入
-SDK_AVAILABLE = False
+# 日志格式，在main()和相机工作进程中配置，导入本模块不修改日志设置
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
-# 在导入SDK之前检查和设置环境变量
-def setup_sdk_environment():
-    """设置SDK环境变量"""
-    import platform
-    
+# 海康威视SDK在首次创建相机时才加载（见load_sdk），导入本模块不访问文件系统、不修改环境变量
+# None: 尚未加载, True: 已导入SDK, False: 使用模拟相机
+SDK_AVAILABLE = None
+_sdk_lock = threading.Lock()
+
+# SDK安装目录，按顺序查找
+SDK_INSTALL_PATHS = [
+    "/opt/MVS",
+    "/usr/local/MVS",
+    "/home/user/MVS",
+    "./MVS"
+]
+
+# SDK Python封装目录，Jetson Orin Nano (aarch64) 优先
+SDK_IMPORT_PATHS = [
+    "/opt/MVS/Samples/aarch64/Python/MvImport",
+    "/usr/local/MVS/Samples/aarch64/Python/MvImport",
+    "/opt/MVS/Samples/64/Python/MvImport",  # 通用64位路径
+    "/usr/local/MVS/Samples/64/Python/MvImport",
+    "/home/user/MVS/Samples/aarch64/Python/MvImport",
+    "./MVS/Samples/aarch64/Python/MvImport",
+    "./MVS/Samples/64/Python/MvImport"
+]
+
+# 磁盘缓存文件，位于get_cache_dir()下
+SDK_CACHE_FILE = 'sdk_location.json'
+DEVICE_CACHE_FILE = 'devices_{backend}.json'
+
+
+def get_cache_dir():
+    """SDK位置和设备列表的缓存目录，可用环境变量HIK_CACHE_DIR指定，默认~/.cache/hikvision_camera"""
+    path = os.environ.get('HIK_CACHE_DIR')
+    if path:
+        return Path(path)
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'hikvision_camera'
+
+
+def _load_cache(name):
+    """读取缓存文件，不存在或损坏时返回None"""
+    try:
+        with open(get_cache_dir() / name, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cache(name, data):
+    """写入缓存文件，先写临时文件再替换，避免多个进程同时启动时读到半个文件"""
+    path = get_cache_dir() / name
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入缓存失败 {path}: {e}")
+
+
+def find_sdk_location():
+    """查找SDK安装目录和Python封装目录，未找到的项为None"""
+    sdk_path = next((path for path in SDK_INSTALL_PATHS if os.path.exists(path)), None)
+    import_path = next((path for path in SDK_IMPORT_PATHS if os.path.exists(path)), None)
+    return {'machine': platform.machine(), 'sdk_path': sdk_path, 'import_path': import_path}
+
+
+def setup_sdk_environment(sdk_path):
+    """按SDK安装目录设置环境变量，环境变量已设置时不修改"""
     # 检查当前环境变量
     current_env = os.environ.get('MVCAM_COMMON_RUNENV')
     if current_env:
-        logger.info(f"环境变量已设置: MVCAM_COMMON_RUNENV={current_env}")
+        logger.debug(f"环境变量已设置: MVCAM_COMMON_RUNENV={current_env}")
         return True
     
-    # 自动检测和设置环境变量
-    logger.info("自动检测SDK安装路径...")
-    arch = platform.machine()
-    
-    sdk_paths = [
-        "/opt/MVS",
-        "/usr/local/MVS", 
-        "/home/user/MVS",
-        "./MVS"
-    ]
-    
-    for sdk_path in sdk_paths:
-        if os.path.exists(sdk_path):
-            logger.info(f"找到SDK路径: {sdk_path}")
-            
-            # 设置基本环境变量
-            os.environ['MVS_SDK_PATH'] = sdk_path
-            os.environ['MVCAM_COMMON_RUNENV'] = os.path.join(sdk_path, 'lib')
-            
-            # 根据架构设置库路径
-            if arch == 'aarch64':
-                lib_path = f"{sdk_path}/lib/aarch64:{sdk_path}/lib"
-                python_path = f"{sdk_path}/Samples/aarch64/Python"
-                logger.info("设置ARM64架构路径")
-            else:
-                lib_path = f"{sdk_path}/lib/64:{sdk_path}/lib/32"
-                python_path = f"{sdk_path}/Samples/64/Python"
-                logger.info("设置x86_64架构路径")
-            
-            # 更新环境变量
-            current_ld_path = os.environ.get('LD_LIBRARY_PATH', '')
-            os.environ['LD_LIBRARY_PATH'] = f"{lib_path}:{current_ld_path}" if current_ld_path else lib_path
-            
-            current_python_path = os.environ.get('PYTHONPATH', '')
-            os.environ['PYTHONPATH'] = f"{python_path}:{current_python_path}" if current_python_path else python_path
-            
-            logger.info(f"MVCAM_COMMON_RUNENV: {os.environ['MVCAM_COMMON_RUNENV']}")
-            logger.info(f"LD_LIBRARY_PATH: {os.environ['LD_LIBRARY_PATH']}")
-            logger.info(f"PYTHONPATH: {os.environ['PYTHONPATH']}")
-            
-            return True
+    if not sdk_path:
+        logger.error("未找到SDK安装路径")
+        return False
+    
+    # 设置基本环境变量
+    os.environ['MVS_SDK_PATH'] = sdk_path
+    os.environ['MVCAM_COMMON_RUNENV'] = os.path.join(sdk_path, 'lib')
     
-    logger.error("未找到SDK安装路径")
-    return False
-
-# 设置SDK环境
-if not setup_sdk_environment():
-    logger.warning("SDK环境变量设置失败，将使用模拟模式")
-
-try:
-    # Jetson Orin Nano (aarch64) 下SDK路径
-    possible_paths = [
-        "/opt/MVS/Samples/aarch64/Python/MvImport",
-        "/usr/local/MVS/Samples/aarch64/Python/MvImport", 
-        "/opt/MVS/Samples/64/Python/MvImport",  # 通用64位路径
-        "/usr/local/MVS/Samples/64/Python/MvImport",
-        "/home/user/MVS/Samples/aarch64/Python/MvImport",
-        "./MVS/Samples/aarch64/Python/MvImport",
-        "./MVS/Samples/64/Python/MvImport"
-    ]
-    
-    sdk_found = False
-    for path in possible_paths:
-        if os.path.exists(path):
-            sys.path.insert(0, path)
-            sdk_found = True
-            logger.info(f"找到SDK路径: {path}")
-            break
-    
-    if not sdk_found:
-        logger.warning("未找到标准SDK路径，尝试使用当前路径")
-    
-    from MvCameraControl_class import *
-    from ctypes import *
-    SDK_AVAILABLE = True
-    logger.info("海康威视SDK导入成功")
-    
-except ImportError as e:
-    logger.warning("无法导入海康威视SDK，将使用模拟模式进行测试")
-    logger.warning(f"错误详情: {e}")
-    logger.info("请检查以下路径是否存在SDK文件:")
-    for path in ["/opt/MVS/", "/usr/local/MVS/"]:
-        logger.info(f"  {path}")
+    # 根据架构设置库路径
+    if platform.machine() == 'aarch64':
+        lib_path = f"{sdk_path}/lib/aarch64:{sdk_path}/lib"
+        python_path = f"{sdk_path}/Samples/aarch64/Python"
+    else:
+        lib_path = f"{sdk_path}/lib/64:{sdk_path}/lib/32"
+        python_path = f"{sdk_path}/Samples/64/Python"
+    
+    # 更新环境变量
+    current_ld_path = os.environ.get('LD_LIBRARY_PATH', '')
+    os.environ['LD_LIBRARY_PATH'] = f"{lib_path}:{current_ld_path}" if current_ld_path else lib_path
     
+    current_python_path = os.environ.get('PYTHONPATH', '')
+    os.environ['PYTHONPATH'] = f"{python_path}:{current_python_path}" if current_python_path else python_path
+    
+    logger.debug(f"MVCAM_COMMON_RUNENV: {os.environ['MVCAM_COMMON_RUNENV']}")
+    logger.debug(f"LD_LIBRARY_PATH: {os.environ['LD_LIBRARY_PATH']}")
+    logger.debug(f"PYTHONPATH: {os.environ['PYTHONPATH']}")
+    return True
+
+
+def _install_names(names):
+    """把SDK（或模拟SDK）的名称安装为模块级名称，相当于from ... import *，但不覆盖本模块已有的名称"""
+    namespace = globals()
+    for name, value in names.items():
+        if not name.startswith('_'):
+            namespace.setdefault(name, value)
+
+
+def load_sdk(refresh=False):
+    """加载海康威视SDK，导入失败时改用模拟相机；返回SDK是否可用
+
+    只在第一次调用时执行。找到的SDK位置缓存在磁盘上，之后启动时直接使用（路径不存在时重新查找），
+    refresh=True时忽略缓存重新查找；环境变量HIK_MOCK=1时不查找SDK，直接使用模拟相机
+    """
+    global SDK_AVAILABLE
+    with _sdk_lock:
+        if SDK_AVAILABLE is not None:
+            return SDK_AVAILABLE
+        
+        if os.environ.get('HIK_MOCK') == '1':
+            logger.warning("HIK_MOCK=1，使用模拟相机")
+            _install_names(_create_mock_sdk())
+            SDK_AVAILABLE = False
+            return False
+        
+        location = None if refresh else _load_cache(SDK_CACHE_FILE)
+        cached = (isinstance(location, dict) and location.get('machine') == platform.machine()
+                  and all(location.get(key) and os.path.exists(location[key])
+                          for key in ('sdk_path', 'import_path')))
+        if cached:
+            logger.debug(f"使用缓存的SDK位置: {location['import_path']}")
+        else:
+            location = find_sdk_location()
+        
+        if not setup_sdk_environment(location['sdk_path']):
+            logger.warning("SDK环境变量设置失败，将使用模拟模式")
+        
+        import_path = location['import_path']
+        if import_path:
+            if import_path not in sys.path:
+                sys.path.insert(0, import_path)
+            logger.debug(f"找到SDK路径: {import_path}")
+        else:
+            logger.warning("未找到标准SDK路径，尝试使用当前路径")
+        
+        try:
+            import MvCameraControl_class as sdk
+        except ImportError as e:
+            logger.warning("无法导入海康威视SDK，将使用模拟模式进行测试")
+            logger.warning(f"错误详情: {e}")
+            logger.info("请检查以下路径是否存在SDK文件:")
+            for path in ["/opt/MVS/", "/usr/local/MVS/"]:
+                logger.info(f"  {path}")
+            _install_names(_create_mock_sdk())
+            SDK_AVAILABLE = False
+            return False
+        
+        # 等同于 from MvCameraControl_class import * 和 from ctypes import *
+        for module in (sdk, ctypes):
+            names = getattr(module, '__all__', None) or list(vars(module))
+            _install_names({name: getattr(module, name) for name in names})
+        
+        if not cached:
+            _save_cache(SDK_CACHE_FILE, location)
+        SDK_AVAILABLE = True
+        logger.info("海康威视SDK导入成功")
+        return True
+
+
+def _create_mock_sdk():
+    """创建模拟的SDK类和常量，返回名称到对象的字典，由load_sdk安装为模块级名称"""
     # 创建模拟的SDK类和常量用于测试
+    # 模拟相机按帧率生成确定性的合成图像，可通过环境变量或MvCamera.configure()（load_sdk()之后）配置：
+    #   HIK_MOCK_DEVICES       模拟设备数量，默认1
+    #   HIK_MOCK_WIDTH/HEIGHT  传感器尺寸，默认1920x1080
+    #   HIK_MOCK_PIXEL_FORMAT  Mono8/BayerRG8/BayerGB8/BayerGR8/BayerBG8/RGB8/BGR8，默认BGR8
+    #   HIK_MOCK_FPS           帧率，默认30
+    #   HIK_MOCK_DROP_EVERY    每N帧丢一帧（帧号跳变），默认0不丢帧
+    #   HIK_MOCK_TIMEOUT_EVERY 每N帧注入一次取图超时，默认0；超时相当于数据流暂停一个取图超时时长，
+    #                          该帧在下一次取图时返回，帧号不跳变（与HIK_MOCK_DROP_EVERY互不影响）
+    
+    # 模拟常量
+    MV_GIGE_DEVICE = 0x00000001
+    MV_USB_DEVICE = 0x00000002
+    MV_ACCESS_Exclusive = 1
+    MV_TRIGGER_MODE_OFF = 0
+    MV_TRIGGER_MODE_ON = 1
+    PixelType_Gvsp_Mono8 = 0x01080001
+    PixelType_Gvsp_BayerGR8 = 0x01080008
+    PixelType_Gvsp_BayerRG8 = 0x01080009
+    PixelType_Gvsp_BayerGB8 = 0x0108000A
+    PixelType_Gvsp_BayerBG8 = 0x0108000B
+    PixelType_Gvsp_RGB8_Packed = 0x02180014
+    PixelType_Gvsp_BGR8_Packed = 0x02180015
+    
     class MockMvCamera:
+        """模拟相机 - 按帧率生成确定性的合成图像
+        
+        图像内容、帧号和设备时间戳只由帧序号决定，相同配置下每次运行结果一致；
+        支持ROI/合并、像素格式、触发、取图策略、图像回调和SDK图像缓冲区
+        """
+        
+        PIXEL_FORMATS = {
+            'Mono8': PixelType_Gvsp_Mono8,
+            'BayerGR8': PixelType_Gvsp_BayerGR8,
+            'BayerRG8': PixelType_Gvsp_BayerRG8,
+            'BayerGB8': PixelType_Gvsp_BayerGB8,
+            'BayerBG8': PixelType_Gvsp_BayerBG8,
+            'RGB8': PixelType_Gvsp_RGB8_Packed,
+            'BGR8': PixelType_Gvsp_BGR8_Packed,
+        }
+        
+        # Bayer格式 -> (拜耳阵列左上2x2的通道顺序, 转BGR的OpenCV转换码)
+        BAYER_PATTERNS = {
+            PixelType_Gvsp_BayerRG8: ((2, 1, 1, 0), cv2.COLOR_BayerBG2BGR),
+            PixelType_Gvsp_BayerGR8: ((1, 2, 0, 1), cv2.COLOR_BayerGB2BGR),
+            PixelType_Gvsp_BayerGB8: ((1, 0, 2, 1), cv2.COLOR_BayerGR2BGR),
+            PixelType_Gvsp_BayerBG8: ((0, 1, 1, 2), cv2.COLOR_BayerRG2BGR),
+        }
+        
+        # 图像每帧水平移动的像素数和图案周期
+        PATTERN_STEP = 8
+        PATTERN_PERIOD = 256
+        
+        # 第0台模拟设备的IP（192.168.0.1），之后的设备依次加1
+        IP_BASE = 0xC0A80001
+        
+        # 已被打开的设备序号，模拟独占访问
+        opened_devices = set()
+
+        config = {
+            'devices': int(os.environ.get('HIK_MOCK_DEVICES', 1)),
+            'width': int(os.environ.get('HIK_MOCK_WIDTH', 1920)),
+            'height': int(os.environ.get('HIK_MOCK_HEIGHT', 1080)),
+            'pixel_format': os.environ.get('HIK_MOCK_PIXEL_FORMAT', 'BGR8'),
+            'fps': float(os.environ.get('HIK_MOCK_FPS', 30.0)),
+            'frame_number_start': 1,
+            'frame_number_step': 1,
+            'drop_every': int(os.environ.get('HIK_MOCK_DROP_EVERY', 0)),
+            'timeout_every': int(os.environ.get('HIK_MOCK_TIMEOUT_EVERY', 0)),
+            'drop_frames': (),
+            'timeout_frames': (),
+        }
+        
+        @classmethod
+        def configure(cls, **kwargs):
+            """修改模拟相机配置，对之后打开的设备生效"""
+            unknown = set(kwargs) - set(cls.config)
+            if unknown:
+                raise ValueError(f"未知的模拟相机配置项: {', '.join(sorted(unknown))}")
+            cls.config.update(kwargs)
+        
         def __init__(self):
-            pass
+            self._condition = threading.Condition()
+            self._device_index = 0
+            self._opened = False
+            self._grabbing = False
+            self._callback = None
+            self._callback_user = None
+            self._callback_thread = None
+            self._nodes = []
+            self._busy_nodes = {}
+            self._pattern = None
+            self._pattern_key = None
+            self._start_time = time.time()
+            self._next_index = 0
+            self._frame_times = {}
+            self._stalled_index = None
+            self._pending_triggers = 0
+            self._trigger_count = 0
+            self._reset()
+        
+        def _reset(self):
+            """按当前配置恢复默认参数"""
+            config = self.config
+            pixel_format = config['pixel_format']
+            if isinstance(pixel_format, str):
+                pixel_format = self.PIXEL_FORMATS[pixel_format]
+            
+            self._sensor = (int(config['width']), int(config['height']))
+            self._int_values = {'Width': self._sensor[0], 'Height': self._sensor[1],
+                                'OffsetX': 0, 'OffsetY': 0, 'GevTimestampTickFrequency': 1000000000}
+            self._enum_values = {'PixelFormat': pixel_format,
+                                 'BinningHorizontal': 1, 'BinningVertical': 1,
+                                 'DecimationHorizontal': 1, 'DecimationVertical': 1,
+                                 'TriggerMode': MV_TRIGGER_MODE_OFF, 'ExposureAuto': 0, 'GainAuto': 0}
+            self._enum_strings = {'TriggerSource': 'Line0', 'TriggerActivation': 'RisingEdge'}
+            self._float_values = {'AcquisitionFrameRate': float(config['fps']),
+                                  'ResultingFrameRate': float(config['fps']),
+                                  'ExposureTime': 10000.0, 'Gain': 0.0}
+            self._bool_values = {'AcquisitionFrameRateEnable': False}
+            self._image_node_num = 3
+            self._grab_strategy = 0
+            self._output_queue_size = 1
+            self._drop_frames = set(config['drop_frames'])
+            self._timeout_frames = set(config['timeout_frames'])
+        
+        def _max_size(self):
+            max_width = self._sensor[0] // (self._enum_values['BinningHorizontal'] *
+                                            self._enum_values['DecimationHorizontal'])
+            max_height = self._sensor[1] // (self._enum_values['BinningVertical'] *
+                                             self._enum_values['DecimationVertical'])
+            return max_width, max_height
+        
+        def _bytes_per_pixel(self):
+            return 3 if self._enum_values['PixelFormat'] in (PixelType_Gvsp_RGB8_Packed,
+                                                             PixelType_Gvsp_BGR8_Packed) else 1
+        
+        def _frame_size(self):
+            return self._int_values['Width'] * self._int_values['Height'] * self._bytes_per_pixel()
+        
+        # ---- 帧调度 ----
+        
+        def _next_frame(self, timeout):
+            """等待下一帧，返回帧序号；超时或停止取流返回None"""
+            deadline = time.time() + timeout / 1000.0
+            with self._condition:
+                while self._grabbing:
+                    if self._stalled_index is not None:
+                        # 上次注入超时的帧
+                        index, self._stalled_index = self._stalled_index, None
+                        return index
+                    index = self._schedule(deadline)
+                    if index is None:
+                        return None
+                    
+                    frame_number = self._frame_number(index)
+                    drop_every = self.config['drop_every']
+                    timeout_every = self.config['timeout_every']
+                    if (drop_every and (index + 1) % drop_every == 0) or frame_number in self._drop_frames:
+                        # 注入丢帧：该帧号不输出，下一帧出现帧号跳变
+                        self._frame_times.pop(index, None)
+                        continue
+                    if (timeout_every and (index + 1) % timeout_every == 0) or frame_number in self._timeout_frames:
+                        # 注入超时：数据流暂停到超时时间后返回无数据，该帧留到下一次取图，
+                        # 暂停期间时钟顺延，不会因缓存节点积压而额外丢帧
+                        stalled = time.time()
+                        self._condition.wait(max(0.0, deadline - time.time()))
+                        if self._enum_values['TriggerMode'] != MV_TRIGGER_MODE_ON:
+                            self._start_time += time.time() - stalled
+                        self._stalled_index = index
+                        return None
+                    return index
+            return None
+        
+        def _schedule(self, deadline):
+            """按触发模式或帧率和取图策略确定下一帧序号，须持有锁"""
+            if self._enum_values['TriggerMode'] == MV_TRIGGER_MODE_ON:
+                while self._grabbing and self._pending_triggers == 0:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+                if not self._grabbing:
+                    return None
+                self._pending_triggers -= 1
+                self._trigger_count += 1
+                index = self._next_index
+                self._next_index += 1
+                self._frame_times[index] = time.time() - self._start_time
+                return index
+            
+            fps = max(self._float_values['AcquisitionFrameRate'], 0.1)
+            now = time.time()
+            available = int((now - self._start_time) * fps)
+            if self._next_index <= available:
+                # 取图落后于相机：按取图策略丢弃积压的帧
+                if self._grab_strategy == 1:
+                    self._next_index = available
+                elif self._grab_strategy == 2:
+                    self._next_index = max(self._next_index, available - self._output_queue_size + 1)
+                elif self._grab_strategy == 3:
+                    self._next_index = available + 1
+                else:
+                    self._next_index = max(self._next_index, available - self._image_node_num + 1)
+            
+            index = self._next_index
+            due = self._start_time + index / fps
+            while self._grabbing and time.time() < due:
+                remaining = min(due, deadline) - time.time()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if not self._grabbing:
+                return None
+            
+            self._next_index += 1
+            self._frame_times[index] = index / fps
+            return index
+        
+        def _frame_number(self, index):
+            return self.config['frame_number_start'] + index * self.config['frame_number_step']
+        
+        # ---- 图像生成 ----
+        
+        def _base_pattern(self):
+            """生成当前几何和像素格式下的基础图案，按需缓存"""
+            max_width, max_height = self._max_size()
+            pixel_format = self._enum_values['PixelFormat']
+            key = (max_width, max_height, pixel_format, self._device_index)
+            if key == self._pattern_key:
+                return self._pattern
+            
+            period = self.PATTERN_PERIOD
+            x = np.arange(max_width + period, dtype=np.int32)[np.newaxis, :]
+            y = np.arange(max_height, dtype=np.int32)[:, np.newaxis]
+            bgr = np.empty((max_height, max_width + period, 3), dtype=np.uint8)
+            bgr[..., 0] = (x + self._device_index * 37) % 256
+            bgr[..., 1] = (y * 255 // max(max_height - 1, 1)).astype(np.uint8)
+            bgr[..., 2] = (((x // 32) + (y // 32)) % 2) * 200 + 28
+            
+            if pixel_format == PixelType_Gvsp_BGR8_Packed:
+                pattern = bgr
+            elif pixel_format == PixelType_Gvsp_RGB8_Packed:
+                pattern = np.ascontiguousarray(bgr[..., ::-1])
+            elif pixel_format == PixelType_Gvsp_Mono8:
+                pattern = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+            elif pixel_format in self.BAYER_PATTERNS:
+                channels, _ = self.BAYER_PATTERNS[pixel_format]
+                pattern = np.empty((max_height, max_width + period), dtype=np.uint8)
+                pattern[0::2, 0::2] = bgr[0::2, 0::2, channels[0]]
+                pattern[0::2, 1::2] = bgr[0::2, 1::2, channels[1]]
+                pattern[1::2, 0::2] = bgr[1::2, 0::2, channels[2]]
+                pattern[1::2, 1::2] = bgr[1::2, 1::2, channels[3]]
+            else:
+                raise ValueError(f"模拟相机不支持的像素格式: {pixel_format:#x}")
+            
+            self._pattern = pattern
+            self._pattern_key = key
+            return pattern
+        
+        def _render(self, index, buffer):
+            """将第index帧写入缓冲区（ctypes数组或指针），返回帧长度"""
+            width, height = self._int_values['Width'], self._int_values['Height']
+            offset_x, offset_y = self._int_values['OffsetX'], self._int_values['OffsetY']
+            frame_len = self._frame_size()
+            
+            if isinstance(buffer, ctypes.Array):
+                data = np.frombuffer(buffer, dtype=np.uint8, count=frame_len)
+            else:
+                data = np.ctypeslib.as_array(buffer, shape=(frame_len,))
             
+            pattern = self._base_pattern()
+            shift = (index * self.PATTERN_STEP) % self.PATTERN_PERIOD
+            window = pattern[offset_y:offset_y + height, offset_x + shift:offset_x + shift + width]
+            data.reshape(window.shape)[...] = window
+            return frame_len
+        
+        def _fill_frame_info(self, frame_info, index, frame_len):
+            frame_info.nWidth = self._int_values['Width']
+            frame_info.nHeight = self._int_values['Height']
+            frame_info.nOffsetX = self._int_values['OffsetX']
+            frame_info.nOffsetY = self._int_values['OffsetY']
+            frame_info.enPixelType = self._enum_values['PixelFormat']
+            frame_info.nFrameLen = frame_len
+            frame_info.nFrameNum = self._frame_number(index)
+            timestamp = int(self._frame_times.pop(index, 0.0) * 1000000000)
+            frame_info.nDevTimeStampHigh = timestamp >> 32
+            frame_info.nDevTimeStampLow = timestamp & 0xFFFFFFFF
+            frame_info.nHostTimeStamp = int(time.time() * 1000)
+            frame_info.nLostPacket = 0
+            frame_info.nTriggerIndex = self._trigger_count
+        
+        # ---- 设备 ----
+        
+        @classmethod
+        def _device_index_of(cls, device_info):
+            # 枚举得到的和按IP构造的设备信息都由IP确定设备序号
+            return device_info.SpecialInfo.stGigEInfo.nCurrentIp - cls.IP_BASE
+        
         def MV_CC_CreateHandle(self, device_info):
+            self._device_index = self._device_index_of(device_info)
+            self._reset()
             return 0
-            
+        
         def MV_CC_OpenDevice(self, access_mode, switch_over_key):
+            if not 0 <= self._device_index < self.config['devices']:
+                return 0x80000008  # MV_E_PRECONDITION 设备不存在
+            if self._device_index in MockMvCamera.opened_devices:
+                return 0x80000011  # MV_E_ACCESS_DENIED 设备已被独占
+            MockMvCamera.opened_devices.add(self._device_index)
+            self._opened = True
+            logger.warning(f"使用模拟相机 [{self._device_index}]，图像为合成数据")
             return 0
-            
+        
         def MV_CC_StartGrabbing(self):
-            return 0
+            with self._condition:
+                if self._grabbing:
+                    return 0x80000004  # MV_E_CALLORDER
+                self._grabbing = True
+                self._start_time = time.time()
+                self._next_index = 0
+                self._frame_times = {}
+                self._stalled_index = None
+                self._pending_triggers = 0
+                self._trigger_count = 0
             
+            if self._callback is not None:
+                self._callback_thread = threading.Thread(target=self._callback_loop, name="mock-camera-callback",
+                                                         daemon=True)
+                self._callback_thread.start()
+            return 0
+        
         def MV_CC_StopGrabbing(self):
+            with self._condition:
+                self._grabbing = False
+                self._condition.notify_all()
+            if self._callback_thread is not None and self._callback_thread is not threading.current_thread():
+                self._callback_thread.join()
+            self._callback_thread = None
             return 0
-            
+        
         def MV_CC_CloseDevice(self):
+            self.MV_CC_StopGrabbing()
+            self._callback = None
+            if self._opened:
+                MockMvCamera.opened_devices.discard(self._device_index)
+                self._opened = False
             return 0
-            
+        
         def MV_CC_DestroyHandle(self):
             return 0
-            
+        
         def MV_CC_GetOptimalPacketSize(self):
             return 1500
-            
+        
+        # ---- 参数 ----
+        
         def MV_CC_SetIntValue(self, key, value):
+            if key in self._int_values:
+                self._int_values[key] = int(value)
             return 0
-            
+        
         def MV_CC_SetEnumValue(self, key, value):
+            if key in self._enum_values:
+                if key == 'PixelFormat' and int(value) not in self.PIXEL_FORMATS.values():
+                    return 0x80000002  # MV_E_SUPPORT
+                with self._condition:
+                    self._enum_values[key] = int(value)
+                    self._condition.notify_all()
+                if key.startswith(('Binning', 'Decimation')):
+                    # 合并/抽样后ROI复位为最大尺寸
+                    self._int_values.update(zip(('Width', 'Height'), self._max_size()))
+                    self._int_values.update(OffsetX=0, OffsetY=0)
+            return 0
+        
+        def MV_CC_SetEnumValueByString(self, key, value):
+            if key == 'PixelFormat':
+                if value not in self.PIXEL_FORMATS:
+                    return 0x80000002  # MV_E_SUPPORT
+                return self.MV_CC_SetEnumValue(key, self.PIXEL_FORMATS[value])
+            self._enum_strings[key] = value
+            return 0
+        
+        def MV_CC_SetCommandValue(self, key):
+            if key == 'TriggerSoftware':
+                if (self._enum_values['TriggerMode'] != MV_TRIGGER_MODE_ON
+                        or self._enum_strings.get('TriggerSource') != 'Software'):
+                    return 0x80000008  # MV_E_PRECONDITION
+                with self._condition:
+                    self._pending_triggers += 1
+                    self._condition.notify_all()
+            return 0
+        
+        def MV_CC_SetImageNodeNum(self, num):
+            self._image_node_num = max(int(num), 1)
+            return 0
+        
+        def MV_CC_SetGrabStrategy(self, strategy):
+            self._grab_strategy = int(strategy)
+            return 0
+        
+        def MV_CC_SetOutputQueueSize(self, size):
+            self._output_queue_size = max(int(size), 1)
+            return 0
+        
+        def MV_CC_GetIntValue(self, key, stIntValue=None):
+            max_width, max_height = self._max_size()
+            values = dict(self._int_values)
+            values['PayloadSize'] = self._frame_size()
+            limits = {'Width': max_width, 'Height': max_height,
+                      'OffsetX': max_width - values['Width'], 'OffsetY': max_height - values['Height']}
+            value = values.get(key, 0)
+            if stIntValue is None:
+                return (0, value)
+            stIntValue.nCurValue = value
+            stIntValue.nMax = limits.get(key, value)
+            stIntValue.nMin = 8 if key in ('Width', 'Height') else 0
+            stIntValue.nInc = 8 if key in ('Width', 'Height') else 1
+            return 0
+        
+        def MV_CC_GetEnumValue(self, key, stEnumValue=None):
+            value = self._enum_values.get(key, 0)
+            if stEnumValue is None:
+                return (0, value)
+            stEnumValue.nCurValue = value
+            return 0
+        
+        def MV_CC_GetFloatValue(self, key, stFloatValue=None):
+            value = self._float_values.get(key, 0.0)
+            if stFloatValue is None:
+                return (0, value)
+            stFloatValue.fCurValue = value
+            return 0
+        
+        def MV_CC_SetFloatValue(self, key, value):
+            if key in self._float_values:
+                with self._condition:
+                    if key == 'AcquisitionFrameRate' and self._grabbing:
+                        # 保持帧序号连续，从下一帧开始按新帧率输出
+                        self._start_time = time.time() - self._next_index / max(float(value), 0.1)
+                    self._float_values[key] = float(value)
+                    if key == 'AcquisitionFrameRate':
+                        self._float_values['ResultingFrameRate'] = float(value)
+                    self._condition.notify_all()
+            return 0
+        
+        def MV_CC_GetBoolValue(self, key, bValue):
+            bValue.value = self._bool_values.get(key, False)
+            return 0
+        
+        def MV_CC_SetBoolValue(self, key, value):
+            if key in self._bool_values:
+                self._bool_values[key] = bool(value)
             return 0
+        
+        # ---- 取图 ----
+        
+        def MV_CC_GetOneFrameTimeout(self, data, size, frame_info, timeout):
+            if not self._grabbing:
+                return 0x80000004  # MV_E_CALLORDER
+            if self._callback is not None:
+                return 0x80000004  # 注册回调后不能主动取图
+            if size < self._frame_size():
+                return 0x8000000A  # MV_E_NOENOUGH_BUF
             
-        def MV_CC_GetIntValue(self, key):
-            return (0, 1920 if 'Width' in key else 1080)
+            index = self._next_frame(timeout)
+            if index is None:
+                return 0x80000007  # MV_E_NODATA
             
-        def MV_CC_GetEnumValue(self, key):
-            return (0, 17301505)  # Mock pixel format
+            frame_len = self._render(index, data)
+            self._fill_frame_info(frame_info, index, frame_len)
+            return 0
+        
+        def MV_CC_ConvertPixelType(self, param):
+            width, height = param.nWidth, param.nHeight
+            src_type = param.enSrcPixelType
+            if param.enDstPixelType != PixelType_Gvsp_BGR8_Packed:
+                return 0x80000002  # MV_E_SUPPORT
             
-        def MV_CC_GetFloatValue(self, key):
-            return (0, 30.0)
+            dst_len = width * height * 3
+            if param.nDstBufferSize < dst_len:
+                return 0x8000000A  # MV_E_NOENOUGH_BUF
             
-        def MV_CC_GetOneFrameTimeout(self, data, size, frame_info, timeout):
-            # 模拟返回错误，表示无实际相机
-            return 0x80000007  # MV_E_TIMEOUT
+            if isinstance(param.pSrcData, ctypes.Array):
+                src = np.frombuffer(param.pSrcData, dtype=np.uint8, count=param.nSrcDataLen)
+            else:
+                src = np.ctypeslib.as_array(param.pSrcData, shape=(param.nSrcDataLen,))
+            dst = np.frombuffer(param.pDstBuffer, dtype=np.uint8, count=dst_len).reshape((height, width, 3))
             
-        def MV_CC_ConvertPixelType(self, param):
+            if src_type == PixelType_Gvsp_Mono8:
+                cv2.cvtColor(src.reshape((height, width)), cv2.COLOR_GRAY2BGR, dst=dst)
+            elif src_type in self.BAYER_PATTERNS:
+                cv2.cvtColor(src.reshape((height, width)), self.BAYER_PATTERNS[src_type][1], dst=dst)
+            elif src_type == PixelType_Gvsp_RGB8_Packed:
+                cv2.cvtColor(src.reshape((height, width, 3)), cv2.COLOR_RGB2BGR, dst=dst)
+            elif src_type == PixelType_Gvsp_BGR8_Packed:
+                dst[...] = src.reshape((height, width, 3))
+            else:
+                return 0x80000002  # MV_E_SUPPORT
+            param.nDstLen = dst_len
+            return 0
+        
+        def MV_CC_RegisterImageCallBackEx(self, callback, user):
+            if self._grabbing:
+                return 0x80000004  # MV_E_CALLORDER
+            self._callback = callback
+            self._callback_user = user
             return 0
+        
+        def _callback_loop(self):
+            """按帧率调用注册的图像回调"""
+            buffer = None
+            while self._grabbing:
+                index = self._next_frame(100)
+                if index is None:
+                    continue
+                frame_size = self._frame_size()
+                if buffer is None or len(buffer) < frame_size:
+                    buffer = (ctypes.c_ubyte * frame_size)()
+                frame_info = MockMV_FRAME_OUT_INFO_EX()
+                self._fill_frame_info(frame_info, index, self._render(index, buffer))
+                self._callback(buffer, frame_info, self._callback_user)
+        
+        def MV_CC_GetImageBuffer(self, out_frame, timeout):
+            if not self._grabbing:
+                return 0x80000004  # MV_E_CALLORDER
+            if self._callback is not None:
+                return 0x80000004  # 注册回调后不能主动取图
             
+            frame_size = self._frame_size()
+            with self._condition:
+                # 缓存节点全部被上层占用时不再输出新帧
+                self._nodes = [node for node in self._nodes if len(node) >= frame_size]
+                if not self._nodes and len(self._busy_nodes) >= self._image_node_num:
+                    return 0x8000000D  # MV_E_NOOUTBUF
+                node = self._nodes.pop() if self._nodes else (ctypes.c_ubyte * frame_size)()
+            
+            index = self._next_frame(timeout)
+            if index is None:
+                with self._condition:
+                    self._nodes.append(node)
+                return 0x80000007  # MV_E_NODATA
+            
+            self._fill_frame_info(out_frame.stFrameInfo, index, self._render(index, node))
+            with self._condition:
+                self._busy_nodes[ctypes.addressof(node)] = node
+            out_frame.pBufAddr = ctypes.cast(node, ctypes.POINTER(ctypes.c_ubyte))
+            return 0
+        
+        def MV_CC_FreeImageBuffer(self, out_frame):
+            if out_frame.pBufAddr is None:
+                return 0x80000005  # MV_E_PARAMETER
+            address = ctypes.cast(out_frame.pBufAddr, ctypes.c_void_p).value
+            with self._condition:
+                node = self._busy_nodes.pop(address, None)
+                if node is None:
+                    return 0x80000005  # MV_E_PARAMETER
+                self._nodes.append(node)
+            out_frame.pBufAddr = None
+            return 0
+        
         @staticmethod
         def MV_CC_EnumDevices(layer_type, device_list):
-            # 模拟没有设备
-            device_list.nDeviceNum = 0
+            device_num = MockMvCamera.config['devices']
+            device_list.nDeviceNum = device_num
+            device_list.pDeviceInfo = [MockMV_CC_DEVICE_INFO(index) for index in range(device_num)]
             return 0
-    
-    # 模拟常量
+        
+        @staticmethod
+        def MV_CC_IsDeviceAccessible(device_info, access_mode):
+            index = MockMvCamera._device_index_of(device_info)
+            return 0 <= index < MockMvCamera.config['devices'] and index not in MockMvCamera.opened_devices
+
     MvCamera = MockMvCamera
-    MV_GIGE_DEVICE = 0x00000001
-    MV_USB_DEVICE = 0x00000002
-    MV_ACCESS_Exclusive = 1
-    MV_TRIGGER_MODE_OFF = 0
-    PixelType_Gvsp_Mono8 = 0x01080001
-    PixelType_Gvsp_RGB8_Packed = 0x02180014
-    PixelType_Gvsp_BGR8_Packed = 0x02180015
     
     # 模拟结构体
     class MockDeviceInfo:
         def __init__(self):
             self.nTLayerType = MV_GIGE_DEVICE
-            
+    
     class MockGigEInfo:
-        def __init__(self):
-            self.chUserDefinedName = b"Mock GigE Camera"
-            self.nCurrentIp = 0xC0A80001  # 192.168.0.1
-            
+        def __init__(self, index=0):
+            self.chUserDefinedName = f"Mock GigE Camera {index}".encode('ascii')
+            self.nCurrentIp = MockMvCamera.IP_BASE + index
+            self.nNetExport = 0xC0A800FE  # 主机网口 192.168.0.254
+
     class MockUsb3VInfo:
-        def __init__(self):
-            self.chUserDefinedName = b"Mock USB Camera"
-            
+        def __init__(self, index=0):
+            self.chUserDefinedName = f"Mock USB Camera {index}".encode('ascii')
+    
     class MockSpecialInfo:
-        def __init__(self):
-            self.stGigEInfo = MockGigEInfo()
-            self.stUsb3VInfo = MockUsb3VInfo()
-            
+        def __init__(self, index=0):
+            self.stGigEInfo = MockGigEInfo(index)
+            self.stUsb3VInfo = MockUsb3VInfo(index)
+    
     class MockMV_CC_DEVICE_INFO:
-        def __init__(self):
+        def __init__(self, index=0):
             self.nTLayerType = MV_GIGE_DEVICE
-            self.SpecialInfo = MockSpecialInfo()
-            
+            self.nDeviceIndex = index
+            self.SpecialInfo = MockSpecialInfo(index)
+        
+        @property
+        def contents(self):
+            # 模拟指针解引用
+            return self
+    
     class MockMV_CC_DEVICE_INFO_LIST:
         def __init__(self):
             self.nDeviceNum = 0
             self.pDeviceInfo = None
-            
+    
     class MockMV_FRAME_OUT_INFO_EX:
         def __init__(self):
             self.nWidth = 1920
             self.nHeight = 1080
+            self.nOffsetX = 0
+            self.nOffsetY = 0
             self.enPixelType = PixelType_Gvsp_BGR8_Packed
             self.nFrameLen = 1920 * 1080 * 3
-            
+            self.nFrameNum = 0
+            self.nDevTimeStampHigh = 0
+            self.nDevTimeStampLow = 0
+            self.nHostTimeStamp = 0
+            self.nLostPacket = 0
+            self.nTriggerIndex = 0
+    
+    class MockMV_FRAME_OUT:
+        def __init__(self):
+            self.pBufAddr = None
+            self.stFrameInfo = MockMV_FRAME_OUT_INFO_EX()
+    
+    class MockMVCC_INTVALUE:
+        def __init__(self):
+            self.nCurValue = 0
+            self.nMax = 0
+            self.nMin = 0
+            self.nInc = 1
+    
+    class MockMVCC_ENUMVALUE:
+        def __init__(self):
+            self.nCurValue = 0
+            self.nSupportedNum = 0
+    
+    class MockMVCC_FLOATVALUE:
+        def __init__(self):
+            self.fCurValue = 0.0
+            self.fMax = 0.0
+            self.fMin = 0.0
+    
     class MockMV_CC_PIXEL_CONVERT_PARAM:
         def __init__(self):
             self.nWidth = 0
@@ -237,23 +871,27 @@ except ImportError as e:
             self.enDstPixelType = 0
             self.pDstBuffer = None
             self.nDstBufferSize = 0
+            self.nDstLen = 0
     
     # 模拟ctypes函数
     def cast(obj, type_ptr):
-        return MockMV_CC_DEVICE_INFO()
-        
+        return obj if isinstance(obj, MockMV_CC_DEVICE_INFO) else MockMV_CC_DEVICE_INFO()
+    
     def POINTER(cls):
         return cls
-        
+    
     def memset(ptr, value, size):
         pass
-        
+    
     def sizeof(obj):
+        # 取流缓冲区是真实的ctypes数组，按实际大小返回
+        if isinstance(obj, ctypes.Array):
+            return ctypes.sizeof(obj)
         return 1024
-        
+    
     def byref(obj):
         return obj
-        
+    
     def c_ubyte(size):
         return type('c_ubyte_array', (), {})()
     
@@ -261,24 +899,91 @@ except ImportError as e:
     MV_CC_DEVICE_INFO_LIST = MockMV_CC_DEVICE_INFO_LIST
     MV_CC_DEVICE_INFO = MockMV_CC_DEVICE_INFO
     MV_FRAME_OUT_INFO_EX = MockMV_FRAME_OUT_INFO_EX
+    MV_FRAME_OUT = MockMV_FRAME_OUT
     MV_CC_PIXEL_CONVERT_PARAM = MockMV_CC_PIXEL_CONVERT_PARAM
+    MVCC_INTVALUE = MockMVCC_INTVALUE
+    MVCC_ENUMVALUE = MockMVCC_ENUMVALUE
+    MVCC_FLOATVALUE = MockMVCC_FLOATVALUE
+    MV_GIGE_DEVICE_INFO = MockGigEInfo
+    
+    return dict(locals())
 
 
 class CameraCalibration:
-    """相机校准参数类"""
+    """相机校准参数类
+    
+    去畸变使用initUndistortRectifyMap生成的定点映射表(CV_16SC2)和cv2.remap，映射表按图像尺寸和内参
+    在内存中缓存；cache_maps为True时同时以.npy文件保存在校准文件所在目录，下次启动时内存映射加载。
+    输出的新内参和有效区域裁剪见set_undistort_options，多线程分带去畸变见set_parallel，
+    缩小输出（预览、低分辨率录像）见set_output_profile
+    
+    每次加载或修改输出选项都会分配新的版本号(version)。交给相机使用后对象被冻结，不能再修改校准参数
+    和输出选项；更换校准时创建新对象，由HikvisionCameraLinux.set_calibration准备好映射表后原子替换
+    """
+    
+    # 进程内递增的版本号
+    _versions = itertools.count(1)
+    
+    # 内存中最多缓存的映射表组数（1920x1080每组约12MB）和换算内参的几何数
+    MAP_CACHE_SIZE = 4
+    INTRINSICS_CACHE_SIZE = 64
     
-    def __init__(self, calibration_file=None):
+    # 点坐标去畸变的迭代终止条件，默认的5次迭代在图像边缘误差可达0.1像素
+    POINT_CRITERIA = (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 20, 1e-8)
+    
+    def __init__(self, calibration_file=None, cache_maps=False):
+        self.calibration_file = None
+        self.cache_maps = cache_maps
+        self.version = None
+        self.frozen = False
         self.camera_matrix = None
         self.distortion_coefficients = None
         self.image_width = None
         self.image_height = None
         self.reprojection_error = None
         
+        # 当前相机输出图像的几何（ROI偏移与合并倍数），内参按此换算
+        self.geometry = None
+        # 图像几何 -> 换算后的内参，无法换算时为None
+        self._intrinsics = {}
+        
+        # 去畸变输出选项，见set_undistort_options
+        self.alpha = None
+        self.crop = False
+        # 输出配置名称 -> 输出尺寸规则，见set_output_profile
+        self.profiles = {}
+        
+        # 分带去畸变的线程数和OpenCV内部线程数，见set_parallel
+        self.remap_workers = 0
+        self.opencv_threads = None
+        self._executor = None
+        
+        # (宽, 高, 内参, alpha, 裁剪) -> 映射表、新内参和输出尺寸；新内参单独缓存，只校正点时不生成映射表
+        self._maps = {}
+        self._rectifications = {}
+        self._maps_lock = threading.Lock()
+        
         if calibration_file:
             self.load_calibration(calibration_file)
     
+    def __getstate__(self):
+        # 复制对象或传给工作进程时不带映射表和锁，需要时重新生成或从磁盘加载
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        state['_executor'] = None
+        del state['_maps_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._maps_lock = threading.Lock()
+        # OpenCV线程数是进程级设置，在工作进程中重新应用
+        if self.opencv_threads is not None:
+            cv2.setNumThreads(self.opencv_threads)
+    
     def load_calibration(self, calibration_file):
         """加载校准参数"""
+        self._check_mutable()
         try:
             if calibration_file.endswith('.json'):
                 self._load_from_json(calibration_file)
@@ -287,7 +992,15 @@ class CameraCalibration:
             else:
                 raise ValueError("不支持的校准文件格式，支持 .json 和 .xml")
             
-            logger.info(f"成功加载校准参数：{calibration_file}")
+            self.calibration_file = calibration_file
+            with self._maps_lock:
+                self._maps.clear()
+            self._intrinsics = {}
+            self._rectifications = {}
+            self.version = next(self._versions)
+            if self.geometry:
+                self.set_geometry(*self.geometry)
+            logger.info(f"成功加载校准参数：{calibration_file}（版本 {self.version}）")
             logger.info(f"图像尺寸：{self.image_width} x {self.image_height}")
             logger.info(f"重投影误差：{self.reprojection_error:.6f}")
             return True
@@ -319,52 +1032,1916 @@ class CameraCalibration:
         
         fs.release()
     
-    def undistort_image(self, image):
-        """图像去畸变"""
-        if self.camera_matrix is None or self.distortion_coefficients is None:
-            return image
+    def set_geometry(self, width, height, offset_x=0, offset_y=0, scale_x=1, scale_y=1):
+        """设置相机输出图像的几何，按ROI偏移和合并/抽样倍数换算内参
         
-        return cv2.undistort(image, self.camera_matrix, self.distortion_coefficients)
-
-
-class HikvisionCameraLinux:
-    """海康威视相机控制类 - Linux版本"""
+        offset_x/offset_y 为合并后像素坐标下的ROI偏移，scale_x/scale_y 为合并与抽样的总倍数，
+        width为None时清除几何（按图像尺寸换算内参）。换算结果按几何缓存，切换回用过的几何时不再计算；
+        冻结后不能修改，几何变化时用derive()派生新版本
+        """
+        self._check_mutable()
+        if width is None:
+            self.geometry = None
+            return
+        
+        self.geometry = (width, height, offset_x, offset_y, scale_x, scale_y)
+        if self.camera_matrix is None:
+            return
+        
+        camera_matrix = self._geometry_camera_matrix(self.geometry)
+        if camera_matrix is not None and self.geometry != (self.image_width, self.image_height, 0, 0, 1, 1):
+            logger.info(f"去畸变内参已按图像几何调整: {width}x{height}, 偏移 ({offset_x}, {offset_y}), "
+                        f"倍数 {scale_x}x{scale_y}")
     
-    def __init__(self, calibration=None):
-        # 检查是否已经有MvCamera实例存在，避免重复创建
-        if not hasattr(self, 'camera') or self.camera is None:
-            try:
-                # 添加延迟，避免快速重复创建导致的状态冲突
-                import time
-                time.sleep(0.1)
-                
-                self.camera = MvCamera()
-                logger.info("相机SDK实例创建成功")
-            except Exception as e:
-                logger.error(f"相机SDK实例创建失败: {e}")
-                # 创建一个模拟相机对象，避免None错误
-                self.camera = None
+    def get_camera_matrix(self, width, height):
+        """width x height 图像对应的内参，无法由校准参数换算时返回None
         
-        self.device_list = None
-        self.is_connected = False
-        self.is_grabbing = False
-        self.calibration = calibration
+        尺寸与set_geometry设置的几何一致时按该几何换算，与校准图像一致时为原内参，
+        宽高比与校准图像相同时视为整体缩放；其他尺寸无法确定图像在传感器上的位置
+        """
+        if self.camera_matrix is None:
+            return None
         
-        # 录像相关
-        self.video_writer = None
-        self.is_recording = False
-        self.record_thread = None
-        self.capture_thread = None
-        self.stop_event = threading.Event()
+        if self.geometry and (width, height) == tuple(self.geometry[:2]):
+            geometry = self.geometry
+        elif (width, height) == (self.image_width, self.image_height):
+            geometry = (width, height, 0, 0, 1, 1)
+        elif width * self.image_height == height * self.image_width:
+            geometry = (width, height, 0, 0, self.image_width / width, self.image_height / height)
+        else:
+            geometry = (width, height, None, None, None, None)
+        return self._geometry_camera_matrix(geometry)
+    
+    def _geometry_camera_matrix(self, geometry):
+        """按几何换算内参并缓存，图像超出校准图像范围或无法确定位置时记录警告并返回None"""
+        if geometry in self._intrinsics:
+            return self._intrinsics[geometry]
         
-        # 连续拍照相关
-        self.continuous_capture = False
-        self.capture_interval = 1.0
-        self.capture_count = 0
+        width, height, offset_x, offset_y, scale_x, scale_y = geometry
+        camera_matrix = None
+        if offset_x is None:
+            logger.warning(f"图像尺寸 {width}x{height} 与校准尺寸 {self.image_width}x{self.image_height} 不一致，"
+                           f"且没有对应的图像几何，无法换算内参，不做去畸变")
+        elif ((offset_x + width) * scale_x > self.image_width + 1e-6
+              or (offset_y + height) * scale_y > self.image_height + 1e-6):
+            logger.warning(f"图像几何 {width}x{height}, 偏移 ({offset_x}, {offset_y}), 倍数 {scale_x}x{scale_y} "
+                           f"超出校准图像 {self.image_width}x{self.image_height}，无法换算内参，不做去畸变")
+        else:
+            camera_matrix = self.camera_matrix.copy()
+            camera_matrix[0, 0] /= scale_x
+            camera_matrix[1, 1] /= scale_y
+            # 以像素中心为准换算主点
+            camera_matrix[0, 2] = (camera_matrix[0, 2] + 0.5) / scale_x - 0.5 - offset_x
+            camera_matrix[1, 2] = (camera_matrix[1, 2] + 0.5) / scale_y - 0.5 - offset_y
         
-        # 信号处理
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        if len(self._intrinsics) >= self.INTRINSICS_CACHE_SIZE:
+            self._intrinsics.pop(next(iter(self._intrinsics)))
+        self._intrinsics[geometry] = camera_matrix
+        return camera_matrix
+    
+    def set_undistort_options(self, alpha=None, crop=False):
+        """设置去畸变输出的新内参
+        
+        alpha: None 沿用原内参（默认），0~1 按getOptimalNewCameraMatrix计算新内参，
+               0 只保留有效像素（无黑边），1 保留全部原始像素（边缘有黑边）
+        crop: 输出裁剪到有效区域validPixROI，需同时指定alpha；裁剪由映射表直接完成，不增加每帧开销
+        """
+        if alpha is not None and not 0 <= alpha <= 1:
+            raise ValueError("alpha 应在 0~1 之间")
+        if crop and alpha is None:
+            raise ValueError("裁剪到有效区域需要同时指定 alpha")
+        self._check_mutable()
+        if (alpha, crop) != (self.alpha, self.crop) and self.version is not None:
+            self.version = next(self._versions)
+        self.alpha = alpha
+        self.crop = crop
+    
+    def set_output_profile(self, name, width=None, height=None, max_width=None):
+        """注册输出配置，按配置去畸变时缩放合并在同一组映射表中，每帧只做一次remap
+        
+        width/height: 输出尺寸，只指定其一时另一边按比例计算
+        max_width: 未指定width/height时，宽度超过max_width才按比例缩小
+        均以去畸变（含裁剪）后的尺寸为基准。缩小超过一半时remap的双线性插值会有混叠，适合预览而非测量。
+        输出配置不影响已有的输出，冻结后仍可注册
+        """
+        for value in (width, height, max_width):
+            if value is not None and value <= 0:
+                raise ValueError("输出尺寸必须为正数")
+        # 整体替换字典，取流线程读取时不会看到修改到一半的状态
+        self.profiles = dict(self.profiles, **{name: {'width': width, 'height': height, 'max_width': max_width}})
+    
+    def _profile_size(self, profile, size):
+        """按输出配置计算 size 缩放后的输出尺寸"""
+        spec = self.profiles.get(profile)
+        if spec is None:
+            raise ValueError(f"未注册的输出配置: {profile}")
+        
+        width, height = size
+        if spec['width'] and spec['height']:
+            return spec['width'], spec['height']
+        if spec['width']:
+            return spec['width'], max(1, int(height * spec['width'] / width))
+        if spec['height']:
+            return max(1, int(width * spec['height'] / height)), spec['height']
+        if spec['max_width'] and width > spec['max_width']:
+            return spec['max_width'], max(1, int(height * spec['max_width'] / width))
+        return size
+    
+    def freeze(self):
+        """冻结校准参数和输出选项，之后只能通过创建新对象更换"""
+        self.frozen = True
+    
+    def derive(self):
+        """返回参数、几何和输出选项相同、未冻结的新版本副本（映射表按需重新生成），用于修改使用中的校准"""
+        calibration = copy.deepcopy(self)
+        calibration.frozen = False
+        calibration.version = next(self._versions)
+        return calibration
+    
+    def _check_mutable(self):
+        if self.frozen:
+            raise RuntimeError(f"校准参数（版本 {self.version}）正在被相机使用，请创建新的CameraCalibration后替换")
+    
+    def set_parallel(self, workers=0, opencv_threads=None):
+        """设置多线程去畸变
+        
+        workers: 大于1时把输出图像按行分成workers个水平带，由线程池并行remap（OpenCV执行时释放GIL），
+                 0或1时整帧调用一次cv2.remap
+        opencv_threads: 不为None时调用cv2.setNumThreads（进程级设置）；0或1关闭OpenCV内部并行，
+                 分带模式下建议设为1，避免两层并行争抢CPU
+        与其他设置一样须在交给相机（冻结）之前调用，取流线程使用中不能修改
+        """
+        self._check_mutable()
+        if workers < 0:
+            raise ValueError("线程数不能为负数")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.remap_workers = workers
+        self.opencv_threads = opencv_threads
+        if opencv_threads is not None:
+            cv2.setNumThreads(opencv_threads)
+    
+    def shutdown(self):
+        """停止分带去畸变线程池（更换校准后由相机调用），之后再去畸变时重新创建"""
+        with self._maps_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def get_undistort_maps(self, width, height, profile=None):
+        """返回 width x height 图像（按输出配置profile）的去畸变映射表 (map1, map2)，未加载校准参数时返回None"""
+        entry = self._get_undistort_entry(width, height, profile)
+        return entry['maps'] if entry else None
+    
+    def get_new_camera_matrix(self, width=None, height=None, profile=None):
+        """去畸变输出图像对应的内参（已按alpha、裁剪和输出配置调整），width/height为输入图像尺寸，默认为当前图像几何
+        
+        去畸变后图像上的测量和投影应使用此内参（畸变系数视为0）
+        """
+        width, height = self._resolve_size(width, height)
+        rectification = self._get_rectification(width, height)
+        if rectification is None:
+            return None
+        if profile is None:
+            return rectification[1].copy()
+        return self._scale_camera_matrix(rectification[1], rectification[2],
+                                         self._profile_size(profile, rectification[2]))
+    
+    def get_output_size(self, width, height, profile=None):
+        """width x height 图像去畸变（按输出配置profile缩放）后的尺寸 (宽, 高)，裁剪时小于输入"""
+        rectification = self._get_rectification(width, height)
+        size = rectification[2] if rectification else (width, height)
+        return self._profile_size(profile, size) if profile is not None else size
+    
+    def rectified_version(self, width, height):
+        """width x height 图像能够去畸变时返回校准版本，无法换算内参（undistort_image原样输出）时返回None"""
+        return self.version if self._get_rectification(width, height) is not None else None
+    
+    @staticmethod
+    def _scale_camera_matrix(camera_matrix, size, output_size):
+        """把 size 图像的内参换算到缩放为 output_size 后的图像（像素中心对齐）"""
+        scale_x = output_size[0] / size[0]
+        scale_y = output_size[1] / size[1]
+        scaled = camera_matrix.copy()
+        scaled[0, :2] *= scale_x
+        scaled[1, 1] *= scale_y
+        scaled[0, 2] = (camera_matrix[0, 2] + 0.5) * scale_x - 0.5
+        scaled[1, 2] = (camera_matrix[1, 2] + 0.5) * scale_y - 0.5
+        return scaled
+    
+    def _resolve_size(self, width, height):
+        """未指定图像尺寸时使用当前图像几何，没有几何时使用校准图像尺寸"""
+        if width is None or height is None:
+            return tuple(self.geometry[:2]) if self.geometry else (self.image_width, self.image_height)
+        return width, height
+    
+    def _get_rectification(self, width, height):
+        """返回 (原图内参, 去畸变输出内参, 输出尺寸)，无法换算内参时返回None；只计算内参，不生成映射表"""
+        if self.camera_matrix is None or self.distortion_coefficients is None:
+            return None
+        
+        camera_matrix = self.get_camera_matrix(width, height)
+        if camera_matrix is None:
+            return None
+        key = (width, height, camera_matrix.tobytes(), self.alpha, self.crop)
+        rectification = self._rectifications.get(key)
+        if rectification is None:
+            new_camera_matrix, size = self._compute_new_camera_matrix(width, height, camera_matrix)
+            rectification = (camera_matrix, new_camera_matrix, size)
+            if len(self._rectifications) >= self.INTRINSICS_CACHE_SIZE:
+                self._rectifications.pop(next(iter(self._rectifications)))
+            self._rectifications[key] = rectification
+        return rectification
+    
+    def _compute_new_camera_matrix(self, width, height, camera_matrix):
+        """按alpha和裁剪选项计算去畸变输出的内参和尺寸"""
+        size = (width, height)
+        if self.alpha is None:
+            return camera_matrix, size
+        
+        new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(
+            camera_matrix, self.distortion_coefficients, size, self.alpha, size)
+        x, y, roi_width, roi_height = roi
+        if self.crop and roi_width > 0 and roi_height > 0:
+            # 主点平移到有效区域左上角，映射表直接生成裁剪后的图像
+            new_camera_matrix[0, 2] -= x
+            new_camera_matrix[1, 2] -= y
+            size = (roi_width, roi_height)
+        logger.info(f"去畸变输出 {size[0]}x{size[1]}，新内参 fx={new_camera_matrix[0, 0]:.2f} "
+                    f"fy={new_camera_matrix[1, 1]:.2f} cx={new_camera_matrix[0, 2]:.2f} "
+                    f"cy={new_camera_matrix[1, 2]:.2f}")
+        return new_camera_matrix, size
+    
+    def _get_undistort_entry(self, width, height, profile=None):
+        rectification = self._get_rectification(width, height)
+        if rectification is None:
+            return None
+        
+        camera_matrix, new_camera_matrix, size = rectification
+        if profile is not None:
+            # 缩放并入输出内参，映射表直接从原始像素采样到输出尺寸
+            output_size = self._profile_size(profile, size)
+            new_camera_matrix = self._scale_camera_matrix(new_camera_matrix, size, output_size)
+            size = output_size
+        key = (width, height, camera_matrix.tobytes(), self.alpha, self.crop, size)
+        with self._maps_lock:
+            entry = self._maps.get(key)
+            if entry is None:
+                entry = {'camera_matrix': new_camera_matrix, 'size': size,
+                         'maps': self._load_or_create_maps(width, height, camera_matrix, new_camera_matrix, size)}
+                if len(self._maps) >= self.MAP_CACHE_SIZE:
+                    self._maps.pop(next(iter(self._maps)))
+                self._maps[key] = entry
+        return entry
+    
+    def _load_or_create_maps(self, width, height, camera_matrix, new_camera_matrix, size):
+        """从磁盘缓存加载映射表，没有时生成（并按需保存）"""
+        map_files = self._map_files(camera_matrix, new_camera_matrix, size) if self.cache_maps else None
+        if map_files and all(path.exists() for path in map_files):
+            try:
+                maps = tuple(np.load(path, mmap_mode='r') for path in map_files)
+                if maps[0].shape == (size[1], size[0], 2) and maps[1].shape == (size[1], size[0]):
+                    logger.info(f"已加载去畸变映射表: {map_files[0].name}")
+                    return maps
+            except (OSError, ValueError) as e:
+                logger.warning(f"加载去畸变映射表失败，重新生成: {e}")
+        
+        start = time.time()
+        maps = cv2.initUndistortRectifyMap(camera_matrix, self.distortion_coefficients, None,
+                                           new_camera_matrix, size, cv2.CV_16SC2)
+        logger.info(f"已生成 {width}x{height} 去畸变映射表，耗时 {(time.time() - start) * 1000:.1f} ms")
+        if map_files:
+            self._save_maps(map_files, maps)
+        return maps
+    
+    # ---- 点坐标 ----
+    # 只需要少量特征点时，在原始图像上检测后校正这些点，免去整帧去畸变。
+    # 以下方法的width/height为原始图像尺寸，默认为当前图像几何；点为 (N, 2) 数组或点列表
+    
+    def undistort_points(self, points, width=None, height=None):
+        """原始图像上的像素坐标 -> 去畸变输出图像上的像素坐标（与undistort_image的输出一致）"""
+        camera_matrix, new_camera_matrix, _ = self._point_rectification(width, height)
+        return self._undistort_normalized(points, camera_matrix, new_camera_matrix)
+    
+    def distort_points(self, points, width=None, height=None):
+        """去畸变输出图像上的像素坐标 -> 原始图像上的像素坐标（undistort_points的逆变换）"""
+        _, new_camera_matrix, _ = self._point_rectification(width, height)
+        points = self._as_points(points).reshape(-1, 2)
+        # 去畸变输出的内参没有畸变，先还原到z=1平面上再按原图内参和畸变投影
+        normalized = (points - new_camera_matrix[:2, 2]) / np.diag(new_camera_matrix)[:2]
+        return self.project_points(np.column_stack([normalized, np.ones(len(normalized))]), width, height)
+    
+    def pixels_to_rays(self, points, width=None, height=None, normalize=True):
+        """原始图像上的像素坐标 -> 相机坐标系下的视线方向 (N, 3)；normalize为False时z=1，否则为单位向量"""
+        camera_matrix, _, _ = self._point_rectification(width, height)
+        rays = self._undistort_normalized(points, camera_matrix, None)
+        rays = np.column_stack([rays, np.ones(len(rays))])
+        if normalize:
+            rays /= np.linalg.norm(rays, axis=1, keepdims=True)
+        return rays
+    
+    def project_points(self, object_points, width=None, height=None, rectified=False):
+        """相机坐标系下的三维点 (N, 3) -> 原始图像（含畸变）或去畸变输出图像(rectified=True)上的像素坐标"""
+        camera_matrix, new_camera_matrix, _ = self._point_rectification(width, height)
+        object_points = np.asarray(object_points, dtype=np.float64).reshape(-1, 3)
+        if len(object_points) == 0:
+            return np.empty((0, 2))
+        
+        if rectified:
+            camera_matrix, distortion = new_camera_matrix, None
+        else:
+            distortion = self.distortion_coefficients
+        image_points, _ = cv2.projectPoints(object_points, np.zeros(3), np.zeros(3), camera_matrix, distortion)
+        return image_points.reshape(-1, 2)
+    
+    def _point_rectification(self, width, height):
+        width, height = self._resolve_size(width, height)
+        rectification = self._get_rectification(width, height)
+        if rectification is None:
+            raise ValueError(f"无法换算 {width}x{height} 图像的内参，请检查校准参数和图像几何")
+        return rectification
+    
+    def _as_points(self, points):
+        return np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+    
+    def _undistort_normalized(self, points, camera_matrix, new_camera_matrix):
+        """迭代求解去畸变点坐标，new_camera_matrix为None时返回z=1平面上的归一化坐标"""
+        points = self._as_points(points)
+        if len(points) == 0:
+            return np.empty((0, 2))
+        
+        if hasattr(cv2, 'undistortPointsIter'):
+            # OpenCV 4.x 的带终止条件版本
+            result = cv2.undistortPointsIter(points, camera_matrix, self.distortion_coefficients, None,
+                                             new_camera_matrix, self.POINT_CRITERIA)
+        else:
+            result = cv2.undistortPoints(points, camera_matrix, self.distortion_coefficients, None, None,
+                                         new_camera_matrix, self.POINT_CRITERIA)
+        return result.reshape(-1, 2)
+    
+    def _map_files(self, camera_matrix, new_camera_matrix, size):
+        """映射表的.npy缓存文件，文件名含参数摘要，重新校准或改变输出选项后不会误用旧文件"""
+        if not self.calibration_file:
+            return None
+        
+        width, height = size
+        digest = hashlib.sha1(f"{width}x{height}".encode('ascii'))
+        for array in (camera_matrix, self.distortion_coefficients, new_camera_matrix):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        stem = f"undistort_map_{width}x{height}_{digest.hexdigest()[:12]}"
+        directory = Path(self.calibration_file).parent
+        return directory / f"{stem}_1.npy", directory / f"{stem}_2.npy"
+    
+    def _save_maps(self, map_files, maps):
+        """保存映射表，先写临时文件再替换，避免其他进程读到不完整的文件"""
+        try:
+            for path, data in zip(map_files, maps):
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, data)
+                os.replace(tmp_path, path)
+            logger.info(f"去畸变映射表已保存: {map_files[0]}")
+        except OSError as e:
+            logger.warning(f"保存去畸变映射表失败: {e}")
+    
+    def undistort_image(self, image, profile=None):
+        """图像去畸变，指定输出配置profile时同一次remap中缩放到配置的输出尺寸"""
+        maps = self.get_undistort_maps(image.shape[1], image.shape[0], profile)
+        if maps is None:
+            if profile is None:
+                return image
+            # 无法去畸变时仍按输出配置缩放
+            size = self._profile_size(profile, (image.shape[1], image.shape[0]))
+            if size == (image.shape[1], image.shape[0]):
+                return image
+            return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if self.remap_workers > 1:
+            return self._remap_bands(image, maps[0], maps[1])
+        return cv2.remap(image, maps[0], maps[1], cv2.INTER_LINEAR)
+    
+    def _remap_bands(self, image, map1, map2):
+        """按水平带并行remap，各带直接写入输出图像的对应行"""
+        height = map1.shape[0]
+        output = np.empty((height, map1.shape[1]) + image.shape[2:], dtype=image.dtype)
+        with self._maps_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.remap_workers - 1,
+                                                    thread_name_prefix='undistort')
+            executor = self._executor
+        
+        bounds = [height * i // self.remap_workers for i in range(self.remap_workers + 1)]
+        remap_band = lambda top, bottom: cv2.remap(image, map1[top:bottom], map2[top:bottom], cv2.INTER_LINEAR,
+                                                   dst=output[top:bottom])
+        # 第一带在调用线程中处理，其余交给线程池
+        try:
+            futures = [executor.submit(remap_band, top, bottom) for top, bottom in zip(bounds[1:-1], bounds[2:])]
+        except RuntimeError:
+            # 线程池刚在更换校准时关闭（仍持有旧校准的线程），整帧处理
+            return cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
+        remap_band(bounds[0], bounds[1])
+        for future in futures:
+            future.result()
+        return output
+
+
+class FrameBufferPool:
+    """帧缓冲池 - 预分配并循环使用取流/像素转换缓冲区"""
+
+    # 无法读取PayloadSize时使用的默认缓冲区大小
+    DEFAULT_BUFFER_SIZE = 1920 * 1080 * 3
+
+    def __init__(self, pool_size=4):
+        self.pool_size = pool_size
+        self.payload_size = self.DEFAULT_BUFFER_SIZE
+        self.convert_size = self.DEFAULT_BUFFER_SIZE
+        self.geometry = None
+
+        self._raw_buffers = []
+        self._convert_buffers = []
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.resizes = 0
+
+    def configure(self, payload_size, width, height, pixel_format):
+        """按相机负载大小和图像尺寸配置缓冲池，几何尺寸和像素格式不变时不重新分配"""
+        geometry = (int(width), int(height), int(pixel_format))
+        payload_size = int(payload_size) if payload_size else 0
+        if payload_size <= 0:
+            payload_size = geometry[0] * geometry[1] * 3 or self.DEFAULT_BUFFER_SIZE
+
+        with self._lock:
+            if geometry == self.geometry and payload_size == self.payload_size:
+                return False
+
+            self.geometry = geometry
+            self.payload_size = payload_size
+            self.convert_size = geometry[0] * geometry[1] * 3 or self.DEFAULT_BUFFER_SIZE
+            self._raw_buffers = [self._allocate(self.payload_size) for _ in range(self.pool_size)]
+            self._convert_buffers = []
+            self.resizes += 1
+
+        logger.debug(f"缓冲池已配置: {geometry[0]}x{geometry[1]}, 像素格式 {hex(geometry[2])}, "
+                     f"负载 {payload_size} 字节 x {self.pool_size}")
+        return True
+
+    def matches(self, width, height, pixel_format):
+        """检查帧几何尺寸和像素格式是否与当前配置一致"""
+        return self.geometry == (int(width), int(height), int(pixel_format))
+
+    def _allocate(self, size):
+        # 使用ctypes模块本身的c_ubyte，模拟模式下全局c_ubyte会被替换
+        return (ctypes.c_ubyte * size)()
+
+    def _acquire(self, free_buffers, size):
+        with self._lock:
+            if free_buffers:
+                self.hits += 1
+                return free_buffers.pop()
+            self.misses += 1
+        return self._allocate(size)
+
+    def _release(self, free_buffers, buffer, size):
+        with self._lock:
+            # 尺寸变化后归还的旧缓冲区直接丢弃
+            if len(buffer) == size and len(free_buffers) < self.pool_size:
+                free_buffers.append(buffer)
+
+    def acquire_raw(self):
+        """获取取流缓冲区"""
+        return self._acquire(self._raw_buffers, self.payload_size)
+
+    def release_raw(self, buffer):
+        """归还取流缓冲区"""
+        self._release(self._raw_buffers, buffer, self.payload_size)
+
+    def acquire_convert(self):
+        """获取像素格式转换缓冲区"""
+        return self._acquire(self._convert_buffers, self.convert_size)
+
+    def release_convert(self, buffer):
+        """归还像素格式转换缓冲区"""
+        self._release(self._convert_buffers, buffer, self.convert_size)
+
+    def get_stats(self):
+        """获取缓冲池统计信息"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'resizes': self.resizes,
+                'payload_size': self.payload_size,
+                'free_raw': len(self._raw_buffers),
+                'free_convert': len(self._convert_buffers),
+            }
+
+
+class FrameQueue:
+    """有界帧队列 - 按丢帧策略处理队列已满的情况，消费者阻塞等待新帧
+
+    drop_policy:
+      'drop_oldest' 丢弃队列中最旧的帧（适合预览、定时拍照）
+      'drop_newest' 丢弃新到达的帧
+      'block'       阻塞生产者直到有空位，超过block_timeout仍满则丢弃新帧（适合录像）
+    on_evict: 可选，'drop_oldest'挤出队列中的帧后在锁外调用on_evict(frame)，供生产者释放该帧关联的资源
+    """
+
+    DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+    def __init__(self, maxsize=8, drop_policy='drop_oldest', block_timeout=1.0, on_evict=None):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"不支持的丢帧策略: {drop_policy}")
+        
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.on_evict = on_evict
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self.closed = False
+
+        # 统计信息
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        """放入一帧，按丢帧策略处理队列已满的情况，帧被丢弃时返回False"""
+        evicted = None
+        with self._condition:
+            if self.closed:
+                return False
+            
+            if len(self._frames) >= self.maxsize and self.drop_policy == 'block':
+                self._condition.wait_for(lambda: len(self._frames) < self.maxsize or self.closed,
+                                         self.block_timeout)
+            
+            if len(self._frames) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy != 'drop_oldest':
+                    return False
+                evicted = self._frames.popleft()
+            
+            self._frames.append(frame)
+            self.put_count += 1
+            self._condition.notify_all()
+        
+        if evicted is not None and self.on_evict is not None:
+            self.on_evict(evicted)
+        return True
+
+    def get(self, timeout=None):
+        """取出一帧，超时或被唤醒时返回None"""
+        with self._condition:
+            if not self._frames and not self.closed:
+                self._condition.wait(timeout)
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            # 唤醒可能被阻塞的生产者
+            self._condition.notify_all()
+            return frame
+
+    def interrupt(self):
+        """唤醒所有等待中的消费者"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def close(self):
+        """关闭队列，之后放入的帧被丢弃，阻塞的生产者和消费者立即返回"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def clear(self):
+        """清空队列，返回被清除的帧"""
+        with self._condition:
+            frames = list(self._frames)
+            self._frames.clear()
+            self._condition.notify_all()
+            return frames
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class LatestFrameSlot:
+    """最新帧槽位 - 仅保存最近一帧，可等待下一帧到达"""
+
+    def __init__(self):
+        self._frame = None
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def publish(self, frame):
+        """更新最新帧并唤醒等待者"""
+        with self._condition:
+            self._frame = frame
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def get(self):
+        """获取最新帧（可能为None）"""
+        with self._condition:
+            return self._frame
+
+    def wait_next(self, timeout=None):
+        """等待比调用时刻更新的一帧，超时返回None"""
+        with self._condition:
+            sequence = self._sequence
+            self._condition.wait_for(lambda: self._sequence != sequence, timeout)
+            if self._sequence == sequence:
+                return None
+            return self._frame
+
+    def interrupt(self):
+        """唤醒所有等待者"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def clear(self):
+        """清空最新帧"""
+        with self._condition:
+            self._frame = None
+
+
+class FrameDispatcher:
+    """帧分发器 - 将单一取流源产生的每一帧分发给多个订阅者
+
+    每个订阅者拥有独立的队列深度和丢帧策略；带回调的订阅者在各自线程中执行回调，
+    回调变慢只会导致该订阅者丢帧，不影响取流和其他订阅者
+    """
+
+    def __init__(self):
+        self.latest = LatestFrameSlot()
+        self._subscribers = {}
+        self._callback_threads = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, name, queue_size=8, drop_policy='drop_oldest', callback=None, block_timeout=1.0):
+        """添加订阅者，返回其帧队列；同名订阅者会被替换"""
+        self.unsubscribe(name)
+        
+        queue = FrameQueue(queue_size, drop_policy, block_timeout)
+        with self._lock:
+            self._subscribers[name] = queue
+        
+        if callback is not None:
+            thread = threading.Thread(target=self._callback_loop, args=(name, queue, callback),
+                                      name=f"frame-callback-{name}", daemon=True)
+            self._callback_threads[name] = thread
+            thread.start()
+        
+        logger.debug(f"添加帧订阅者 {name}: 队列深度 {queue_size}, 丢帧策略 {drop_policy}")
+        return queue
+
+    def unsubscribe(self, name):
+        """移除订阅者"""
+        with self._lock:
+            queue = self._subscribers.pop(name, None)
+        if queue is None:
+            return False
+        
+        queue.close()
+        thread = self._callback_threads.pop(name, None)
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        return True
+
+    def get_queue(self, name):
+        """获取订阅者的帧队列"""
+        with self._lock:
+            return self._subscribers.get(name)
+
+    def has_subscribers(self):
+        """是否存在订阅者"""
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, frame):
+        """发布一帧到最新帧槽位和所有订阅者"""
+        self.latest.publish(frame)
+        with self._lock:
+            queues = list(self._subscribers.values())
+        for queue in queues:
+            queue.put(frame)
+        self.published += 1
+
+    def interrupt(self):
+        """唤醒所有等待新帧的消费者"""
+        self.latest.interrupt()
+        with self._lock:
+            queues = list(self._subscribers.values())
+        for queue in queues:
+            queue.interrupt()
+
+    def get_stats(self):
+        """获取各订阅者的投递/丢帧统计"""
+        with self._lock:
+            return {
+                name: {
+                    'delivered': queue.put_count,
+                    'dropped': queue.dropped,
+                    'pending': len(queue),
+                    'queue_size': queue.maxsize,
+                    'drop_policy': queue.drop_policy,
+                }
+                for name, queue in self._subscribers.items()
+            }
+
+    def _callback_loop(self, name, queue, callback):
+        """回调订阅者线程"""
+        while not queue.closed:
+            frame = queue.get(timeout=0.5)
+            if frame is None:
+                continue
+            try:
+                callback(frame)
+            except Exception as e:
+                logger.error(f"帧回调 {name} 执行出错：{e}")
+
+
+# TIFF压缩方式名称 -> libtiff压缩代码
+TIFF_COMPRESSION = {'none': 1, 'lzw': 5, 'deflate': 8, 'packbits': 32773}
+
+# 编码速度配置，依据benchmark_encode.py在1440x1080 BGR图像上的单线程测试（ms/帧, 文件大小）:
+#   fast     JPEG 85: 5.7ms 82KB；WebP 75: 157ms；TIFF不压缩: 6.5ms 4.5MB
+#   balanced JPEG 95（OpenCV默认）: 8.8ms 197KB；WebP 90: 188ms；TIFF LZW: 85ms 1.2MB
+#   archival JPEG 100+优化霍夫曼表: 33ms 454KB；PNG 6级: 476ms 902KB；WebP无损: 1.3s；TIFF Deflate: 362ms
+# PNG在fast/balanced中不指定压缩级别：不带参数时OpenCV使用1级+SUB滤波+RLE的快速设置（79ms 1.2MB），
+# 显式指定级别后libpng改为逐行尝试全部滤波，1级反而需要138ms，3级215ms，9级超过6s
+ENCODE_PROFILES = {
+    'fast': {'jpeg_quality': 85, 'jpeg_optimize': False, 'jpeg_progressive': False,
+             'png_compression': None, 'webp_quality': 75, 'tiff_compression': 'none'},
+    'balanced': {'jpeg_quality': 95, 'jpeg_optimize': False, 'jpeg_progressive': False,
+                 'png_compression': None, 'webp_quality': 90, 'tiff_compression': 'lzw'},
+    'archival': {'jpeg_quality': 100, 'jpeg_optimize': True, 'jpeg_progressive': False,
+                 'png_compression': 6, 'webp_quality': 101, 'tiff_compression': 'deflate'},
+}
+
+
+def encode_params(format, profile='balanced', **settings):
+    """返回format（扩展名）对应的cv2.imwrite/imencode参数列表
+
+    profile为ENCODE_PROFILES中的配置名称，None时只使用settings；settings中值不为None的项覆盖配置:
+    jpeg_quality(0~100)、jpeg_optimize、jpeg_progressive、png_compression(0~9，None为OpenCV的快速默认设置)、
+    webp_quality(1~100，大于100为无损)、tiff_compression(TIFF_COMPRESSION中的名称或libtiff代码)
+    """
+    if profile is not None and profile not in ENCODE_PROFILES:
+        raise ValueError(f"不支持的编码配置: {profile}，可选 {', '.join(ENCODE_PROFILES)}")
+    values = dict(ENCODE_PROFILES[profile]) if profile else {}
+    unknown = set(settings) - set(ENCODE_PROFILES['balanced'])
+    if unknown:
+        raise ValueError(f"不支持的编码参数: {', '.join(sorted(unknown))}")
+    values.update((name, value) for name, value in settings.items() if value is not None)
+    
+    format = format.lower().lstrip('.')
+    params = []
+    if format in ('jpg', 'jpeg'):
+        if 'jpeg_quality' in values:
+            if not 0 <= values['jpeg_quality'] <= 100:
+                raise ValueError("JPEG质量应在 0~100 之间")
+            params += [cv2.IMWRITE_JPEG_QUALITY, int(values['jpeg_quality'])]
+        if 'jpeg_optimize' in values:
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, int(bool(values['jpeg_optimize']))]
+        if 'jpeg_progressive' in values:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(values['jpeg_progressive']))]
+    elif format == 'png':
+        if values.get('png_compression') is not None:
+            if not 0 <= values['png_compression'] <= 9:
+                raise ValueError("PNG压缩级别应在 0~9 之间")
+            params += [cv2.IMWRITE_PNG_COMPRESSION, int(values['png_compression'])]
+    elif format == 'webp':
+        if 'webp_quality' in values:
+            if values['webp_quality'] < 1:
+                raise ValueError("WebP质量应大于等于1")
+            params += [cv2.IMWRITE_WEBP_QUALITY, int(values['webp_quality'])]
+    elif format in ('tif', 'tiff'):
+        if 'tiff_compression' in values:
+            compression = values['tiff_compression']
+            if isinstance(compression, str):
+                if compression not in TIFF_COMPRESSION:
+                    raise ValueError(f"不支持的TIFF压缩方式: {compression}，可选 {', '.join(TIFF_COMPRESSION)}")
+                compression = TIFF_COMPRESSION[compression]
+            params += [cv2.IMWRITE_TIFF_COMPRESSION, int(compression)]
+    return params
+
+
+class ImageWriter:
+    """异步图像保存 - 编码和写盘移出取流、拍照线程
+
+    保存请求先进入有界队列，队列满时按drop_policy处理（与FrameQueue相同，默认'block'阻塞提交方，
+    超过block_timeout仍满才丢弃）；编码线程池并行cv2.imencode（OpenCV编码时释放GIL），
+    编码结果按提交顺序交给单独的写盘线程写入文件。flush()等待已提交的图像全部写完
+    """
+
+    def __init__(self, workers=2, queue_size=16, drop_policy='block', block_timeout=5.0):
+        if workers < 1:
+            raise ValueError("编码线程数至少为1")
+        
+        self.workers = workers
+        self._queue = FrameQueue(queue_size, drop_policy, block_timeout, on_evict=self._discard)
+        self._executor = None
+        self._encoded = deque()
+        # 在途（编码中或等待写盘）的图像数不超过编码线程数的两倍，其余留在有界队列中形成反压
+        self._in_flight = threading.BoundedSemaphore(workers * 2)
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.pending = 0
+        self.written = 0
+        self.failed = 0
+
+    def submit(self, image, path, params=None, callback=None):
+        """提交一张图像，按path的扩展名编码；提交后调用方不能再修改image。被丢弃时返回False
+
+        callback: 可选，图像写入、失败或被丢弃后以 (path, 错误信息) 调用，写入成功时错误信息为None；
+                  在flush()返回前调用
+        """
+        self._start()
+        with self._condition:
+            self.pending += 1
+        item = (image, path, params or [], callback)
+        if self._queue.put(item):
+            return True
+        
+        self._discard(item)
+        return False
+
+    def _discard(self, item):
+        """队列已满时被拒绝或被drop_oldest挤出的请求不再保存"""
+        self._notify(item[3], item[1], "保存队列已满，已丢弃")
+        with self._condition:
+            self.pending -= 1
+            self._condition.notify_all()
+        logger.warning(f"图像保存队列已满，丢弃: {item[1]}")
+
+    @staticmethod
+    def _notify(callback, path, error):
+        if callback is None:
+            return
+        try:
+            callback(path, error)
+        except Exception as e:
+            logger.error(f"图像保存回调执行出错：{e}")
+
+    def flush(self, timeout=None):
+        """等待已提交的图像全部写完，超时返回False"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.pending == 0, timeout)
+
+    def close(self, timeout=None):
+        """写完已提交的图像后停止线程，之后再提交会重新启动
+
+        超过timeout仍未写完时，队列中的请求计入丢弃、已编码未写盘的计入失败，计数清零后返回False
+        """
+        flushed = self.flush(timeout)
+        with self._lock:
+            threads, self._threads = self._threads, []
+            executor, self._executor = self._executor, None
+            self._stop.set()
+            self._queue.interrupt()
+            with self._condition:
+                self._condition.notify_all()
+        for thread in threads:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        
+        abandoned = self._queue.clear()
+        self._queue.dropped += len(abandoned)
+        with self._condition:
+            encoded, self._encoded = self._encoded, deque()
+            self.failed += len(encoded)
+        for _, path, _, callback in abandoned:
+            self._notify(callback, path, "保存未完成即关闭")
+        for path, _, callback in encoded:
+            self._notify(callback, path, "保存未完成即关闭")
+        with self._condition:
+            self.pending = 0
+            self._condition.notify_all()
+        # 未写盘的编码结果不会再释放在途名额，重建信号量
+        self._in_flight = threading.BoundedSemaphore(self.workers * 2)
+        if abandoned or encoded:
+            logger.warning(f"图像保存未完成即关闭，放弃 {len(abandoned) + len(encoded)} 张图像")
+        return flushed
+
+    def get_stats(self):
+        """获取保存统计"""
+        return {
+            'pending': self.pending,
+            'written': self.written,
+            'failed': self.failed,
+            'dropped': self._queue.dropped,
+            'queue_size': self._queue.maxsize,
+            'drop_policy': self._queue.drop_policy,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-encode')
+            self._threads = [threading.Thread(target=self._dispatch_loop, args=(self._executor,),
+                                              name="image-dispatch", daemon=True),
+                             threading.Thread(target=self._write_loop, name="image-write", daemon=True)]
+            for thread in self._threads:
+                thread.start()
+
+    def _dispatch_loop(self, executor):
+        """从队列取出请求交给编码线程池，按提交顺序记录编码任务"""
+        while not self._stop.is_set():
+            item = self._queue.get(timeout=0.5)
+            if item is None:
+                continue
+            
+            self._in_flight.acquire()
+            image, path, params, callback = item
+            future = executor.submit(self._encode, image, path, params)
+            with self._condition:
+                self._encoded.append((path, future, callback))
+                self._condition.notify_all()
+
+    @staticmethod
+    def _encode(image, path, params):
+        ok, data = cv2.imencode(os.path.splitext(path)[1] or '.jpg', image, params)
+        if not ok:
+            raise ValueError("编码失败")
+        return data
+
+    def _write_loop(self):
+        """写盘线程：按提交顺序等待编码结果并写入文件"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._encoded or self._stop.is_set())
+                if not self._encoded:
+                    return
+                path, future, callback = self._encoded.popleft()
+            
+            try:
+                data = future.result()
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                data.tofile(path)
+                self.written += 1
+                logger.info(f"图像已保存：{path}")
+                self._notify(callback, path, None)
+            except (OSError, ValueError, cv2.error) as e:
+                self.failed += 1
+                logger.error(f"保存图像失败 {path}: {e}")
+                self._notify(callback, path, str(e))
+            finally:
+                self._in_flight.release()
+                with self._condition:
+                    self.pending -= 1
+                    self._condition.notify_all()
+
+
+class Frame:
+    """图像帧 - 图像数据及MV_FRAME_OUT_INFO_EX中的帧信息
+
+    pixel_type为image当前数据的像素格式（转换为BGR后即为BGR8）
+    device_timestamp为相机时钟计数，host_timestamp为主机接收时间（秒）
+    calibration_version为去畸变所用校准参数的版本，未去畸变时为None
+    """
+    
+    __slots__ = ('image', 'width', 'height', 'pixel_type', 'frame_number', 'device_timestamp',
+                 'host_timestamp', 'lost_packets', 'trigger_index', 'calibration_version')
+    
+    def __init__(self, image, width=0, height=0, pixel_type=0, frame_number=0, device_timestamp=0,
+                 host_timestamp=0.0, lost_packets=0, trigger_index=0, calibration_version=None):
+        self.image = image
+        self.width = width
+        self.height = height
+        self.pixel_type = pixel_type
+        self.frame_number = frame_number
+        self.device_timestamp = device_timestamp
+        self.host_timestamp = host_timestamp
+        self.lost_packets = lost_packets
+        self.trigger_index = trigger_index
+        self.calibration_version = calibration_version
+    
+    @staticmethod
+    def _frame_info_fields(stFrameInfo, pixel_type=None):
+        """从MV_FRAME_OUT_INFO_EX中提取帧信息"""
+        host_timestamp = getattr(stFrameInfo, 'nHostTimeStamp', 0)
+        return {
+            'width': stFrameInfo.nWidth,
+            'height': stFrameInfo.nHeight,
+            'pixel_type': stFrameInfo.enPixelType if pixel_type is None else pixel_type,
+            'frame_number': getattr(stFrameInfo, 'nFrameNum', 0),
+            'device_timestamp': (getattr(stFrameInfo, 'nDevTimeStampHigh', 0) << 32)
+                                | getattr(stFrameInfo, 'nDevTimeStampLow', 0),
+            'host_timestamp': host_timestamp / 1000.0 if host_timestamp else time.time(),
+            'lost_packets': getattr(stFrameInfo, 'nLostPacket', 0),
+            'trigger_index': getattr(stFrameInfo, 'nTriggerIndex', 0),
+        }
+
+    @classmethod
+    def from_frame_info(cls, image, stFrameInfo, pixel_type=None):
+        """由图像和SDK帧信息创建帧"""
+        return cls(image, **cls._frame_info_fields(stFrameInfo, pixel_type))
+
+    def with_image(self, image, pixel_type=None, calibration_version=None):
+        """创建保留帧信息、替换图像数据的新帧（如去畸变后的图像）"""
+        height, width = image.shape[:2]
+        if calibration_version is None:
+            calibration_version = self.calibration_version
+        return Frame(image, width, height, self.pixel_type if pixel_type is None else pixel_type,
+                     self.frame_number, self.device_timestamp, self.host_timestamp,
+                     self.lost_packets, self.trigger_index, calibration_version)
+
+    def undistorted(self, calibration, profile=None):
+        """用calibration去畸变（可按输出配置缩放），返回记录了校准版本的新帧（未能去畸变时不记录）"""
+        height, width = self.image.shape[:2]
+        return self.with_image(calibration.undistort_image(self.image, profile),
+                               calibration_version=calibration.rectified_version(width, height))
+
+
+class ImageBufferFrame(Frame):
+    """SDK图像缓冲帧 - 以只读NumPy视图直接引用SDK内部缓冲区
+
+    零拷贝帧在release()之前一直占用SDK的一个缓存节点，建议配合with语句使用；
+    需要长期保存图像时调用detach()拷贝出独立图像并立即释放缓冲区
+    """
+
+    __slots__ = ('_camera', '_out_frame', '__weakref__')
+
+    def __init__(self, camera, out_frame, image, stFrameInfo, pixel_type=None):
+        Frame.__init__(self, image, **Frame._frame_info_fields(stFrameInfo, pixel_type))
+        self._camera = camera
+        self._out_frame = out_frame
+
+    @property
+    def zero_copy(self):
+        """图像是否仍直接引用SDK缓冲区"""
+        return self._out_frame is not None
+
+    def release(self):
+        """释放SDK缓冲区，之后不能再访问image"""
+        if self._out_frame is not None:
+            self._camera._free_image_buffer(self._out_frame)
+            self._out_frame = None
+            self.image = None
+
+    def detach(self):
+        """拷贝出拥有独立内存的图像并释放SDK缓冲区"""
+        image = self.image.copy() if self.zero_copy else self.image
+        self.release()
+        self.image = image
+        return image
+
+    def to_bgr(self, calibration=None, profile=None):
+        """生成拥有独立内存的BGR图像，可选先在原始格式上去畸变（按输出配置缩放），颜色转换只处理输出图像"""
+        image = self.image
+        if calibration:
+            image = calibration.undistort_image(image, profile)
+        
+        if self.pixel_type == PixelType_Gvsp_Mono8:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif self.pixel_type == PixelType_Gvsp_RGB8_Packed:
+            return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        elif image is self.image and self.zero_copy:
+            return image.copy()
+        return image
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+    def __del__(self):
+        if getattr(self, '_out_frame', None) is not None:
+            logger.warning("SDK图像缓冲区未显式释放，已自动回收")
+            self.release()
+
+
+class SharedMemoryFrame(Frame):
+    """共享内存帧 - 图像为工作进程共享内存环形缓冲中某个槽位的NumPy视图
+    
+    release()之前该槽位不会被工作进程复用；需要长期保存图像时调用detach()拷贝
+    """
+    
+    __slots__ = ('_worker', '_slot', '__weakref__')
+    
+    def __init__(self, worker, slot, image, **fields):
+        Frame.__init__(self, image, **fields)
+        self._worker = worker
+        self._slot = slot
+    
+    @property
+    def zero_copy(self):
+        """图像是否仍直接引用共享内存"""
+        return self._slot is not None
+    
+    def release(self):
+        """归还槽位，之后不能再访问image"""
+        if self._slot is not None:
+            self._worker.release_slot(self._slot)
+            self._slot = None
+            self.image = None
+    
+    def detach(self):
+        """拷贝出拥有独立内存的图像并归还槽位"""
+        image = self.image.copy() if self.zero_copy else self.image
+        self.release()
+        self.image = image
+        return image
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+    
+    def __del__(self):
+        if getattr(self, '_slot', None) is not None:
+            self.release()
+
+
+class ParameterCache:
+    """相机参数缓存 - 连接后一次性读取常用参数，之后从内存读取，写入或重配时失效"""
+
+    def __init__(self, features=None):
+        # 特征名 -> 类型('int'/'float'/'enum'/'bool')
+        self.features = dict(features or {})
+        self._values = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped_writes = 0
+
+    def get(self, name):
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            if name in self._values:
+                self.hits += 1
+                return True, self._values[name]
+            self.misses += 1
+            return False, None
+
+    def store(self, name, value):
+        with self._lock:
+            self._values[name] = value
+
+    def invalidate(self, names=None):
+        """使指定参数失效，names为None时清空全部"""
+        with self._lock:
+            if names is None:
+                self._values.clear()
+                return
+            for name in names:
+                self._values.pop(name, None)
+
+    def snapshot(self):
+        """返回当前缓存内容的副本"""
+        with self._lock:
+            return dict(self._values)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'cached': len(self._values),
+                'hits': self.hits,
+                'misses': self.misses,
+                'skipped_writes': self.skipped_writes,
+            }
+
+
+class CameraBackend:
+    """相机后端接口 - 控制器只通过后端访问设备
+    
+    方法返回SDK风格的错误码（0表示成功，错误码含义同MV_E_*），取流、帧分发、缓冲池、
+    去畸变和录像等流程与具体后端无关。帧信息填入MV_FRAME_OUT_INFO_EX，像素格式使用SDK的
+    PixelType编号。可选功能的默认实现返回MV_E_SUPPORT
+    """
+    
+    name = None
+    
+    # 非SDK错误码：有限数据源（如回放）已全部输出，之后不会再有新帧
+    END_OF_STREAM = 0x8000F001
+    
+    def enumerate_devices(self):
+        """枚举设备，返回设备描述字典列表（name/transport等），失败返回None"""
+        raise NotImplementedError
+    
+    def describe_device(self, device):
+        """返回可写入磁盘缓存、之后不经枚举直接传给open()的设备描述，不支持时返回None"""
+        return None
+    
+    def is_device_accessible(self, device):
+        """设备当前能否被打开（未被其他句柄或进程占用）"""
+        return True
+    
+    def open(self, device):
+        """打开enumerate_devices返回（或describe_device描述）的设备"""
+        raise NotImplementedError
+    
+    def close(self):
+        """关闭设备"""
+        raise NotImplementedError
+    
+    def start_grabbing(self):
+        raise NotImplementedError
+    
+    def stop_grabbing(self):
+        raise NotImplementedError
+    
+    def get_frame(self, buffer, frame_info, timeout):
+        """等待一帧（timeout毫秒），拷贝到ctypes缓冲区buffer并填写frame_info；数据源结束时返回END_OF_STREAM"""
+        raise NotImplementedError
+    
+    def get_feature(self, name, kind):
+        """读取参数，kind为int/float/bool/enum，返回 (错误码, 值)"""
+        raise NotImplementedError
+    
+    def get_feature_range(self, name):
+        """读取整型参数的范围，返回 (错误码, {'value', 'min', 'max', 'inc'})"""
+        return 0x80000002, None  # MV_E_SUPPORT
+    
+    def set_feature(self, name, kind, value):
+        """写入参数，枚举参数可以是编号或字符串"""
+        raise NotImplementedError
+    
+    def execute_command(self, name):
+        """执行命令参数，如TriggerSoftware"""
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def set_image_node_num(self, num):
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def set_grab_strategy(self, strategy):
+        """strategy为取图策略编号，与HikvisionCameraLinux.GRAB_STRATEGIES一致"""
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def set_output_queue_size(self, size):
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def register_image_callback(self, callback):
+        """注册图像回调callback(pData, stFrameInfo)，须在开始取流前调用"""
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def get_image_buffer(self, out_frame, timeout):
+        """零拷贝取图，填写MV_FRAME_OUT，用完须调用free_image_buffer"""
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def free_image_buffer(self, out_frame):
+        return 0x80000002  # MV_E_SUPPORT
+    
+    def convert_pixel_type(self, pData, frame_info, dst_buffer):
+        """将Mono8/RGB8/BGR8以外的像素格式转换为BGR8写入dst_buffer"""
+        return 0x80000002  # MV_E_SUPPORT
+
+
+class HikvisionBackend(CameraBackend):
+    """海康威视MVS SDK后端，SDK不可用时使用模拟相机"""
+    
+    name = 'hikvision'
+    
+    def __init__(self):
+        load_sdk()
+        self.camera = MvCamera()
+        self._image_callback = None
+        logger.info("相机SDK实例创建成功")
+    
+    def enumerate_devices(self):
+        device_list = MV_CC_DEVICE_INFO_LIST()
+        tlayerType = MV_GIGE_DEVICE | MV_USB_DEVICE
+        
+        ret = MvCamera.MV_CC_EnumDevices(tlayerType, device_list)
+        if ret != 0:
+            logger.error(f"枚举设备失败，错误码：{ret:x}")
+            return None
+        
+        devices = []
+        for i in range(device_list.nDeviceNum):
+            mvcc_dev_info = cast(device_list.pDeviceInfo[i], POINTER(MV_CC_DEVICE_INFO)).contents
+            device = {'info': mvcc_dev_info, 'name': '未知名称'}
+            
+            if mvcc_dev_info.nTLayerType == MV_GIGE_DEVICE:
+                device['transport'] = 'GigE'
+                device['ip'] = self._parse_ip(mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp)
+                device['net_ip'] = self._parse_ip(mvcc_dev_info.SpecialInfo.stGigEInfo.nNetExport)
+                name_array = mvcc_dev_info.SpecialInfo.stGigEInfo.chUserDefinedName
+            elif mvcc_dev_info.nTLayerType == MV_USB_DEVICE:
+                device['transport'] = 'USB'
+                name_array = mvcc_dev_info.SpecialInfo.stUsb3VInfo.chUserDefinedName
+            else:
+                device['transport'] = f"{mvcc_dev_info.nTLayerType:#x}"
+                name_array = None
+            
+            try:
+                # 安全地处理设备名称
+                if hasattr(name_array, 'value'):
+                    device['name'] = name_array.value.decode('ascii', errors='ignore')
+                elif name_array is not None:
+                    # 处理c_ubyte数组
+                    name_bytes = bytes(name_array)
+                    device['name'] = name_bytes.decode('ascii', errors='ignore').rstrip('\x00')
+            except Exception as e:
+                logger.warning(f"  [{i}] {device['transport']}设备 - 名称解析失败: {e}")
+            devices.append(device)
+        return devices
+    
+    def _parse_ip(self, ip_int):
+        """解析IP地址"""
+        return f"{(ip_int >> 24) & 0xFF}.{(ip_int >> 16) & 0xFF}.{(ip_int >> 8) & 0xFF}.{ip_int & 0xFF}"
+    
+    def _pack_ip(self, ip):
+        """IP地址字符串转为SDK使用的整数"""
+        a, b, c, d = (int(part) for part in ip.split('.'))
+        return (a << 24) | (b << 16) | (c << 8) | d
+    
+    def describe_device(self, device):
+        # GigE相机可按IP直连，免去枚举时的广播等待；USB相机必须枚举
+        if device.get('transport') != 'GigE' or not device.get('net_ip'):
+            return None
+        return {key: device[key] for key in ('name', 'transport', 'ip', 'net_ip')}
+    
+    def _device_info(self, device):
+        """取设备的SDK设备信息，缓存的GigE设备按相机IP和主机网口IP构造（同MVS示例ConnectSpecCamera）"""
+        if 'info' not in device:
+            if device.get('transport') != 'GigE':
+                return None
+            gige_info = MV_GIGE_DEVICE_INFO()
+            gige_info.nCurrentIp = self._pack_ip(device['ip'])
+            gige_info.nNetExport = self._pack_ip(device['net_ip'])
+            device_info = MV_CC_DEVICE_INFO()
+            device_info.nTLayerType = MV_GIGE_DEVICE
+            device_info.SpecialInfo.stGigEInfo = gige_info
+            device['info'] = device_info
+        return device['info']
+    
+    def is_device_accessible(self, device):
+        device_info = self._device_info(device)
+        return device_info is not None and bool(MvCamera.MV_CC_IsDeviceAccessible(device_info, MV_ACCESS_Exclusive))
+    
+    def open(self, device):
+        device_info = self._device_info(device)
+        if device_info is None:
+            logger.error("设备信息无效，请重新枚举设备")
+            return 0x80000005  # MV_E_PARAMETER
+        
+        ret = self.camera.MV_CC_CreateHandle(device_info)
+        if ret != 0:
+            logger.error(f"创建设备句柄失败，错误码：{ret:x}")
+            return ret
+        
+        ret = self.camera.MV_CC_OpenDevice(MV_ACCESS_Exclusive, 0)
+        if ret != 0:
+            logger.error(f"打开设备失败，错误码：{ret:x}")
+            self.camera.MV_CC_DestroyHandle()
+            return ret
+        
+        # 检测网络最佳包大小（仅GigE相机）
+        if device['transport'] == 'GigE':
+            nPacketSize = self.camera.MV_CC_GetOptimalPacketSize()
+            if int(nPacketSize) > 0:
+                ret = self.camera.MV_CC_SetIntValue("GevSCPSPacketSize", nPacketSize)
+                if ret != 0:
+                    logger.warning(f"设置包大小失败，错误码：{ret:x}")
+        return 0
+    
+    def close(self):
+        ret = self.camera.MV_CC_CloseDevice()
+        if ret != 0:
+            logger.error(f"关闭设备失败，错误码：{ret:x}")
+        
+        destroy_ret = self.camera.MV_CC_DestroyHandle()
+        if destroy_ret != 0:
+            logger.error(f"销毁设备句柄失败，错误码：{destroy_ret:x}")
+        self._image_callback = None
+        return ret or destroy_ret
+    
+    def start_grabbing(self):
+        return self.camera.MV_CC_StartGrabbing()
+    
+    def stop_grabbing(self):
+        return self.camera.MV_CC_StopGrabbing()
+    
+    def get_frame(self, buffer, frame_info, timeout):
+        return self.camera.MV_CC_GetOneFrameTimeout(buffer, sizeof(buffer), frame_info, timeout)
+    
+    def get_feature(self, name, kind):
+        try:
+            if kind == 'int':
+                stIntValue = MVCC_INTVALUE()
+                memset(byref(stIntValue), 0, sizeof(MVCC_INTVALUE))
+                return self.camera.MV_CC_GetIntValue(name, stIntValue), stIntValue.nCurValue
+            if kind == 'enum':
+                stEnumValue = MVCC_ENUMVALUE()
+                memset(byref(stEnumValue), 0, sizeof(MVCC_ENUMVALUE))
+                return self.camera.MV_CC_GetEnumValue(name, stEnumValue), stEnumValue.nCurValue
+            if kind == 'float':
+                stFloatValue = MVCC_FLOATVALUE()
+                memset(byref(stFloatValue), 0, sizeof(MVCC_FLOATVALUE))
+                return self.camera.MV_CC_GetFloatValue(name, stFloatValue), stFloatValue.fCurValue
+            if kind == 'bool':
+                bValue = ctypes.c_bool(False)
+                return self.camera.MV_CC_GetBoolValue(name, bValue), bool(bValue.value)
+        except Exception as e:
+            logger.debug(f"读取参数 {name} 时出错: {e}")
+            return 0x80000010, None  # MV_E_UNKNOW
+        raise ValueError(f"不支持的参数类型: {kind}")
+    
+    def get_feature_range(self, name):
+        stIntValue = MVCC_INTVALUE()
+        memset(byref(stIntValue), 0, sizeof(MVCC_INTVALUE))
+        ret = self.camera.MV_CC_GetIntValue(name, stIntValue)
+        if ret != 0:
+            return ret, None
+        return 0, {'value': int(stIntValue.nCurValue), 'min': int(stIntValue.nMin),
+                   'max': int(stIntValue.nMax), 'inc': int(stIntValue.nInc)}
+    
+    def set_feature(self, name, kind, value):
+        if kind == 'int':
+            return self.camera.MV_CC_SetIntValue(name, int(value))
+        if kind == 'float':
+            return self.camera.MV_CC_SetFloatValue(name, float(value))
+        if kind == 'bool':
+            return self.camera.MV_CC_SetBoolValue(name, bool(value))
+        if kind == 'enum':
+            if isinstance(value, str):
+                return self.camera.MV_CC_SetEnumValueByString(name, value)
+            return self.camera.MV_CC_SetEnumValue(name, int(value))
+        raise ValueError(f"不支持的参数类型: {kind}")
+    
+    def execute_command(self, name):
+        return self.camera.MV_CC_SetCommandValue(name)
+    
+    def set_image_node_num(self, num):
+        return self.camera.MV_CC_SetImageNodeNum(int(num))
+    
+    def set_grab_strategy(self, strategy):
+        return self.camera.MV_CC_SetGrabStrategy(int(strategy))
+    
+    def set_output_queue_size(self, size):
+        return self.camera.MV_CC_SetOutputQueueSize(int(size))
+    
+    def register_image_callback(self, callback):
+        def image_callback(pData, pFrameInfo, pUser):
+            stFrameInfo = pFrameInfo.contents if hasattr(pFrameInfo, 'contents') else pFrameInfo
+            callback(pData, stFrameInfo)
+        
+        try:
+            callback_type = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_ubyte),
+                                             ctypes.POINTER(MV_FRAME_OUT_INFO_EX), ctypes.c_void_p)
+            # 保存引用，防止回调对象被回收
+            self._image_callback = callback_type(image_callback)
+        except TypeError:
+            # 模拟SDK的结构体不是ctypes类型，直接传入Python函数
+            self._image_callback = image_callback
+        
+        ret = self.camera.MV_CC_RegisterImageCallBackEx(self._image_callback, None)
+        if ret != 0:
+            self._image_callback = None
+        return ret
+    
+    def get_image_buffer(self, out_frame, timeout):
+        return self.camera.MV_CC_GetImageBuffer(out_frame, timeout)
+    
+    def free_image_buffer(self, out_frame):
+        return self.camera.MV_CC_FreeImageBuffer(out_frame)
+    
+    def convert_pixel_type(self, pData, frame_info, dst_buffer):
+        stConvertParam = MV_CC_PIXEL_CONVERT_PARAM()
+        memset(byref(stConvertParam), 0, sizeof(stConvertParam))
+        stConvertParam.nWidth = frame_info.nWidth
+        stConvertParam.nHeight = frame_info.nHeight
+        stConvertParam.pSrcData = pData
+        stConvertParam.nSrcDataLen = frame_info.nFrameLen
+        stConvertParam.enSrcPixelType = frame_info.enPixelType
+        stConvertParam.enDstPixelType = PixelType_Gvsp_BGR8_Packed
+        stConvertParam.pDstBuffer = dst_buffer
+        stConvertParam.nDstBufferSize = len(dst_buffer)
+        return self.camera.MV_CC_ConvertPixelType(stConvertParam)
+
+
+class OpenCVBackend(CameraBackend):
+    """OpenCV VideoCapture后端 - UVC等免驱相机，Linux下通过V4L2访问
+    
+    常用参数映射到VideoCapture属性（V4L2下曝光时间和自动曝光按SDK的单位和取值换算）；
+    图像按BGR8（灰度相机Mono8）输出，不支持ROI、合并、触发和零拷贝取图（ROI偏移和合并倍数读取时返回MV_E_SUPPORT，
+    去畸变按图像尺寸换算内参）；
+    取图阻塞在VideoCapture.read()上，不支持取图超时
+    """
+    
+    name = 'opencv'
+    
+    FEATURE_PROPERTIES = {
+        'Width': cv2.CAP_PROP_FRAME_WIDTH,
+        'Height': cv2.CAP_PROP_FRAME_HEIGHT,
+        'AcquisitionFrameRate': cv2.CAP_PROP_FPS,
+        'ResultingFrameRate': cv2.CAP_PROP_FPS,
+        'ExposureTime': cv2.CAP_PROP_EXPOSURE,
+        'ExposureAuto': cv2.CAP_PROP_AUTO_EXPOSURE,
+        'Gain': cv2.CAP_PROP_GAIN,
+        'Brightness': cv2.CAP_PROP_BRIGHTNESS,
+    }
+    
+    # V4L2: exposure_absolute单位为100微秒；auto_exposure 1为手动，3为光圈优先（自动）
+    V4L2_EXPOSURE_UNIT = 100.0
+    V4L2_EXPOSURE_AUTO = {0: 1, 2: 3}
+    EXPOSURE_AUTO_NAMES = {'Off': 0, 'Continuous': 2}
+    
+    # 非Linux平台探测的最大设备编号
+    MAX_PROBE_DEVICES = 8
+    
+    def __init__(self, api_preference=None):
+        # 帧信息和像素格式使用SDK的结构体和常量
+        load_sdk()
+        if api_preference is None:
+            api_preference = cv2.CAP_V4L2 if sys.platform.startswith('linux') else cv2.CAP_ANY
+        self.api_preference = api_preference
+        self.capture = None
+        self.width = 0
+        self.height = 0
+        self.channels = 3
+        self._lock = threading.Lock()
+        self._grabbing = False
+        self._frame_number = 0
+        self._callback = None
+        self._callback_thread = None
+    
+    @property
+    def _v4l2(self):
+        return self.api_preference == cv2.CAP_V4L2
+    
+    def enumerate_devices(self):
+        devices = []
+        if sys.platform.startswith('linux'):
+            nodes = [path for path in Path('/dev').glob('video*') if path.name[5:].isdigit()]
+            for path in sorted(nodes, key=lambda path: int(path.name[5:])):
+                sysfs = Path('/sys/class/video4linux') / path.name
+                # 同一相机的元数据节点index不为0，不能取图
+                index_file = sysfs / 'index'
+                if index_file.exists() and index_file.read_text().strip() not in ('', '0'):
+                    continue
+                name_file = sysfs / 'name'
+                name = name_file.read_text().strip() if name_file.exists() else path.name
+                devices.append({'id': int(path.name[5:]), 'path': str(path), 'name': name, 'transport': 'V4L2'})
+            return devices
+        
+        for index in range(self.MAX_PROBE_DEVICES):
+            capture = cv2.VideoCapture(index, self.api_preference)
+            if capture.isOpened():
+                devices.append({'id': index, 'name': f"OpenCV Camera {index}", 'transport': 'OpenCV'})
+            capture.release()
+        return devices
+    
+    def open(self, device):
+        capture = cv2.VideoCapture(device['id'], self.api_preference)
+        if not capture.isOpened():
+            logger.error(f"无法打开视频设备: {device.get('path', device['id'])}")
+            return 0x80000006  # MV_E_RESOURCE
+        self.capture = capture
+        self._update_size()
+        return 0
+    
+    def _update_size(self):
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    
+    def close(self):
+        self.stop_grabbing()
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        self._callback = None
+        return 0
+    
+    def start_grabbing(self):
+        if self.capture is None or self._grabbing:
+            return 0x80000004  # MV_E_CALLORDER
+        self._grabbing = True
+        if self._callback is not None:
+            self._callback_thread = threading.Thread(target=self._callback_loop, name="opencv-callback", daemon=True)
+            self._callback_thread.start()
+        return 0
+    
+    def stop_grabbing(self):
+        self._grabbing = False
+        if self._callback_thread is not None and self._callback_thread is not threading.current_thread():
+            self._callback_thread.join()
+        self._callback_thread = None
+        return 0
+    
+    def _read(self, buffer, frame_info):
+        """读取一帧写入缓冲区并填写帧信息"""
+        with self._lock:
+            ret, image = self.capture.read()
+        if not ret or image is None:
+            return 0x80000007  # MV_E_NODATA
+        
+        height, width = image.shape[:2]
+        self.width, self.height = width, height
+        self.channels = 1 if image.ndim == 2 else 3
+        self._frame_number += 1
+        if image.size > len(buffer):
+            return 0x8000000A  # MV_E_NOENOUGH_BUF，分辨率已变化
+        
+        np.frombuffer(buffer, dtype=np.uint8, count=image.size)[...] = image.reshape(-1)
+        frame_info.nWidth = width
+        frame_info.nHeight = height
+        frame_info.enPixelType = PixelType_Gvsp_Mono8 if self.channels == 1 else PixelType_Gvsp_BGR8_Packed
+        frame_info.nFrameLen = image.size
+        frame_info.nFrameNum = self._frame_number
+        # V4L2下POS_MSEC为驱动给出的采集时间戳
+        timestamp = int(self.capture.get(cv2.CAP_PROP_POS_MSEC) * 1000000) or time.monotonic_ns()
+        frame_info.nDevTimeStampHigh = timestamp >> 32
+        frame_info.nDevTimeStampLow = timestamp & 0xFFFFFFFF
+        frame_info.nHostTimeStamp = int(time.time() * 1000)
+        frame_info.nLostPacket = 0
+        return 0
+    
+    def get_frame(self, buffer, frame_info, timeout):
+        """读取下一帧；忽略timeout，VideoCapture.read()阻塞到下一帧或驱动超时（V4L2约10秒）"""
+        if not self._grabbing or self._callback is not None:
+            return 0x80000004  # MV_E_CALLORDER
+        if len(buffer) < self.width * self.height * self.channels:
+            return 0x8000000A  # MV_E_NOENOUGH_BUF
+        return self._read(buffer, frame_info)
+    
+    def register_image_callback(self, callback):
+        if self._grabbing:
+            return 0x80000004  # MV_E_CALLORDER
+        self._callback = callback
+        return 0
+    
+    def _callback_loop(self):
+        """读取线程：每读到一帧调用一次图像回调"""
+        buffer = None
+        while self._grabbing:
+            frame_size = self.width * self.height * self.channels
+            if buffer is None or len(buffer) < frame_size:
+                buffer = (ctypes.c_ubyte * frame_size)()
+            frame_info = MV_FRAME_OUT_INFO_EX()
+            ret = self._read(buffer, frame_info)
+            if ret == 0:
+                self._callback(buffer, frame_info)
+            elif ret == 0x80000007:
+                time.sleep(0.01)
+    
+    def get_feature(self, name, kind):
+        # 图像在传感器上的位置和合并倍数未知，OffsetX/Binning等不提供（MV_E_SUPPORT）
+        values = {'PayloadSize': self.width * self.height * self.channels,
+                  'PixelFormat': PixelType_Gvsp_Mono8 if self.channels == 1 else PixelType_Gvsp_BGR8_Packed,
+                  'TriggerMode': MV_TRIGGER_MODE_OFF, 'GevTimestampTickFrequency': 1000000000}
+        if name in values:
+            return 0, values[name]
+        if name not in self.FEATURE_PROPERTIES or self.capture is None:
+            return 0x80000002, None  # MV_E_SUPPORT
+        
+        value = self.capture.get(self.FEATURE_PROPERTIES[name])
+        if self._v4l2 and name == 'ExposureTime':
+            value *= self.V4L2_EXPOSURE_UNIT
+        elif self._v4l2 and name == 'ExposureAuto':
+            value = {v: k for k, v in self.V4L2_EXPOSURE_AUTO.items()}.get(int(value), int(value))
+        if kind in ('int', 'enum'):
+            value = int(value)
+        elif kind == 'bool':
+            value = bool(value)
+        return 0, value
+    
+    def get_feature_range(self, name):
+        ret, value = self.get_feature(name, 'int')
+        if ret != 0:
+            return ret, None
+        # VideoCapture无法查询范围，只能保持当前值
+        return 0, {'value': value, 'min': value, 'max': value, 'inc': 1}
+    
+    def set_feature(self, name, kind, value):
+        if name == 'TriggerMode':
+            return 0 if int(value) == MV_TRIGGER_MODE_OFF else 0x80000002  # MV_E_SUPPORT
+        if name not in self.FEATURE_PROPERTIES or self.capture is None:
+            ret, current = self.get_feature(name, kind)
+            return 0 if ret == 0 and current == value else 0x80000002  # MV_E_SUPPORT
+        
+        if name == 'ExposureAuto' and isinstance(value, str):
+            if value not in self.EXPOSURE_AUTO_NAMES:
+                return 0x80000002  # MV_E_SUPPORT
+            value = self.EXPOSURE_AUTO_NAMES[value]
+        if self._v4l2 and name == 'ExposureTime':
+            value = float(value) / self.V4L2_EXPOSURE_UNIT
+        elif self._v4l2 and name == 'ExposureAuto':
+            value = self.V4L2_EXPOSURE_AUTO.get(int(value), int(value))
+        
+        with self._lock:
+            success = self.capture.set(self.FEATURE_PROPERTIES[name], float(value))
+            if name in ('Width', 'Height'):
+                self._update_size()
+        return 0 if success else 0x80000002  # MV_E_SUPPORT
+    
+    def set_image_node_num(self, num):
+        # V4L2驱动缓冲区数量
+        return 0 if self.capture.set(cv2.CAP_PROP_BUFFERSIZE, int(num)) else 0x80000002  # MV_E_SUPPORT
+
+
+# 可通过名称选择的相机后端
+CAMERA_BACKENDS = {
+    'hikvision': HikvisionBackend,
+    'opencv': OpenCVBackend,
+}
+
+
+def create_backend(backend=None):
+    """按名称创建相机后端，None为海康威视SDK后端，后端实例原样返回"""
+    if isinstance(backend, CameraBackend):
+        return backend
+    name = backend or 'hikvision'
+    if name not in CAMERA_BACKENDS:
+        raise ValueError(f"不支持的相机后端: {name}")
+    return CAMERA_BACKENDS[name]()
+
+
+def discover_devices(backend, use_cache=False):
+    """用后端枚举设备或读取磁盘缓存的设备列表，返回 (设备列表, 是否来自缓存)，失败时设备列表为None"""
+    cache_name = DEVICE_CACHE_FILE.format(backend=backend.name)
+    if use_cache:
+        devices = _load_cache(cache_name)
+        if isinstance(devices, list) and devices and all(isinstance(device, dict) for device in devices):
+            logger.info(f"使用缓存的设备列表，共 {len(devices)} 个设备")
+            return devices, True
+    
+    devices = backend.enumerate_devices()
+    if devices is None:
+        return None, False
+    
+    if not devices:
+        logger.warning("未发现设备")
+        return None, False
+    
+    logger.info(f"发现 {len(devices)} 个设备:")
+    for i, device in enumerate(devices):
+        logger.info(f"  [{i}] {device['transport']}设备: {device['name']}")
+        if device.get('ip'):
+            logger.info(f"      IP: {device['ip']}")
+    
+    descriptions = [backend.describe_device(device) for device in devices]
+    if all(descriptions):
+        _save_cache(cache_name, descriptions)
+    return devices, False
+
+
+class HikvisionCameraLinux:
+    """海康威视相机控制类 - Linux版本"""
+    
+    # 各类订阅者默认的队列深度和丢帧策略
+    SUBSCRIBER_DEFAULTS = {
+        'recorder': (32, 'block'),
+        'continuous': (1, 'drop_oldest'),
+        'preview': (1, 'drop_oldest'),
+    }
+    
+    # 打开设备时视为设备被占用、需等待后重试的错误码，及最长等待时间(秒)
+    OPEN_RETRY_ERRORS = (0x80000004, 0x80000011)  # MV_E_CALLORDER, MV_E_ACCESS_DENIED
+    OPEN_RETRY_TIMEOUT = 3.0
+    
+    # 停止拍照、断开连接、重新配置时等待后台写完图像的最长时间(秒)
+    WRITER_TIMEOUT = 30.0
+    
+    # SDK取图策略，对应MV_GRAB_STRATEGY
+    GRAB_STRATEGIES = {
+        'one_by_one': 0,   # MV_GrabStrategy_OneByOne 按到达顺序逐帧取出
+        'latest_only': 1,  # MV_GrabStrategy_LatestImagesOnly 只保留最新一帧
+        'latest_n': 2,     # MV_GrabStrategy_LatestImages 保留最新N帧(N为输出队列大小)
+        'upcoming': 3,     # MV_GrabStrategy_UpcomingImage 丢弃缓存，等待下一帧
+    }
+    
+    # 连接后一次性读取并缓存的参数及其类型
+    CACHED_FEATURES = {
+        'Width': 'int',
+        'Height': 'int',
+        'OffsetX': 'int',
+        'OffsetY': 'int',
+        'PayloadSize': 'int',
+        'PixelFormat': 'enum',
+        'BinningHorizontal': 'enum',
+        'BinningVertical': 'enum',
+        'DecimationHorizontal': 'enum',
+        'DecimationVertical': 'enum',
+        'TriggerMode': 'enum',
+        'ExposureAuto': 'enum',
+        'GainAuto': 'enum',
+        'ExposureTime': 'float',
+        'Gain': 'float',
+        'AcquisitionFrameRate': 'float',
+        'AcquisitionFrameRateEnable': 'bool',
+        'GevTimestampTickFrequency': 'int',
+    }
+    
+    # 写入后会改变的关联参数
+    DEPENDENT_FEATURES = {
+        'Width': ('PayloadSize', 'OffsetX'),
+        'Height': ('PayloadSize', 'OffsetY'),
+        'PixelFormat': ('PayloadSize',),
+        'BinningHorizontal': ('Width', 'Height', 'OffsetX', 'OffsetY', 'PayloadSize'),
+        'BinningVertical': ('Width', 'Height', 'OffsetX', 'OffsetY', 'PayloadSize'),
+        'DecimationHorizontal': ('Width', 'Height', 'OffsetX', 'OffsetY', 'PayloadSize'),
+        'DecimationVertical': ('Width', 'Height', 'OffsetX', 'OffsetY', 'PayloadSize'),
+        'ExposureAuto': ('ExposureTime',),
+        'GainAuto': ('Gain',),
+        'ExposureTime': ('AcquisitionFrameRate',),
+        'AcquisitionFrameRateEnable': ('AcquisitionFrameRate',),
+    }
+    
+    def __init__(self, calibration=None, backend=None):
+        # 帧信息结构体和像素格式常量来自SDK（或模拟SDK），与所用后端无关
+        load_sdk()
+        # 相机后端实例或名称（见CAMERA_BACKENDS），默认使用海康威视SDK（不可用时为模拟相机）
+        try:
+            self.backend = create_backend(backend)
+        except Exception as e:
+            logger.error(f"相机后端创建失败: {e}")
+            self.backend = None
+        
+        self.device_list = None
+        # device_list来自磁盘缓存时，打开失败会重新枚举
+        self.device_list_cached = False
+        self.is_connected = False
+        self.is_grabbing = False
+        self.calibration = calibration
+        
+        # 帧缓冲池，在开始取流时按相机负载大小配置
+        self.buffer_pool = FrameBufferPool()
+        
+        # 取图方式: 'poll' 主动调用GetOneFrameTimeout, 'callback' 由SDK回调推送
+        self.acquisition_mode = 'poll'
+        self._callback_registered = False
+        
+        # 帧分发: 取流线程或SDK回调产生的帧分发给录像、连续拍照、预览等订阅者
+        self.dispatcher = FrameDispatcher()
+        self.subscriber_config = dict(self.SUBSCRIBER_DEFAULTS)
+        self._grabber_thread = None
+        self._grabber_stop = threading.Event()
+        
+        # 帧统计: 按帧号跳变检测相机/传输丢帧
+        self.frame_stats = {'received': 0, 'dropped': 0, 'lost_packets': 0, 'incomplete_frames': 0}
+        self._last_frame_number = None
+        self._stats_lock = threading.Lock()
+        
+        # 零拷贝取图: 通过MV_CC_GetImageBuffer直接引用SDK缓冲区
+        self.zero_copy = False
+        # 数据源（回放）已全部输出，开始取流时复位
+        self._end_of_stream = False
+        self._outstanding_buffers = weakref.WeakSet()
+        
+        # 为False时录像、连续拍照等保存原始帧，由调用方通过calibration的点坐标方法校正测量结果
+        self.undistort_frames = True
+        # 去畸变时使用的校准输出配置（见CameraCalibration.set_output_profile），None为原尺寸
+        self.output_profile = None
+        
+        # 拍照保存在后台编码写盘，不阻塞取图，见configure_writer
+        self.writer = ImageWriter()
+        # 保存图像的编码配置和覆盖参数，见set_encoding
+        self.encoding = {'profile': 'balanced'}
+        self._calibration_swap_lock = threading.Lock()
+        if calibration:
+            calibration.freeze()
+        # 录像中使用过的校准版本: [(起始帧序号, 版本)]
+        self.recording_calibration_versions = []
+        
+        # 参数缓存，避免每次查询都访问设备（GigE上每次读取都是一次网络往返）
+        self.parameters = ParameterCache(self.CACHED_FEATURES)
+        
+        # SDK内部缓存节点数和取图策略，None表示使用SDK默认值
+        self.image_node_num = None
+        self.grab_strategy = None
+        self.output_queue_size = None
+        
+        # 录像相关
+        self.video_writer = None
+        self.is_recording = False
+        self.record_thread = None
+        self.capture_thread = None
+        self._record_stop = threading.Event()
+        self._continuous_stop = threading.Event()
+        
+        # 连续拍照相关
+        self.continuous_capture = False
+        self.capture_interval = 1.0
+        self.capture_count = 0
+        
+        # 触发模式: 'off' 自由取流, 'software' 软触发, 'line' 外部线路触发
+        self.trigger_mode = 'off'
+        self.trigger_source = None
+        self.trigger_activation = None
+        self._continuous_restore_trigger = None
+        
+        # 信号处理
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
     
     def _signal_handler(self, signum, frame):
         """信号处理器"""
@@ -372,474 +2949,2570 @@ class HikvisionCameraLinux:
         self.stop_all_operations()
         sys.exit(0)
     
-    def discover_devices(self):
-        """发现设备"""
-        device_list = MV_CC_DEVICE_INFO_LIST()
-        tlayerType = MV_GIGE_DEVICE | MV_USB_DEVICE
+    def discover_devices(self, use_cache=False):
+        """发现设备
+        
+        use_cache为True时优先使用上次枚举时缓存在磁盘上的设备列表，跳过枚举（GigE枚举需等待广播应答）；
+        只有全部设备都能免枚举打开时才写入缓存，缓存的设备打开失败时connect会重新枚举
+        """
+        if self.backend is None:
+            logger.error("相机后端未创建")
+            return False
+        
+        devices, cached = discover_devices(self.backend, use_cache)
+        if devices is None:
+            return False
+        self.device_list = devices
+        self.device_list_cached = cached
+        return True
+
+    def _get_error_message(self, error_code):
+        """获取错误码对应的消息"""
+        error_messages = {
+            0x80000001: "MV_E_HANDLE - 错误或无效的句柄",
+            0x80000002: "MV_E_SUPPORT - 不支持的功能", 
+            0x80000003: "MV_E_BUFOVER - 缓存已满",
+            0x80000004: "MV_E_CALLORDER - 函数调用顺序错误",
+            0x80000005: "MV_E_PARAMETER - 错误的参数",
+            0x80000006: "MV_E_RESOURCE - 资源申请失败",
+            0x80000007: "MV_E_NODATA - 无数据",
+            0x80000008: "MV_E_PRECONDITION - 前置条件有误，或运行环境已发生变化",
+            0x80000009: "MV_E_VERSION - 版本不匹配",
+            0x8000000A: "MV_E_NOENOUGH_BUF - 传入的内存空间不足",
+            0x8000000B: "MV_E_ABNORMAL_IMAGE - 异常图像，可能是丢包导致图像不完整",
+            0x8000000C: "MV_E_LOAD_LIBRARY - 动态导入DLL失败",
+            0x8000000D: "MV_E_NOOUTBUF - 没有可输出的缓存",
+            0x8000000E: "MV_E_ENCRYPT - 加密错误",
+            0x8000000F: "MV_E_OPENFILE - 打开文件出错",
+            0x80000010: "MV_E_UNKNOW - 未知的错误",
+            0x80000011: "MV_E_ACCESS_DENIED - 访问被拒绝"
+        }
+        return error_messages.get(error_code, f"未知错误码: {hex(error_code)}")
+    
+    def _open_device(self, device):
+        """打开设备；设备被占用时（刚断开，或上一进程异常退出后GigE心跳尚未超时）等待其可访问后重试"""
+        ret = self.backend.open(device)
+        deadline = time.time() + self.OPEN_RETRY_TIMEOUT
+        delay = 0.01
+        while ret in self.OPEN_RETRY_ERRORS and time.time() < deadline:
+            if delay == 0.01:
+                logger.info("设备暂时无法打开，等待设备释放后重试...")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            if self.backend.is_device_accessible(device):
+                ret = self.backend.open(device)
+        return ret
+    
+    def connect(self, device_index=0, image_node_num=None, grab_strategy=None, output_queue_size=None):
+        """连接设备
+
+        image_node_num/grab_strategy/output_queue_size 配置SDK内部缓存，见set_grab_strategy
+        """
+        if self.backend is None:
+            logger.error("相机后端未创建")
+            return False
+        
+        if self.device_list_cached and device_index >= len(self.device_list):
+            # 缓存的设备列表可能已过期，重新枚举
+            self.discover_devices()
+        
+        if not self.device_list or device_index >= len(self.device_list):
+            logger.error("无效的设备索引")
+            return False
+        
+        # 添加设备状态检查和清理
+        try:
+            # 如果已经连接，先断开
+            if self.is_connected:
+                logger.info("检测到已连接状态，先断开...")
+                self.disconnect()
+        except:
+            pass
+        
+        # 打开设备
+        ret = self._open_device(self.device_list[device_index])
+        if ret != 0 and ret not in self.OPEN_RETRY_ERRORS and self.device_list_cached:
+            # 设备被占用时重新枚举也无济于事，其他错误可能是缓存已过期（相机更换或IP变化）
+            logger.warning("按缓存的设备信息打开失败，重新枚举设备")
+            if self.discover_devices() and device_index < len(self.device_list):
+                ret = self._open_device(self.device_list[device_index])
+        if ret != 0:
+            error_msg = self._get_error_message(ret)
+            logger.error(f"打开设备失败，错误码：{hex(ret)} - {error_msg}")
+            
+            # 特殊处理CALLORDER错误
+            if ret == 0x80000004:  # MV_E_CALLORDER
+                logger.error("函数调用顺序错误 - 可能的解决方案:")
+                logger.error("1. 设备可能被其他程序占用")
+                logger.error("2. 尝试重新插拔USB设备")
+                logger.error("3. 重启程序或系统")
+                logger.error("4. 检查SDK状态是否正常")
+            elif ret == 0x80000011:  # MV_E_ACCESS_DENIED
+                logger.error("权限被拒绝 - 可能的解决方案:")
+                logger.error("1. 运行权限修复脚本: ./fix_permissions.sh")
+                logger.error("2. 或者运行: sudo chmod 666 /dev/bus/usb/*/*")
+                logger.error("3. 添加用户到plugdev组: sudo usermod -a -G plugdev $USER")
+                logger.error("4. 重新插拔相机设备")
+                logger.error("5. 或者使用sudo权限运行程序")
+            
+            return False
+        
+        # 设置触发模式为关
+        ret = self.backend.set_feature("TriggerMode", 'enum', MV_TRIGGER_MODE_OFF)
+        if ret != 0:
+            logger.warning(f"设置触发模式失败，错误码：{ret:x}")
+        self.trigger_mode = 'off'
+        
+        logger.info("设备连接成功")
+        self.is_connected = True
+        self.refresh_parameters()
+        
+        if not self.set_grab_strategy(grab_strategy, output_queue_size, image_node_num):
+            logger.warning("SDK缓存配置失败，使用默认值")
+        return True
+    
+    def set_grab_strategy(self, strategy=None, output_queue_size=None, image_node_num=None):
+        """配置SDK内部缓存节点数和取图策略
+
+        strategy: 'one_by_one' 按顺序取出所有缓存帧，适合录像等不能丢帧的场景；
+                  'latest_only' 只取最新一帧，适合低延迟控制；
+                  'latest_n' 保留最新output_queue_size帧；
+                  'upcoming' 忽略已缓存帧，等待下一帧到达
+        image_node_num: SDK缓存节点数，须在开始取流前设置；录像时加大可缓冲编码器卡顿
+        取图策略只对主动取图生效，回调方式下SDK直接推送每一帧
+        """
+        if not self.is_connected:
+            logger.error("设备未连接")
+            return False
+        
+        if strategy is not None and strategy not in self.GRAB_STRATEGIES:
+            logger.error(f"不支持的取图策略: {strategy}")
+            return False
+        
+        success = True
+        if image_node_num is not None:
+            if self.is_grabbing:
+                logger.error("正在取流，无法修改缓存节点数")
+                success = False
+            else:
+                ret = self.backend.set_image_node_num(int(image_node_num))
+                if ret != 0:
+                    logger.error(f"设置缓存节点数失败，错误码：{ret:x}")
+                    success = False
+                else:
+                    self.image_node_num = int(image_node_num)
+                    logger.info(f"SDK缓存节点数: {self.image_node_num}")
+        
+        if strategy is not None:
+            ret = self.backend.set_grab_strategy(self.GRAB_STRATEGIES[strategy])
+            if ret != 0:
+                logger.error(f"设置取图策略失败，错误码：{ret:x}")
+                success = False
+            else:
+                self.grab_strategy = strategy
+                logger.info(f"取图策略: {strategy}")
+                if self.acquisition_mode == 'callback':
+                    logger.warning("回调取图方式下取图策略不生效")
+        
+        if output_queue_size is not None:
+            if (strategy or self.grab_strategy) != 'latest_n':
+                logger.warning("输出队列大小仅在latest_n策略下生效")
+            ret = self.backend.set_output_queue_size(int(output_queue_size))
+            if ret != 0:
+                logger.error(f"设置输出队列大小失败，错误码：{ret:x}")
+                success = False
+            else:
+                self.output_queue_size = int(output_queue_size)
+                logger.info(f"输出队列大小: {self.output_queue_size}")
+        
+        return success
+    
+    def set_acquisition_mode(self, mode):
+        """设置取图方式（须在开始取流前调用）
+
+        mode: 'poll' 由取流线程轮询取图，'callback' 注册SDK图像回调，新帧到达时唤醒消费者
+        """
+        if mode not in ('poll', 'callback'):
+            logger.error(f"不支持的取图方式: {mode}")
+            return False
+        
+        if self.is_grabbing:
+            logger.error("正在取流，无法切换取图方式")
+            return False
+        
+        if mode == 'poll' and self._callback_registered:
+            # SDK回调注册后在本次连接内不能再主动取图
+            logger.error("已注册图像回调，请重新连接设备后再切换为轮询方式")
+            return False
+        
+        self.acquisition_mode = mode
+        logger.info(f"取图方式: {mode}")
+        return True
+    
+    def start_grabbing(self, image_node_num=None, grab_strategy=None, output_queue_size=None):
+        """开始取流，可同时调整SDK缓存节点数和取图策略"""
+        if not self.is_connected:
+            logger.error("设备未连接")
+            return False
+        
+        if (image_node_num, grab_strategy, output_queue_size) != (None, None, None):
+            if not self.set_grab_strategy(grab_strategy, output_queue_size, image_node_num):
+                return False
+        
+        self._configure_buffer_pool()
+        self._sync_calibration_geometry()
+        
+        # 回调须在开始取流之前注册
+        if self.acquisition_mode == 'callback' and not self._register_image_callback():
+            return False
+        
+        ret = self.backend.start_grabbing()
+        if ret != 0:
+            logger.error(f"开始取流失败，错误码：{ret:x}")
+            return False
+        
+        self.is_grabbing = True
+        self._last_frame_number = None
+        self._end_of_stream = False
+        logger.info("开始取流")
+        return True
+    
+    def _register_image_callback(self):
+        """注册SDK图像回调"""
+        if self._callback_registered:
+            return True
+        
+        ret = self.backend.register_image_callback(self._on_image_callback)
+        if ret != 0:
+            logger.error(f"注册图像回调失败，错误码：{ret:x}")
+            return False
+        
+        self._callback_registered = True
+        logger.info("已注册图像回调")
+        return True
+    
+    def _on_image_callback(self, pData, stFrameInfo):
+        """SDK回调线程中处理新帧：转换为BGR并发布到最新帧槽位和帧队列"""
+        try:
+            # pData只在回调期间有效，转换结果必须拥有独立内存
+            image = self._convert_to_bgr(pData, stFrameInfo, copy=True)
+            if image is None:
+                return
+            frame = Frame.from_frame_info(image, stFrameInfo, PixelType_Gvsp_BGR8_Packed)
+            self._account_frame(frame)
+            self.dispatcher.publish(frame)
+        except Exception as e:
+            logger.error(f"图像回调处理出错：{e}")
+    
+    def _configure_buffer_pool(self, frame_info=None):
+        """根据相机当前负载大小和图像尺寸配置帧缓冲池"""
+        # 帧信息与缓存不符时负载大小已变化，须重新读取
+        payload_size = self.get_parameter("PayloadSize", 0, refresh=frame_info is not None)
+        if frame_info is not None:
+            width, height, pixel_format = frame_info.nWidth, frame_info.nHeight, frame_info.enPixelType
+        else:
+            width = self.get_parameter("Width", 0)
+            height = self.get_parameter("Height", 0)
+            pixel_format = self.get_parameter("PixelFormat", 0)
+        
+        if self.buffer_pool.configure(payload_size, width, height, pixel_format):
+            logger.info(f"帧缓冲池已配置: {width}x{height}, 单帧缓冲 {self.buffer_pool.payload_size} 字节")
+    
+    def get_buffer_pool_stats(self):
+        """获取帧缓冲池命中/未命中统计"""
+        return self.buffer_pool.get_stats()
+    
+    def _get_int_info(self, key):
+        """读取整型参数的当前值、范围和步长（value/min/max/inc），失败返回None"""
+        try:
+            ret, info = self.backend.get_feature_range(key)
+        except Exception as e:
+            logger.debug(f"读取参数 {key} 时出错: {e}")
+            return None
+        if ret != 0:
+            logger.debug(f"读取参数 {key} 范围失败，错误码：{ret:x}")
+            return None
+        return info
+    
+    def _read_feature(self, name, kind):
+        """直接从设备读取参数，失败返回None"""
+        if kind not in ('int', 'enum', 'float', 'bool'):
+            logger.error(f"不支持的参数类型: {kind}")
+            return None
+        
+        try:
+            ret, value = self.backend.get_feature(name, kind)
+        except Exception as e:
+            logger.debug(f"读取参数 {name} 时出错: {e}")
+            return None
+        
+        if ret != 0:
+            logger.debug(f"读取参数 {name} 失败，错误码：{ret:x}")
+            return None
+        return value
+    
+    def _write_feature(self, name, kind, value):
+        """直接向设备写入参数，返回SDK错误码"""
+        return self.backend.set_feature(name, kind, value)
+
+    def _feature_kind(self, name, value=None):
+        """参数类型：已知参数查表，否则按值的Python类型推断"""
+        kind = self.parameters.features.get(name)
+        if kind:
+            return kind
+        if isinstance(value, bool):
+            return 'bool'
+        if isinstance(value, int):
+            return 'int'
+        if isinstance(value, float):
+            return 'float'
+        return 'enum'
+    
+    def refresh_parameters(self, features=None):
+        """一次性读取参数并刷新缓存，features为None时读取全部缓存参数，返回读取到的值"""
+        if not self.is_connected:
+            return {}
+        
+        if features is None:
+            features = list(self.parameters.features)
+        self.parameters.invalidate(features)
+        
+        values = {}
+        for name in features:
+            value = self._read_feature(name, self._feature_kind(name))
+            if value is not None:
+                self.parameters.store(name, value)
+                values[name] = value
+        logger.debug(f"已缓存 {len(values)}/{len(features)} 个相机参数")
+        return values
+    
+    def get_parameter(self, name, default=None, refresh=False):
+        """读取参数，优先从缓存返回"""
+        if not refresh:
+            hit, value = self.parameters.get(name)
+            if hit:
+                return value
+        
+        if not self.is_connected:
+            return default
+        
+        value = self._read_feature(name, self._feature_kind(name))
+        if value is None:
+            return default
+        self.parameters.store(name, value)
+        return value
+    
+    def set_parameter(self, name, value, kind=None):
+        """写入参数，与缓存值相同时跳过写入；写入后使该参数及关联参数失效"""
+        if not self.is_connected:
+            logger.error("设备未连接")
+            return False
+        
+        hit, cached = self.parameters.get(name)
+        if hit and cached == value:
+            self.parameters.skipped_writes += 1
+            logger.debug(f"参数 {name} 已是 {value}，跳过写入")
+            return True
+        
+        kind = kind or self._feature_kind(name, value)
+        try:
+            ret = self._write_feature(name, kind, value)
+        except (ValueError, TypeError) as e:
+            logger.error(f"设置参数 {name}={value} 失败: {e}")
+            return False
+        
+        self.parameters.invalidate((name,) + self.DEPENDENT_FEATURES.get(name, ()))
+        if ret != 0:
+            logger.error(f"设置参数 {name}={value} 失败，错误码：{ret:x}")
+            return False
+        
+        # 按字符串设置的枚举缓存字符串，便于后续相同写入直接跳过
+        if kind == 'enum' and isinstance(value, str):
+            self.parameters.store(name, value)
+        return True
+    
+    def apply_parameters(self, parameters):
+        """按顺序批量写入参数字典，跳过与缓存值相同的写入，返回是否全部成功"""
+        success = True
+        for name, value in parameters.items():
+            if not self.set_parameter(name, value):
+                success = False
+        return success
+    
+    def get_image_geometry(self):
+        """读取当前图像几何: ROI尺寸、偏移以及合并/抽样倍数"""
+        geometry = {
+            'width': self.get_parameter("Width", 0),
+            'height': self.get_parameter("Height", 0),
+            'offset_x': self.get_parameter("OffsetX", 0),
+            'offset_y': self.get_parameter("OffsetY", 0),
+        }
+        for key, feature in (('binning', 'Binning'), ('decimation', 'Decimation')):
+            geometry[f'{key}_x'] = self.get_parameter(f"{feature}Horizontal", 1) or 1
+            geometry[f'{key}_y'] = self.get_parameter(f"{feature}Vertical", 1) or 1
+        return geometry
+    
+    def set_image_geometry(self, width=None, height=None, offset_x=None, offset_y=None,
+                           binning=None, decimation=None, center=False):
+        """设置ROI和合并/抽样，减少传输带宽
+
+        width/height/offset_x/offset_y 为合并后的像素坐标，按相机步长向下对齐；
+        center为True时ROI居中，忽略offset。取流中调用时先停止取流、重新配置后恢复，
+        缓冲池和去畸变内参随新几何更新；录像进行中不允许修改
+        """
+        if not self.is_connected:
+            logger.error("设备未连接")
+            return False
+        
+        if self.is_recording:
+            logger.error("录像进行中，无法修改图像尺寸")
+            return False
+        if self.capture_active:
+            # 队列中旧尺寸的帧会按新几何去畸变
+            logger.error("连续拍照进行中，无法修改图像尺寸")
+            return False
+        
+        was_grabbing = self.is_grabbing
+        if was_grabbing and not self.stop_grabbing():
+            return False
+        
+        success = True
+        try:
+            # 合并/抽样改变最大尺寸，须先于ROI设置
+            for feature, value in (('Binning', binning), ('Decimation', decimation)):
+                if value is None:
+                    continue
+                for axis in ('Horizontal', 'Vertical'):
+                    ret = self.backend.set_feature(f"{feature}{axis}", 'enum', int(value))
+                    if ret != 0:
+                        logger.error(f"设置 {feature}{axis}={value} 失败，错误码：{ret:x}")
+                        success = False
+            
+            if success and (center or (width, height, offset_x, offset_y) != (None, None, None, None)):
+                success = self._apply_roi(width, height, offset_x, offset_y, center) and success
+        finally:
+            # 重配后几何相关参数全部重新读取
+            self.refresh_parameters(['Width', 'Height', 'OffsetX', 'OffsetY', 'PayloadSize',
+                                     'BinningHorizontal', 'BinningVertical',
+                                     'DecimationHorizontal', 'DecimationVertical'])
+            self._configure_buffer_pool()
+            self._sync_calibration_geometry()
+            
+            if was_grabbing:
+                if not self.start_grabbing():
+                    success = False
+                elif self.dispatcher.has_subscribers():
+                    self._start_frame_source()
+        
+        geometry = self.get_image_geometry()
+        logger.info(f"图像几何: {geometry['width']}x{geometry['height']}, "
+                    f"偏移 ({geometry['offset_x']}, {geometry['offset_y']}), "
+                    f"合并 {geometry['binning_x']}x{geometry['binning_y']}, "
+                    f"抽样 {geometry['decimation_x']}x{geometry['decimation_y']}")
+        return success
+    
+    def _apply_roi(self, width, height, offset_x, offset_y, center):
+        """写入ROI：先清零偏移以放开最大尺寸，再设置尺寸和偏移"""
+        for key in ("OffsetX", "OffsetY"):
+            self.backend.set_feature(key, 'int', 0)
+        
+        values = {}
+        for key, value in (("Width", width), ("Height", height)):
+            info = self._get_int_info(key)
+            if info is None:
+                logger.error(f"读取 {key} 范围失败")
+                return False
+            if value is None:
+                value = info['value']
+            inc = max(info['inc'], 1)
+            value = min(max(int(value), info['min']), info['max'])
+            value -= (value - info['min']) % inc
+            values[key] = (value, info['max'])
+        
+        offsets = {"OffsetX": offset_x, "OffsetY": offset_y}
+        if center:
+            offsets = {"OffsetX": (values["Width"][1] - values["Width"][0]) // 2,
+                       "OffsetY": (values["Height"][1] - values["Height"][0]) // 2}
+        
+        for key in ("Width", "Height"):
+            ret = self.backend.set_feature(key, 'int', values[key][0])
+            if ret != 0:
+                logger.error(f"设置 {key}={values[key][0]} 失败，错误码：{ret:x}")
+                return False
+        
+        for key, value in offsets.items():
+            if not value:
+                continue
+            info = self._get_int_info(key)
+            if info is not None:
+                inc = max(info['inc'], 1)
+                value = min(int(value), info['max'])
+                value -= value % inc
+            ret = self.backend.set_feature(key, 'int', value)
+            if ret != 0:
+                logger.error(f"设置 {key}={value} 失败，错误码：{ret:x}")
+                return False
+        return True
+    
+    def set_calibration(self, calibration, background=False):
+        """更换校准参数，取流过程中也可调用
+        
+        先按当前图像几何换算新校准的内参并生成映射表，再一次性替换self.calibration，
+        取流、录像线程处理中的帧继续使用旧校准，不会停顿或用到未准备好的校准。
+        background为True时在后台线程中准备并替换，立即返回
+        """
+        if calibration:
+            # 几何在冻结前设置，交给相机后不再修改（之后几何变化时派生新版本）
+            if self.is_connected:
+                calibration = self._calibration_for_geometry(calibration)
+            calibration.freeze()
+        if background:
+            threading.Thread(target=self._swap_calibration, args=(calibration,),
+                             name="calibration-swap", daemon=True).start()
+        else:
+            self._swap_calibration(calibration)
+        return True
+    
+    def _swap_calibration(self, calibration):
+        # 串行化多次更换，保证最后一次调用的校准最终生效
+        with self._calibration_swap_lock:
+            if calibration and self.is_connected:
+                # 准备期间几何可能已变化
+                calibration = self._calibration_for_geometry(calibration)
+                calibration.freeze()
+                self._prewarm_maps(calibration)
+            previous = self.calibration
+            self.calibration = calibration
+        if previous is calibration:
+            return
+        if previous is not None:
+            # 取流线程已改用新校准，旧校准的分带线程池不再需要
+            previous.shutdown()
+        logger.info(f"校准参数已更换: 版本 {previous.version if previous else None} -> "
+                    f"{calibration.version if calibration else None}")
+    
+    def _calibration_geometry(self):
+        """当前图像在传感器上的几何 (宽, 高, 偏移x, 偏移y, 倍数x, 倍数y)
+        
+        后端无法给出ROI偏移时（回放、UVC相机）返回None，去畸变按图像尺寸换算内参（整体缩放或警告）
+        """
+        geometry = self.get_image_geometry()
+        if not geometry['width'] or not geometry['height']:
+            return None
+        if self.get_parameter("OffsetX") is None or self.get_parameter("OffsetY") is None:
+            return None
+        return (geometry['width'], geometry['height'], geometry['offset_x'], geometry['offset_y'],
+                geometry['binning_x'] * geometry['decimation_x'], geometry['binning_y'] * geometry['decimation_y'])
+    
+    def _calibration_for_geometry(self, calibration):
+        """返回与当前图像几何一致的校准参数
+        
+        未冻结的校准直接设置几何；已冻结（相机正在使用）的校准不修改，派生新版本后设置几何，
+        保证帧的calibration_version对应实际使用的内参
+        """
+        geometry = self._calibration_geometry()
+        if geometry == calibration.geometry:
+            return calibration
+        if calibration.frozen:
+            calibration = calibration.derive()
+            logger.info(f"图像几何已变化，校准参数派生为版本 {calibration.version}")
+        if geometry is None:
+            calibration.set_geometry(None, None)
+        else:
+            calibration.set_geometry(*geometry)
+        return calibration
+    
+    def _sync_calibration_geometry(self):
+        """开始取流或修改几何后让当前校准与图像几何一致，几何变化时换成派生的新版本"""
+        if self.calibration:
+            self._swap_calibration(self.calibration)
+    
+    def _prewarm_maps(self, calibration):
+        """提前生成当前图像尺寸的映射表，避免首帧去畸变时计算"""
+        width, height = self.get_parameter("Width", 0), self.get_parameter("Height", 0)
+        if width and height:
+            profile = self.output_profile if self.output_profile in calibration.profiles else None
+            calibration.get_undistort_maps(width, height, profile)
+    
+    def stop_grabbing(self):
+        """停止取流"""
+        if self.is_grabbing:
+            self._stop_grabber_thread()
+            self._release_outstanding_buffers()
+            ret = self.backend.stop_grabbing()
+            if ret != 0:
+                logger.error(f"停止取流失败，错误码：{ret:x}")
+                return False
+            self.is_grabbing = False
+            self._wake_frame_waiters()
+            logger.info("停止取流")
+        return True
+    
+    def _wake_frame_waiters(self):
+        """唤醒等待新帧的消费者"""
+        self.dispatcher.interrupt()
+    
+    def configure_subscriber(self, name, queue_size=None, drop_policy=None):
+        """设置某类订阅者的队列深度和丢帧策略，下次订阅时生效"""
+        if drop_policy is not None and drop_policy not in FrameQueue.DROP_POLICIES:
+            logger.error(f"不支持的丢帧策略: {drop_policy}")
+            return False
+        
+        default_size, default_policy = self.subscriber_config.get(name, (8, 'drop_oldest'))
+        self.subscriber_config[name] = (queue_size or default_size, drop_policy or default_policy)
+        return True
+    
+    def subscribe(self, name, queue_size=None, drop_policy=None, callback=None):
+        """订阅帧流，返回该订阅者的帧队列；需要时自动启动取流线程
+
+        队列中的图像为未去畸变的BGR图像，由多个订阅者共享，不应原地修改
+        """
+        default_size, default_policy = self.subscriber_config.get(name, (8, 'drop_oldest'))
+        queue = self.dispatcher.subscribe(name, queue_size or default_size,
+                                          drop_policy or default_policy, callback)
+        self._start_frame_source()
+        return queue
+    
+    def unsubscribe(self, name):
+        """取消订阅，没有订阅者时停止取流线程"""
+        self.dispatcher.unsubscribe(name)
+        if not self.dispatcher.has_subscribers():
+            self._stop_grabber_thread()
+    
+    def add_frame_callback(self, name, callback, queue_size=4, drop_policy='drop_oldest'):
+        """注册用户帧回调，回调在独立线程中以BGR图像为参数调用"""
+        return self.subscribe(name, queue_size, drop_policy, callback)
+    
+    def get_dispatch_stats(self):
+        """获取各订阅者的投递/丢帧统计"""
+        return self.dispatcher.get_stats()
+    
+    def _frame_source_active(self):
+        """是否有取流线程或SDK回调在向分发器推送帧"""
+        if self.acquisition_mode == 'callback':
+            return self.is_grabbing
+        return self._grabber_thread is not None and self._grabber_thread.is_alive()
+    
+    def _start_frame_source(self):
+        """轮询模式下启动唯一的取流线程，回调模式下由SDK回调推送"""
+        if self.acquisition_mode == 'callback' or self._frame_source_active():
+            return
         
-        ret = MvCamera.MV_CC_EnumDevices(tlayerType, device_list)
+        self._grabber_stop.clear()
+        self._grabber_thread = threading.Thread(target=self._grabber_loop, name="frame-grabber", daemon=True)
+        self._grabber_thread.start()
+        logger.info("取流线程已启动")
+    
+    def _stop_grabber_thread(self):
+        """停止取流线程"""
+        if self._grabber_thread is None:
+            return
+        
+        self._grabber_stop.set()
+        if self._grabber_thread is not threading.current_thread():
+            self._grabber_thread.join()
+        self._grabber_thread = None
+        logger.info("取流线程已停止")
+    
+    def _grabber_loop(self):
+        """取流线程：唯一调用SDK取图的线程，将每帧分发给所有订阅者"""
+        while not self._grabber_stop.is_set():
+            if not self.is_grabbing:
+                self._grabber_stop.wait(0.01)
+                continue
+            
+            frame = self._grab_frame(apply_calibration=False)
+            if frame is not None:
+                self.dispatcher.publish(frame)
+            elif self._end_of_stream:
+                # 数据源已结束，不再反复取图
+                self._grabber_stop.wait(0.1)
+    
+    def set_trigger_mode(self, mode, source='Line0', activation='RisingEdge'):
+        """设置触发模式
+
+        mode: 'off' 自由取流，'software' 软触发，'line' 外部线路触发
+        source: 线路触发源，如 Line0/Line2
+        activation: 线路触发沿，RisingEdge/FallingEdge/LevelHigh/LevelLow
+        """
+        if mode not in ('off', 'software', 'line'):
+            logger.error(f"不支持的触发模式: {mode}")
+            return False
+        
+        if not self.is_connected:
+            logger.error("设备未连接")
+            return False
+        
+        self.parameters.invalidate(('TriggerMode', 'TriggerSource', 'TriggerActivation'))
+        if mode == 'off':
+            ret = self.backend.set_feature("TriggerMode", 'enum', MV_TRIGGER_MODE_OFF)
+            if ret != 0:
+                logger.error(f"关闭触发模式失败，错误码：{ret:x}")
+                return False
+            self.trigger_mode = 'off'
+            self.trigger_source = None
+            self.trigger_activation = None
+            logger.info("触发模式: 关闭（自由取流）")
+            return True
+        
+        ret = self.backend.set_feature("TriggerMode", 'enum', MV_TRIGGER_MODE_ON)
         if ret != 0:
-            logger.error(f"枚举设备失败，错误码：{ret:x}")
+            logger.error(f"打开触发模式失败，错误码：{ret:x}")
             return False
         
-        if device_list.nDeviceNum == 0:
-            logger.warning("未发现设备")
+        trigger_source = 'Software' if mode == 'software' else source
+        ret = self.backend.set_feature("TriggerSource", 'enum', trigger_source)
+        if ret != 0:
+            logger.error(f"设置触发源 {trigger_source} 失败，错误码：{ret:x}")
             return False
         
-        logger.info(f"发现 {device_list.nDeviceNum} 个设备:")
-        for i in range(device_list.nDeviceNum):
-            mvcc_dev_info = cast(device_list.pDeviceInfo[i], POINTER(MV_CC_DEVICE_INFO)).contents
-            
-            if mvcc_dev_info.nTLayerType == MV_GIGE_DEVICE:
-                try:
-                    # 安全地处理设备名称
-                    name_array = mvcc_dev_info.SpecialInfo.stGigEInfo.chUserDefinedName
-                    if hasattr(name_array, 'value'):
-                        device_name = name_array.value.decode('ascii', errors='ignore')
-                    else:
-                        # 处理c_ubyte数组
-                        name_bytes = bytes(name_array)
-                        device_name = name_bytes.decode('ascii', errors='ignore').rstrip('\x00')
-                    
-                    ip = self._parse_ip(mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp)
-                    logger.info(f"  [{i}] GigE设备: {device_name}")
-                    logger.info(f"      IP: {ip}")
-                except Exception as e:
-                    logger.warning(f"  [{i}] GigE设备 - 名称解析失败: {e}")
-                    ip = self._parse_ip(mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp)
-                    logger.info(f"  [{i}] GigE设备: 未知名称")
-                    logger.info(f"      IP: {ip}")
-                    
-            elif mvcc_dev_info.nTLayerType == MV_USB_DEVICE:
-                try:
-                    # 安全地处理设备名称
-                    name_array = mvcc_dev_info.SpecialInfo.stUsb3VInfo.chUserDefinedName
-                    if hasattr(name_array, 'value'):
-                        device_name = name_array.value.decode('ascii', errors='ignore')
-                    else:
-                        # 处理c_ubyte数组
-                        name_bytes = bytes(name_array)
-                        device_name = name_bytes.decode('ascii', errors='ignore').rstrip('\x00')
-                    
-                    logger.info(f"  [{i}] USB设备: {device_name}")
-                except Exception as e:
-                    logger.warning(f"  [{i}] USB设备 - 名称解析失败: {e}")
-                    logger.info(f"  [{i}] USB设备: 未知名称")
+        if mode == 'line':
+            ret = self.backend.set_feature("TriggerActivation", 'enum', activation)
+            if ret != 0:
+                logger.error(f"设置触发沿 {activation} 失败，错误码：{ret:x}")
+                return False
         
-        self.device_list = device_list
+        self.trigger_mode = mode
+        self.trigger_source = trigger_source
+        self.trigger_activation = activation if mode == 'line' else None
+        if mode == 'line':
+            logger.info(f"触发模式: 线路触发 (触发源 {trigger_source}, 触发沿 {activation})")
+        else:
+            logger.info("触发模式: 软触发")
         return True
     
-    def _parse_ip(self, ip_int):
-        """解析IP地址"""
-        return f"{(ip_int >> 24) & 0xFF}.{(ip_int >> 16) & 0xFF}.{(ip_int >> 8) & 0xFF}.{ip_int & 0xFF}"
+    def trigger_software(self):
+        """发送一次软触发命令"""
+        if self.trigger_mode != 'software':
+            logger.error("未处于软触发模式")
+            return False
+        
+        ret = self.backend.execute_command("TriggerSoftware")
+        if ret != 0:
+            logger.error(f"软触发失败，错误码：{ret:x}")
+            return False
+        return True
     
-    def _get_error_message(self, error_code):
-        """获取错误码对应的消息"""
-        error_messages = {
-            0x80000001: "MV_E_HANDLE - 错误或无效的句柄",
-            0x80000002: "MV_E_SUPPORT - 不支持的功能", 
-            0x80000003: "MV_E_BUFOVER - 缓存已满",
-            0x80000004: "MV_E_CALLORDER - 函数调用顺序错误",
-            0x80000005: "MV_E_PARAMETER - 错误的参数",
-            0x80000006: "MV_E_RESOURCE - 资源申请失败",
-            0x80000007: "MV_E_NODATA - 无数据",
-            0x80000008: "MV_E_PRECONDITION - 前置条件有误，或运行环境已发生变化",
-            0x80000009: "MV_E_VERSION - 版本不匹配",
-            0x8000000A: "MV_E_NOENOUGH_BUF - 传入的内存空间不足",
-            0x8000000B: "MV_E_ABNORMAL_IMAGE - 异常图像，可能是丢包导致图像不完整",
-            0x8000000C: "MV_E_LOAD_LIBRARY - 动态导入DLL失败",
-            0x8000000D: "MV_E_NOOUTBUF - 没有可输出的缓存",
-            0x8000000E: "MV_E_ENCRYPT - 加密错误",
-            0x8000000F: "MV_E_OPENFILE - 打开文件出错",
-            0x80000010: "MV_E_UNKNOW - 未知的错误",
-            0x80000011: "MV_E_ACCESS_DENIED - 访问被拒绝"
-        }
-        return error_messages.get(error_code, f"未知错误码: {hex(error_code)}")
+    def _wait_triggered_frame(self, frame_queue, timeout, retries):
+        """发出触发（软触发模式）并等待对应的帧，超时后按重试次数重新触发"""
+        for attempt in range(retries + 1):
+            if self.trigger_mode == 'software' and not self.trigger_software():
+                return None
+            
+            frame = frame_queue.get(timeout)
+            if frame is not None:
+                return frame
+            
+            if attempt < retries:
+                logger.warning(f"等待触发帧超时（{timeout}s），重试 {attempt + 1}/{retries}")
+        
+        logger.error(f"等待触发帧超时（{timeout}s）")
+        return None
     
-    def connect(self, device_index=0):
-        """连接设备"""
-        if self.camera is None:
-            logger.error("相机SDK实例未创建")
-            return False
+    def capture_burst(self, count, interval=0.0, timeout=1.0, apply_calibration=None, retries=1):
+        """触发模式下按顺序采集恰好count帧
+
+        软触发模式下每帧发出一次触发，两次触发之间至少间隔interval秒；
+        线路触发模式下等待外部触发。每帧等待timeout秒，失败时重新触发retries次，
+        仍失败则返回None
+        """
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
+            return None
+        
+        if self.trigger_mode == 'off':
+            logger.error("连拍需要先设置软触发或线路触发模式")
+            return None
+        
+        # 阻塞策略保证连拍中的每一帧都不会被丢弃
+        frame_queue = self.subscribe('burst', queue_size=max(count, 1), drop_policy='block')
+        frames = []
+        try:
+            next_trigger = time.time()
+            for i in range(count):
+                delay = next_trigger - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                next_trigger = time.time() + interval
+                
+                frame = self._wait_triggered_frame(frame_queue, timeout, retries)
+                if frame is None:
+                    logger.error(f"连拍失败：已采集 {len(frames)}/{count} 帧")
+                    return None
+                
+                calibration = self._frame_calibration(apply_calibration)
+                if calibration:
+                    frame = frame.undistorted(calibration, self.output_profile)
+                frames.append(frame)
+        finally:
+            self.unsubscribe('burst')
+        
+        logger.info(f"连拍完成：{count} 帧")
+        return frames
+    
+    def get_camera_info(self):
+        """获取相机信息"""
+        if not self.is_connected:
+            return None
+        
+        info = {}
+        try:
+            # 从参数缓存读取，不重复访问设备
+            width = self.get_parameter("Width")
+            height = self.get_parameter("Height")
+            info['resolution'] = f"{width}x{height}"
             
-        if not self.device_list or device_index >= self.device_list.nDeviceNum:
-            logger.error("无效的设备索引")
+            # 获取像素格式
+            info['pixel_format'] = self.get_parameter("PixelFormat")
+            
+            # 获取帧率
+            frame_rate = self.get_parameter("AcquisitionFrameRate")
+            if frame_rate is not None:
+                info['frame_rate'] = f"{frame_rate:.2f}"
+            
+        except Exception as e:
+            logger.warning(f"获取相机信息时出错: {e}")
+        
+        return info
+    
+    def capture_image(self, save_path=None, apply_calibration=None, encoding=None):
+        """捕获单张图像，指定save_path时在后台保存（返回的图像同时被保存线程引用，修改前请复制）
+        
+        encoding: 可选，本次保存使用的编码参数字典（profile及encode_params的覆盖项），默认使用set_encoding的设置
+        """
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
+            return None
+        
+        try:
+            frame = self.capture_frame(apply_calibration)
+            if frame is None:
+                return None
+            image = frame.image
+            
+            # 保存图像
+            if save_path:
+                self.save_image(image, save_path, encoding)
+            
+            return image
+            
+        except Exception as e:
+            logger.error(f"捕获图像时发生错误：{e}")
+            return None
+    
+    def capture_frame(self, apply_calibration=None, timeout=1.0):
+        """捕获一帧，返回包含帧号、时间戳、丢包数等信息的Frame"""
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
+            return None
+        
+        if self._frame_source_active():
+            # 已有取流线程或SDK回调时等待分发的下一帧，避免与其他消费者抢帧
+            frame = self.dispatcher.latest.wait_next(timeout)
+            if frame is None:
+                logger.error("等待新帧超时")
+                return None
+            return self._undistort_frame(frame, apply_calibration)
+        
+        return self._grab_frame(apply_calibration, int(timeout * 1000))
+    
+    def save_image(self, image, save_path, encoding=None, callback=None):
+        """按扩展名和编码参数提交给后台保存，队列已满且按策略丢弃时返回False
+        
+        callback: 可选，写入完成、失败或被丢弃后以 (save_path, 错误信息) 调用，成功时错误信息为None
+        """
+        return self.writer.submit(image, save_path, self._encode_params(save_path, encoding), callback)
+    
+    def _encode_params(self, path, encoding=None):
+        settings = dict(encoding if encoding is not None else self.encoding)
+        return encode_params(os.path.splitext(path)[1], settings.pop('profile', 'balanced'), **settings)
+    
+    def set_encoding(self, profile='balanced', **settings):
+        """设置保存图像的编码配置（fast/balanced/archival，见ENCODE_PROFILES），settings覆盖单项参数
+        
+        可覆盖jpeg_quality、jpeg_optimize、jpeg_progressive、png_compression、webp_quality、tiff_compression，
+        参数无效时返回False并保留原设置
+        """
+        try:
+            for format in ('jpg', 'png', 'webp', 'tiff'):
+                encode_params(format, profile, **settings)
+        except ValueError as e:
+            logger.error(f"设置编码参数失败: {e}")
             return False
         
-        # 添加设备状态检查和清理
+        self.encoding = dict(settings, profile=profile)
+        overrides = ', '.join(f"{name}={value}" for name, value in settings.items() if value is not None)
+        logger.info(f"图像编码配置: {profile}" + (f" ({overrides})" if overrides else ""))
+        return True
+    
+    def configure_writer(self, workers=2, queue_size=16, drop_policy='block', block_timeout=5.0):
+        """设置后台保存的编码线程数、队列深度和队列满时的策略（见ImageWriter），先写完已提交的图像"""
+        writer = ImageWriter(workers, queue_size, drop_policy, block_timeout)
+        self._close_writer()
+        self.writer = writer
+        logger.info(f"图像保存: 编码线程 {workers}，队列深度 {queue_size}，队列满时 {drop_policy}")
+        return True
+    
+    def flush_writer(self, timeout=None):
+        """等待已提交的图像全部写入磁盘，timeout默认为WRITER_TIMEOUT，超时返回False"""
+        if self.writer.flush(self.WRITER_TIMEOUT if timeout is None else timeout):
+            return True
+        logger.warning(f"等待图像保存超时: {self.writer.get_stats()}")
+        return False
+    
+    def _close_writer(self):
+        if not self.writer.close(self.WRITER_TIMEOUT):
+            logger.warning(f"图像保存未在 {self.WRITER_TIMEOUT}s 内完成，已放弃剩余图像: {self.writer.get_stats()}")
+    
+    def wait_for_frame(self, timeout=1.0, apply_calibration=None):
+        """等待取流线程或SDK回调分发的下一帧，超时返回None"""
+        frame = self.dispatcher.latest.wait_next(timeout)
+        if frame is None:
+            return None
+        calibration = self._frame_calibration(apply_calibration)
+        if calibration:
+            return calibration.undistort_image(frame.image, self.output_profile)
+        return frame.image
+    
+    def _frame_calibration(self, apply_calibration=None):
+        """返回用于去畸变的校准对象；apply_calibration为None时按undistort_frames决定"""
+        if apply_calibration is None:
+            apply_calibration = self.undistort_frames
+        return self.calibration if apply_calibration else None
+    
+    def _undistort_frame(self, frame, apply_calibration=None):
+        """对订阅者收到的原始帧按undistort_frames（或apply_calibration）去畸变，无需去畸变时原样返回"""
+        calibration = self._frame_calibration(apply_calibration)
+        if calibration:
+            return frame.undistorted(calibration, self.output_profile)
+        return frame
+    
+    def get_image_buffer(self, timeout=1000, zero_copy=True):
+        """通过MV_CC_GetImageBuffer获取一帧，返回ImageBufferFrame
+
+        Mono8/RGB8/BGR8帧在zero_copy为True时直接以只读视图引用SDK缓冲区，
+        调用方须通过release()或with语句归还；其他像素格式或zero_copy为False时
+        退回拷贝路径，返回的帧不占用SDK缓冲区
+        """
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
+            return None
+        
+        if self.acquisition_mode == 'callback':
+            logger.error("回调模式下不能主动获取SDK图像缓冲区")
+            return None
+        
+        stOutFrame = MV_FRAME_OUT()
+        memset(byref(stOutFrame), 0, sizeof(stOutFrame))
+        
+        ret = self.backend.get_image_buffer(stOutFrame, timeout)
+        if ret != 0:
+            self._log_grab_error(ret, "获取图像缓冲区失败")
+            return None
+        
+        stFrameInfo = stOutFrame.stFrameInfo
+        width, height, pixel_type = stFrameInfo.nWidth, stFrameInfo.nHeight, stFrameInfo.enPixelType
+        channels = {PixelType_Gvsp_Mono8: 1,
+                    PixelType_Gvsp_RGB8_Packed: 3,
+                    PixelType_Gvsp_BGR8_Packed: 3}.get(pixel_type)
+        
+        if zero_copy and channels:
+            try:
+                image = np.ctypeslib.as_array(stOutFrame.pBufAddr, shape=(height * width * channels,))
+                image.flags.writeable = False
+                shape = (height, width) if channels == 1 else (height, width, channels)
+                frame = ImageBufferFrame(self, stOutFrame, image.reshape(shape), stFrameInfo)
+            except Exception as e:
+                logger.error(f"创建零拷贝视图失败：{e}")
+                self._free_image_buffer(stOutFrame)
+                return None
+            self._outstanding_buffers.add(frame)
+            self._account_frame(frame)
+            return frame
+        
+        # 回退到拷贝路径，转换后立即归还SDK缓冲区
         try:
-            # 如果已经连接，先断开
-            if self.is_connected:
-                logger.info("检测到已连接状态，先断开...")
-                self.disconnect()
-                import time
-                time.sleep(0.5)  # 等待断开完成
-        except:
-            pass
+            image = self._convert_to_bgr(stOutFrame.pBufAddr, stFrameInfo, copy=True)
+        finally:
+            self._free_image_buffer(stOutFrame)
         
-        # 创建设备句柄
-        ret = self.camera.MV_CC_CreateHandle(self.device_list.pDeviceInfo[device_index])
+        if image is None:
+            return None
+        frame = ImageBufferFrame(self, None, image, stFrameInfo, PixelType_Gvsp_BGR8_Packed)
+        self._account_frame(frame)
+        return frame
+    
+    def _free_image_buffer(self, stOutFrame):
+        """归还SDK图像缓冲区"""
+        ret = self.backend.free_image_buffer(stOutFrame)
         if ret != 0:
-            error_msg = self._get_error_message(ret)
-            logger.error(f"创建设备句柄失败，错误码：{hex(ret)} - {error_msg}")
+            logger.warning(f"释放图像缓冲区失败，错误码：{ret:x}")
+    
+    def _release_outstanding_buffers(self):
+        """停止取流前强制归还仍被占用的SDK缓冲区"""
+        frames = [frame for frame in self._outstanding_buffers if frame.zero_copy]
+        if frames:
+            logger.warning(f"停止取流时仍有 {len(frames)} 个SDK图像缓冲区未释放，强制归还")
+        for frame in frames:
+            frame.release()
+    
+    def _account_frame(self, frame):
+        """统计接收帧数、帧号跳变（相机/传输丢帧）和丢包"""
+        with self._stats_lock:
+            stats = self.frame_stats
+            stats['received'] += 1
+            if frame.lost_packets:
+                stats['lost_packets'] += frame.lost_packets
+                stats['incomplete_frames'] += 1
             
-            # 特殊处理CALLORDER错误
-            if ret == 0x80000004:  # MV_E_CALLORDER
-                logger.error("函数调用顺序错误 - 可能的解决方案:")
-                logger.error("1. 设备可能被其他程序占用")
-                logger.error("2. 尝试重新插拔USB设备")
-                logger.error("3. 重启程序或系统")
-                logger.error("4. 检查SDK状态是否正常")
-            elif ret == 0x80000011:  # MV_E_ACCESS_DENIED
-                logger.error("权限被拒绝 - 可能的解决方案:")
-                logger.error("1. 运行权限修复脚本: ./fix_permissions.sh")
-                logger.error("2. 或者运行: sudo chmod 666 /dev/bus/usb/*/*")
-                logger.error("3. 添加用户到plugdev组: sudo usermod -a -G plugdev $USER")
-                logger.error("4. 重新插拔相机设备")
-                logger.error("5. 或者使用sudo权限运行程序")
+            last = self._last_frame_number
+            # 帧号回退说明相机重新开始计数，不计为丢帧
+            if last is not None and frame.frame_number > last + 1:
+                gap = frame.frame_number - last - 1
+                stats['dropped'] += gap
+                logger.debug(f"检测到丢帧: 帧号 {last} -> {frame.frame_number}，丢失 {gap} 帧")
+            self._last_frame_number = frame.frame_number
+    
+    def get_frame_stats(self):
+        """获取帧统计：接收帧数、相机端丢帧、丢包、残帧以及各订阅队列丢帧"""
+        with self._stats_lock:
+            stats = dict(self.frame_stats)
+        stats['queue_dropped'] = sum(sub['dropped'] for sub in self.dispatcher.get_stats().values())
+        return stats
+    
+    def _grab_frame(self, apply_calibration=None, timeout=1000):
+        """主动从SDK获取一帧并转换为BGR图像"""
+        calibration = self._frame_calibration(apply_calibration)
+        if self.zero_copy:
+            frame = self.get_image_buffer(timeout)
+            if frame is None:
+                return None
+            with frame:
+                image = frame.to_bgr(calibration, self.output_profile)
+                version = calibration.rectified_version(frame.width, frame.height) if calibration else None
+                return frame.with_image(image, PixelType_Gvsp_BGR8_Packed, version)
+        
+        pData = None
+        try:
+            # 获取图像数据
+            stFrameInfo = MV_FRAME_OUT_INFO_EX()
+            memset(byref(stFrameInfo), 0, sizeof(stFrameInfo))
+            
+            pData = self.buffer_pool.acquire_raw()
+            ret = self.backend.get_frame(pData, stFrameInfo, timeout)
+            
+            if ret == 0x8000000A:  # MV_E_NOENOUGH_BUF，ROI或像素格式已变化
+                logger.info("取流缓冲区不足，按当前相机参数重新配置缓冲池")
+                self.buffer_pool.release_raw(pData)
+                self._configure_buffer_pool()
+                pData = self.buffer_pool.acquire_raw()
+                ret = self.backend.get_frame(pData, stFrameInfo, timeout)
+            
+            if ret != 0:
+                self._log_grab_error(ret, "获取图像失败")
+                return None
+            
+            # 后续帧按新的几何尺寸/像素格式分配缓冲区
+            if not self.buffer_pool.matches(stFrameInfo.nWidth, stFrameInfo.nHeight, stFrameInfo.enPixelType):
+                self._configure_buffer_pool(stFrameInfo)
+            
+            # 去畸变与颜色转换合并处理，见_convert_to_bgr
+            image = self._convert_to_bgr(pData, stFrameInfo, calibration=calibration, profile=self.output_profile)
+            if image is None:
+                return None
+            
+            frame = Frame.from_frame_info(image, stFrameInfo, PixelType_Gvsp_BGR8_Packed)
+            if calibration:
+                frame.calibration_version = calibration.rectified_version(stFrameInfo.nWidth, stFrameInfo.nHeight)
+            self._account_frame(frame)
+            return frame
+        finally:
+            if pData is not None:
+                self.buffer_pool.release_raw(pData)
+    
+    def _log_grab_error(self, ret, message):
+        """记录取图失败；触发等待超时和数据源结束属于正常情况，数据源结束只记录一次"""
+        if ret == self.backend.END_OF_STREAM:
+            if not self._end_of_stream:
+                self._end_of_stream = True
+                logger.info("数据源已全部输出，没有新的帧")
+        elif ret == 0x80000007 and self.trigger_mode != 'off':
+            # 触发模式下没有触发信号时无数据属于正常情况
+            logger.debug("等待触发帧超时")
+        else:
+            logger.error(f"{message}，错误码：{ret:x}")
+    
+    def _convert_to_bgr(self, pData, stFrameInfo, copy=True, calibration=None, profile=None):
+        """将取流缓冲区中的图像转换为BGR格式
+        
+        copy为False时返回的图像可能引用缓冲池中的缓冲区，调用方须在归还缓冲区之前用完。
+        指定calibration时Mono8/RGB8先在原始数据上去畸变（按输出配置profile缩放），再对输出图像转换颜色，
+        全分辨率数据只读取一次；去畸变生成的是新图像，无需拷贝
+        """
+        # 转换为numpy数组（回调模式下pData为SDK的POINTER(c_ubyte)）
+        if isinstance(pData, ctypes.Array):
+            image_data = np.frombuffer(pData, dtype=np.uint8, count=stFrameInfo.nFrameLen)
+        else:
+            image_data = np.ctypeslib.as_array(pData, shape=(stFrameInfo.nFrameLen,))
+        
+        # 根据像素格式转换图像
+        if stFrameInfo.enPixelType == PixelType_Gvsp_Mono8:
+            image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth))
+            if calibration:
+                image = calibration.undistort_image(image, profile)
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif stFrameInfo.enPixelType == PixelType_Gvsp_RGB8_Packed:
+            image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
+            if calibration:
+                image = calibration.undistort_image(image, profile)
+            return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        elif stFrameInfo.enPixelType == PixelType_Gvsp_BGR8_Packed:
+            image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
+            if calibration:
+                output = calibration.undistort_image(image, profile)
+                # 无法去畸变时返回的是缓冲区本身
+                return output.copy() if output is image and copy else output
+            return image.copy() if copy else image
+        
+        # 其他格式转换为BGR
+        nConvertSize = stFrameInfo.nWidth * stFrameInfo.nHeight * 3
+        pConvertData = self.buffer_pool.acquire_convert()
+        try:
+            ret = self.backend.convert_pixel_type(pData, stFrameInfo, pConvertData)
+            if ret != 0:
+                logger.error(f"像素格式转换失败，错误码：{ret:x}")
+                return None
+            
+            image = np.frombuffer(pConvertData, dtype=np.uint8, count=nConvertSize).reshape(
+                (stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
+            if calibration:
+                output = calibration.undistort_image(image, profile)
+                if output is not image:
+                    return output
+            # 转换缓冲区在返回前归还，必须拷贝
+            return image.copy()
+        finally:
+            self.buffer_pool.release_convert(pConvertData)
+    
+    def start_video_recording(self, output_path, fps=30, codec='XVID'):
+        """开始录像"""
+        if self.is_recording:
+            logger.warning("正在录像中")
+            return False
+        
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
+            return False
+        
+        # 订阅帧流，用第一帧确定视频尺寸
+        frame_queue = self.subscribe('recorder')
+        first_frame = frame_queue.get(timeout=2.0)
+        if first_frame is None:
+            logger.error("无法获取图像尺寸")
+            self.unsubscribe('recorder')
+            return False
+        
+        first_image = first_frame.image
+        raw_height, raw_width = first_image.shape[:2]
+        calibration = self._frame_calibration()
+        if calibration:
+            first_image = calibration.undistort_image(first_image, self.output_profile)
+        height, width = first_image.shape[:2]
+        
+        # 确保输出目录存在
+        os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+        
+        # 创建视频写入器
+        fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.video_writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        
+        if not self.video_writer.isOpened():
+            logger.error("无法创建视频文件")
+            self.unsubscribe('recorder')
+            return False
+        
+        self.video_writer.write(first_image)
+        self.is_recording = True
+        self._record_stop.clear()
+        self.recording_calibration_versions = [
+            (0, calibration.rectified_version(raw_width, raw_height) if calibration else None)]
+        
+        # 启动录像线程
+        self.record_thread = threading.Thread(target=self._recording_loop,
+                                              args=(frame_queue, calibration, (width, height)))
+        self.record_thread.start()
+        
+        logger.info(f"开始录像：{output_path} (FPS: {fps}, 编码: {codec})")
+        return True
+    
+    def _recording_loop(self, frame_queue, calibration, size):
+        """录像循环"""
+        frame_count = 1
+        start_time = time.time()
+        rejected = None
+        
+        while self.is_recording and not self._record_stop.is_set():
+            frame = frame_queue.get(timeout=1.0)
+            if frame is None:
+                continue
+            
+            # 录像中更换的校准输出尺寸不变时从下一帧起生效，否则本次录像继续使用原校准
+            latest = self._frame_calibration()
+            if latest is not calibration and latest is not rejected:
+                height, width = frame.image.shape[:2]
+                if (latest.get_output_size(width, height, self.output_profile) if latest else (width, height)) == size:
+                    calibration = latest
+                    version = calibration.rectified_version(width, height) if calibration else None
+                    self.recording_calibration_versions.append((frame_count, version))
+                    logger.info(f"录像第 {frame_count} 帧起使用校准版本 {version}")
+                else:
+                    rejected = latest
+                    logger.warning("新校准参数的输出尺寸与录像不一致，本次录像继续使用原校准参数")
             
+            image = frame.image
+            if calibration:
+                image = calibration.undistort_image(image, self.output_profile)
+            self.video_writer.write(image)
+            frame_count += 1
+            
+            # 每100帧输出一次状态
+            if frame_count % 100 == 0:
+                elapsed = time.time() - start_time
+                fps = frame_count / elapsed
+                stats = self.get_frame_stats()
+                logger.info(f"录像进行中... 帧数: {frame_count}, 实际FPS: {fps:.2f}, "
+                            f"相机丢帧: {stats['dropped']}, 丢包: {stats['lost_packets']}, "
+                            f"录像队列丢帧: {frame_queue.dropped}")
+    
+    def stop_video_recording(self):
+        """停止录像"""
+        if not self.is_recording:
+            logger.warning("未在录像")
             return False
         
-        # 打开设备
-        ret = self.camera.MV_CC_OpenDevice(MV_ACCESS_Exclusive, 0)
-        if ret != 0:
-            logger.error(f"打开设备失败，错误码：{ret:x}")
-            return False
+        self.is_recording = False
+        self._record_stop.set()
+        frame_queue = self.dispatcher.get_queue('recorder')
+        if frame_queue:
+            frame_queue.interrupt()
         
-        # 检测网络最佳包大小（仅GigE相机）
-        if self.device_list.pDeviceInfo[device_index].contents.nTLayerType == MV_GIGE_DEVICE:
-            nPacketSize = self.camera.MV_CC_GetOptimalPacketSize()
-            if int(nPacketSize) > 0:
-                ret = self.camera.MV_CC_SetIntValue("GevSCPSPacketSize", nPacketSize)
-                if ret != 0:
-                    logger.warning(f"设置包大小失败，错误码：{ret:x}")
+        if self.record_thread:
+            self.record_thread.join()
+        self.unsubscribe('recorder')
         
-        # 设置触发模式为关
-        ret = self.camera.MV_CC_SetEnumValue("TriggerMode", MV_TRIGGER_MODE_OFF)
-        if ret != 0:
-            logger.warning(f"设置触发模式失败，错误码：{ret:x}")
+        if self.video_writer:
+            self.video_writer.release()
+            self.video_writer = None
         
-        logger.info("设备连接成功")
-        self.is_connected = True
+        logger.info("录像已停止")
         return True
     
-    def start_grabbing(self):
-        """开始取流"""
-        if not self.is_connected:
-            logger.error("设备未连接")
+    def start_continuous_capture(self, output_dir, interval=1.0, format='jpg', max_count=None,
+                                 use_trigger=False, encoding=None):
+        """开始连续拍照
+        
+        use_trigger为True时切换到软触发模式，每个间隔只触发并传输一帧，
+        代替自由取流加定时取帧；停止后恢复原触发模式
+        encoding: 可选，编码参数字典（同capture_image），默认使用set_encoding的设置
+        """
+        if self.continuous_capture:
+            logger.warning("正在连续拍照中")
             return False
         
-        ret = self.camera.MV_CC_StartGrabbing()
-        if ret != 0:
-            logger.error(f"开始取流失败，错误码：{ret:x}")
+        if not self.is_grabbing:
+            logger.error("设备未开始取流")
             return False
         
-        self.is_grabbing = True
-        logger.info("开始取流")
-        return True
-    
-    def stop_grabbing(self):
-        """停止取流"""
-        if self.is_grabbing:
-            ret = self.camera.MV_CC_StopGrabbing()
-            if ret != 0:
-                logger.error(f"停止取流失败，错误码：{ret:x}")
+        # 编码参数在开始前检查，避免拍照线程中每张图都失败
+        try:
+            self._encode_params(f".{format}", encoding)
+        except ValueError as e:
+            logger.error(f"编码参数无效: {e}")
+            return False
+        
+        self._continuous_restore_trigger = None
+        if use_trigger and self.trigger_mode == 'off':
+            if self.is_recording:
+                logger.error("录像进行中，无法切换到触发模式")
                 return False
-            self.is_grabbing = False
-            logger.info("停止取流")
+            if not self.set_trigger_mode('software'):
+                return False
+            self._continuous_restore_trigger = 'off'
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+        self.continuous_capture = True
+        self.capture_interval = interval
+        self.capture_count = 0
+        self._continuous_stop.clear()
+        
+        # 订阅帧流，与录像共享同一取流线程
+        frame_queue = self.subscribe('continuous')
+        
+        # 启动连续拍照线程
+        self.capture_thread = threading.Thread(
+            target=self._continuous_capture_loop, 
+            args=(frame_queue, output_dir, format, max_count, self.trigger_mode != 'off', encoding)
+        )
+        self.capture_thread.start()
+        
+        logger.info(f"开始连续拍照：间隔 {interval}s，格式 {format}，目录 {output_dir}")
+        if max_count:
+            logger.info(f"最大拍照数量: {max_count}")
         return True
     
-    def get_camera_info(self):
-        """获取相机信息"""
-        if not self.is_connected:
-            return None
-        
-        info = {}
-        try:
-            # 获取分辨率
-            width = self.camera.MV_CC_GetIntValue("Width")[1]
-            height = self.camera.MV_CC_GetIntValue("Height")[1]
-            info['resolution'] = f"{width}x{height}"
+    def _continuous_capture_loop(self, frame_queue, output_dir, format, max_count, triggered=False,
+                                 encoding=None):
+        """连续拍照循环"""
+        next_capture = time.time()
+        while self.continuous_capture and not self._continuous_stop.is_set():
+            if max_count and self.capture_count >= max_count:
+                logger.info(f"已达到最大拍照数量 {max_count}，停止连续拍照")
+                break
             
-            # 获取像素格式
-            pixel_format = self.camera.MV_CC_GetEnumValue("PixelFormat")[1]
-            info['pixel_format'] = pixel_format
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            filename = f"capture_{timestamp}.{format}"
+            filepath = os.path.join(output_dir, filename)
             
-            # 获取帧率
-            frame_rate = self.camera.MV_CC_GetFloatValue("AcquisitionFrameRate")[1]
-            info['frame_rate'] = f"{frame_rate:.2f}"
+            if triggered:
+                # 每个间隔触发一帧，丢弃之前残留的帧
+                frame_queue.clear()
+                frame = self._wait_triggered_frame(frame_queue, timeout=1.0, retries=1)
+            else:
+                # 队列深度为1，取出的总是最新一帧
+                frame = frame_queue.get(timeout=1.0)
+            if frame is not None:
+                image = frame.image
+                calibration = self._frame_calibration()
+                if calibration:
+                    image = calibration.undistort_image(image, self.output_profile)
+                # 编码和写盘在后台完成，不推迟下一次取帧
+                if self.save_image(image, filepath, encoding):
+                    self.capture_count += 1
+                    logger.info(f"拍照 #{self.capture_count}: {filename}")
             
-        except Exception as e:
-            logger.warning(f"获取相机信息时出错: {e}")
+            if triggered:
+                # 按固定节拍触发，不累积处理耗时
+                next_capture += self.capture_interval
+                self._continuous_stop.wait(max(0.0, next_capture - time.time()))
+            else:
+                self._continuous_stop.wait(self.capture_interval)
         
-        return info
+        self.continuous_capture = False
+        # 达到最大数量后不再占用取流线程
+        self.unsubscribe('continuous')
     
-    def capture_image(self, save_path=None, apply_calibration=True):
-        """捕获单张图像"""
-        if not self.is_grabbing:
-            logger.error("设备未开始取流")
+    @property
+    def capture_active(self):
+        """连续拍照线程是否存在（达到最大数量后仍需调用stop_continuous_capture收尾）"""
+        return self.capture_thread is not None
+    
+    def stop_continuous_capture(self):
+        """停止连续拍照"""
+        if self.capture_thread is None:
+            logger.warning("未在连续拍照")
+            return False
+        
+        self.continuous_capture = False
+        self._continuous_stop.set()
+        frame_queue = self.dispatcher.get_queue('continuous')
+        if frame_queue:
+            frame_queue.interrupt()
+        
+        if self.capture_thread is not threading.current_thread():
+            self.capture_thread.join()
+        self.capture_thread = None
+        self.unsubscribe('continuous')
+        
+        if self._continuous_restore_trigger:
+            self.set_trigger_mode(self._continuous_restore_trigger)
+            self._continuous_restore_trigger = None
+        
+        # 等待后台写完已拍摄的图像
+        self.flush_writer()
+        stats = self.writer.get_stats()
+        logger.info(f"连续拍照已停止，共拍摄 {self.capture_count} 张图片，"
+                    f"保存失败 {stats['failed']}，队列满丢弃 {stats['dropped']}")
+        return True
+    
+    def stop_all_operations(self):
+        """停止所有操作"""
+        self.stop_video_recording()
+        self.stop_continuous_capture()
+    
+    def disconnect(self):
+        """断开设备连接"""
+        self.stop_all_operations()
+        self._close_writer()
+        
+        if self.is_grabbing:
+            self.stop_grabbing()
+        
+        if self.is_connected:
+            self.backend.close()
+            self.is_connected = False
+            self._callback_registered = False
+            self.dispatcher.latest.clear()
+            self.parameters.invalidate()
+            logger.info("设备已断开")
+
+
+class ReplaySource:
+    """回放数据源 - 按顺序读取录像文件或图像目录中的帧
+    
+    图像目录按文件名自然排序；文件名中带有连续拍照的时间戳（如capture_20250913_101500_123.jpg）时
+    按时间戳还原帧间隔，否则按fps（录像文件默认取文件帧率）计算
+    """
+    
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+    TIMESTAMP_PATTERN = re.compile(r'(\d{8}_\d{6})_(\d{3})')
+    DEFAULT_FPS = 30.0
+    
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.files = None
+        self.timestamps = None
+        
+        if os.path.isdir(path):
+            self.files = sorted((os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(self.IMAGE_EXTENSIONS)),
+                                key=lambda name: [int(part) if part.isdigit() else part
+                                                  for part in re.split(r'(\d+)', os.path.basename(name))])
+            if not self.files:
+                raise ValueError(f"目录中没有图像文件: {path}")
+            self.fps = float(fps or self.DEFAULT_FPS)
+            self.frame_count = len(self.files)
+            self.timestamps = self._parse_timestamps(self.files)
+            first = self._read_image(self.files[0])
+            if first is None:
+                raise ValueError(f"无法读取图像: {self.files[0]}")
+            self.height, self.width = first.shape[:2]
+            self.channels = 1 if first.ndim == 2 else 3
+        elif os.path.isfile(path):
+            capture = cv2.VideoCapture(path)
+            if not capture.isOpened():
+                raise ValueError(f"无法打开录像文件: {path}")
+            self.fps = float(fps or capture.get(cv2.CAP_PROP_FPS) or self.DEFAULT_FPS)
+            self.frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.channels = 3
+            capture.release()
+        else:
+            raise FileNotFoundError(f"回放源不存在: {path}")
+    
+    @classmethod
+    def _parse_timestamps(cls, files):
+        """从连续拍照文件名解析时间戳（秒，相对第一帧），不完整或不递增时返回None"""
+        timestamps = []
+        for name in files:
+            match = cls.TIMESTAMP_PATTERN.search(os.path.basename(name))
+            if not match:
+                return None
+            moment = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+            timestamps.append(moment.timestamp() + int(match.group(2)) / 1000.0)
+        if any(later < earlier for earlier, later in zip(timestamps, timestamps[1:])):
             return None
+        return [timestamp - timestamps[0] for timestamp in timestamps]
+    
+    def _read_image(self, filename):
+        image = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+        if image is not None and image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+    
+    def frames(self):
+        """依次产生 (图像, 相对第一帧的时间戳秒数)"""
+        if self.files is not None:
+            for index, filename in enumerate(self.files):
+                image = self._read_image(filename)
+                if image is None or image.shape[:2] != (self.height, self.width):
+                    logger.warning(f"跳过无法读取或尺寸不一致的图像: {filename}")
+                    continue
+                if self.channels == 1 and image.ndim == 3:
+                    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                elif self.channels == 3 and image.ndim == 2:
+                    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                timestamp = self.timestamps[index] if self.timestamps else index / self.fps
+                yield image, timestamp
+            return
         
+        capture = cv2.VideoCapture(self.path)
         try:
-            # 获取图像数据
-            stFrameInfo = MV_FRAME_OUT_INFO_EX()
-            memset(byref(stFrameInfo), 0, sizeof(stFrameInfo))
-            
-            pData = (c_ubyte * (1920 * 1080 * 3))()
-            ret = self.camera.MV_CC_GetOneFrameTimeout(pData, sizeof(pData), stFrameInfo, 1000)
-            
-            if ret != 0:
-                logger.error(f"获取图像失败，错误码：{ret:x}")
-                return None
-            
-            # 转换为numpy数组
-            image_data = np.frombuffer(pData, dtype=np.uint8, count=stFrameInfo.nFrameLen)
+            index = 0
+            while True:
+                ret, image = capture.read()
+                if not ret:
+                    break
+                yield image, index / self.fps
+                index += 1
+        finally:
+            capture.release()
+
+
+class ReplayBackend(CameraBackend):
+    """回放后端 - 按指定节奏输出回放源中的帧
+    
+    pacing: 'realtime' 按原始帧间隔输出, 'fast' 不等待尽快输出, 'fixed' 按AcquisitionFrameRate输出。
+    按节奏输出时取图跟不上的帧按取图策略丢弃（帧号跳变），与真实相机行为一致；'fast'模式不丢帧。
+    解码在独立线程中预读，不占用取图时间
+    """
+    
+    name = 'replay'
+    
+    PACING_MODES = ('realtime', 'fast', 'fixed')
+    READ_AHEAD = 8
+    
+    def __init__(self, source, pacing='realtime', fps=None, loop=False):
+        load_sdk()
+        if pacing not in self.PACING_MODES:
+            raise ValueError(f"不支持的回放节奏: {pacing}")
+        self.source = ReplaySource(source, fps)
+        self.pacing = pacing
+        self.loop = loop
+        self.pixel_type = PixelType_Gvsp_Mono8 if self.source.channels == 1 else PixelType_Gvsp_BGR8_Packed
+        self.frame_len = self.source.width * self.source.height * self.source.channels
+        
+        self._condition = threading.Condition()
+        self._frames = deque()
+        self._decoder_thread = None
+        self._decoder_done = False
+        self._closed = False
+        self._grabbing = False
+        self._clock_offset = None
+        self._pending_triggers = 0
+        self._trigger_count = 0
+        self._callback = None
+        self._callback_thread = None
+        self._busy_nodes = {}
+        
+        # 回放图像与传感器的对应关系（ROI偏移、合并倍数）未知，这些参数不提供，去畸变按图像尺寸换算内参
+        self._enum_values = {'PixelFormat': self.pixel_type, 'TriggerMode': MV_TRIGGER_MODE_OFF}
+        self._enum_strings = {'TriggerSource': 'Line0', 'TriggerActivation': 'RisingEdge'}
+        self._float_values = {'AcquisitionFrameRate': self.source.fps, 'ResultingFrameRate': self.source.fps}
+        self._bool_values = {'AcquisitionFrameRateEnable': pacing == 'fixed'}
+        self._image_node_num = 3
+        self._grab_strategy = 0
+        self._output_queue_size = 1
+    
+    @property
+    def finished(self):
+        """回放源已全部输出（循环回放时始终为False）"""
+        with self._condition:
+            return self._decoder_done and not self._frames
+    
+    # ---- 解码 ----
+    
+    def _decoder_loop(self):
+        """预读回放源，循环回放时时间戳和帧序号在上一轮之后继续递增"""
+        index = 0
+        time_base = 0.0
+        while not self._closed:
+            last_timestamp = None
+            for image, timestamp in self.source.frames():
+                with self._condition:
+                    while len(self._frames) >= self.READ_AHEAD and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                    self._frames.append((index, image, time_base + timestamp))
+                    self._condition.notify_all()
+                index += 1
+                last_timestamp = timestamp
             
-            # 根据像素格式转换图像
-            if stFrameInfo.enPixelType == PixelType_Gvsp_Mono8:
-                image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth))
-                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-            elif stFrameInfo.enPixelType == PixelType_Gvsp_RGB8_Packed:
-                image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            elif stFrameInfo.enPixelType == PixelType_Gvsp_BGR8_Packed:
-                image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
-            else:
-                # 其他格式转换为BGR
-                nConvertSize = stFrameInfo.nWidth * stFrameInfo.nHeight * 3
-                pConvertData = (c_ubyte * nConvertSize)()
-                
-                stConvertParam = MV_CC_PIXEL_CONVERT_PARAM()
-                memset(byref(stConvertParam), 0, sizeof(stConvertParam))
-                stConvertParam.nWidth = stFrameInfo.nWidth
-                stConvertParam.nHeight = stFrameInfo.nHeight
-                stConvertParam.pSrcData = pData
-                stConvertParam.nSrcDataLen = stFrameInfo.nFrameLen
-                stConvertParam.enSrcPixelType = stFrameInfo.enPixelType
-                stConvertParam.enDstPixelType = PixelType_Gvsp_BGR8_Packed
-                stConvertParam.pDstBuffer = pConvertData
-                stConvertParam.nDstBufferSize = nConvertSize
+            if not self.loop or last_timestamp is None:
+                break
+            time_base += last_timestamp + 1.0 / self.source.fps
+            logger.info("回放源已结束，从头开始循环回放")
+        
+        with self._condition:
+            self._decoder_done = True
+            self._condition.notify_all()
+    
+    # ---- 帧调度 ----
+    
+    def _frame_time(self, item):
+        """帧的计划输出时间（相对回放源），fixed模式按当前帧率计算"""
+        if self.pacing == 'fixed':
+            return item[0] / max(self._float_values['AcquisitionFrameRate'], 0.1)
+        return item[2]
+    
+    def _drop_backlog(self, now, call_time):
+        """取图落后时按取图策略丢弃积压的到期帧，须持有锁"""
+        if self._grab_strategy == 3:
+            # upcoming: 只输出调用之后到期的帧
+            while len(self._frames) > 1 and self._clock_offset + self._frame_time(self._frames[0]) < call_time:
+                self._frames.popleft()
+        else:
+            keep = {0: self._image_node_num, 1: 1, 2: self._output_queue_size}.get(self._grab_strategy, 1)
+            while len(self._frames) > keep and self._clock_offset + self._frame_time(self._frames[keep]) <= now:
+                self._frames.popleft()
+        self._condition.notify_all()
+    
+    def _next_frame(self, timeout):
+        """等待下一帧，返回 (帧序号, 图像, 时间戳)；超时、停止取流或回放结束返回None"""
+        call_time = time.time()
+        deadline = call_time + timeout / 1000.0
+        with self._condition:
+            while self._grabbing:
+                triggered = self._enum_values['TriggerMode'] == MV_TRIGGER_MODE_ON
+                wait_until = deadline
+                if self._frames and (not triggered or self._pending_triggers > 0):
+                    if triggered or self.pacing == 'fast':
+                        return self._pop_frame()
+                    
+                    now = time.time()
+                    if self._clock_offset is None:
+                        self._clock_offset = now - self._frame_time(self._frames[0])
+                    self._drop_backlog(now, call_time)
+                    due = self._clock_offset + self._frame_time(self._frames[0])
+                    if due <= now:
+                        return self._pop_frame()
+                    wait_until = min(due, deadline)
                 
-                ret = self.camera.MV_CC_ConvertPixelType(stConvertParam)
-                if ret != 0:
-                    logger.error(f"像素格式转换失败，错误码：{ret:x}")
+                if time.time() >= deadline or (self._decoder_done and not self._frames):
                     return None
-                
-                image = np.frombuffer(pConvertData, dtype=np.uint8).reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
-            
-            # 应用校准参数进行去畸变
-            if apply_calibration and self.calibration:
-                image = self.calibration.undistort_image(image)
-            
-            # 保存图像
-            if save_path:
-                # 确保目录存在
-                os.makedirs(os.path.dirname(save_path) if os.path.dirname(save_path) else '.', exist_ok=True)
-                cv2.imwrite(save_path, image)
-                logger.info(f"图像已保存：{save_path}")
+                self._condition.wait(max(wait_until - time.time(), 0.0))
+        return None
+    
+    def _pop_frame(self):
+        """取出队首帧，须持有锁"""
+        item = self._frames.popleft()
+        if self._enum_values['TriggerMode'] == MV_TRIGGER_MODE_ON:
+            self._pending_triggers -= 1
+            self._trigger_count += 1
+        self._condition.notify_all()
+        return item
+    
+    def _write_frame(self, item, buffer):
+        """将帧写入缓冲区（ctypes数组或指针）"""
+        if isinstance(buffer, ctypes.Array):
+            data = np.frombuffer(buffer, dtype=np.uint8, count=self.frame_len)
+        else:
+            data = np.ctypeslib.as_array(buffer, shape=(self.frame_len,))
+        data[...] = item[1].reshape(-1)
+    
+    def _fill_frame_info(self, frame_info, item):
+        index, image, timestamp = item
+        frame_info.nWidth = self.source.width
+        frame_info.nHeight = self.source.height
+        frame_info.enPixelType = self.pixel_type
+        frame_info.nFrameLen = self.frame_len
+        frame_info.nFrameNum = index + 1
+        device_timestamp = int(timestamp * 1000000000)
+        frame_info.nDevTimeStampHigh = device_timestamp >> 32
+        frame_info.nDevTimeStampLow = device_timestamp & 0xFFFFFFFF
+        frame_info.nHostTimeStamp = int(time.time() * 1000)
+        frame_info.nLostPacket = 0
+        frame_info.nTriggerIndex = self._trigger_count
+    
+    # ---- 设备 ----
+    
+    def enumerate_devices(self):
+        # 回放源作为唯一的设备
+        return [{'name': self.source.path, 'transport': 'Replay'}]
+    
+    def open(self, device):
+        logger.info(f"打开回放源: {self.source.path} ({self.source.width}x{self.source.height}, "
+                    f"{self.source.frame_count} 帧, 节奏 {self.pacing})")
+        return 0
+    
+    def start_grabbing(self):
+        with self._condition:
+            if self._grabbing:
+                return 0x80000004  # MV_E_CALLORDER
+            self._grabbing = True
+            # 重新开始取流时从下一帧重新对齐时钟
+            self._clock_offset = None
+            self._pending_triggers = 0
+        
+        if self._decoder_thread is None:
+            self._decoder_thread = threading.Thread(target=self._decoder_loop, name="replay-decoder", daemon=True)
+            self._decoder_thread.start()
+        if self._callback is not None:
+            self._callback_thread = threading.Thread(target=self._callback_loop, name="replay-callback", daemon=True)
+            self._callback_thread.start()
+        return 0
+    
+    def stop_grabbing(self):
+        with self._condition:
+            self._grabbing = False
+            self._condition.notify_all()
+        if self._callback_thread is not None and self._callback_thread is not threading.current_thread():
+            self._callback_thread.join()
+        self._callback_thread = None
+        return 0
+    
+    def close(self):
+        self.stop_grabbing()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._decoder_thread is not None:
+            self._decoder_thread.join()
+        self._callback = None
+        return 0
+    
+    # ---- 参数 ----
+    
+    def _int_values(self):
+        return {'Width': self.source.width, 'Height': self.source.height,
+                'PayloadSize': self.frame_len, 'GevTimestampTickFrequency': 1000000000}
+    
+    def get_feature(self, name, kind):
+        values = {'int': self._int_values(), 'enum': self._enum_values,
+                  'float': self._float_values, 'bool': self._bool_values}.get(kind, {})
+        if name not in values:
+            return 0x80000002, None  # MV_E_SUPPORT
+        return 0, values[name]
+    
+    def get_feature_range(self, name):
+        values = self._int_values()
+        if name not in values:
+            return 0x80000002, None  # MV_E_SUPPORT
+        # 回放图像尺寸固定
+        return 0, {'value': values[name], 'min': values[name], 'max': values[name], 'inc': 1}
+    
+    def set_feature(self, name, kind, value):
+        if name in self._enum_strings:
+            self._enum_strings[name] = value
+            return 0
+        
+        if name == 'TriggerMode':
+            with self._condition:
+                self._enum_values[name] = int(value)
+                self._pending_triggers = 0
+                self._clock_offset = None
+                self._condition.notify_all()
+            return 0
+        
+        if name == 'AcquisitionFrameRate':
+            with self._condition:
+                self._float_values[name] = float(value)
+                if self.pacing == 'fixed':
+                    self._float_values['ResultingFrameRate'] = float(value)
+                    self._clock_offset = None
+                self._condition.notify_all()
+            return 0
+        
+        if name in self._bool_values:
+            self._bool_values[name] = bool(value)
+            return 0
+        
+        # 其他参数（图像尺寸、像素格式等）由回放源决定，只接受与当前值相同的写入
+        ret, current = self.get_feature(name, kind)
+        return 0 if ret == 0 and current == value else 0x80000002  # MV_E_SUPPORT
+    
+    def execute_command(self, name):
+        if name != 'TriggerSoftware':
+            return 0x80000002  # MV_E_SUPPORT
+        if (self._enum_values['TriggerMode'] != MV_TRIGGER_MODE_ON
+                or self._enum_strings['TriggerSource'] != 'Software'):
+            return 0x80000008  # MV_E_PRECONDITION
+        with self._condition:
+            self._pending_triggers += 1
+            self._condition.notify_all()
+        return 0
+    
+    def set_image_node_num(self, num):
+        self._image_node_num = max(int(num), 1)
+        return 0
+    
+    def set_grab_strategy(self, strategy):
+        self._grab_strategy = int(strategy)
+        return 0
+    
+    def set_output_queue_size(self, size):
+        self._output_queue_size = max(int(size), 1)
+        return 0
+    
+    # ---- 取图 ----
+    
+    def get_frame(self, buffer, frame_info, timeout):
+        if not self._grabbing or self._callback is not None:
+            return 0x80000004  # MV_E_CALLORDER
+        if len(buffer) < self.frame_len:
+            return 0x8000000A  # MV_E_NOENOUGH_BUF
+        
+        item = self._next_frame(timeout)
+        if item is None:
+            return self._no_frame_code()
+        self._write_frame(item, buffer)
+        self._fill_frame_info(frame_info, item)
+        return 0
+    
+    def _no_frame_code(self):
+        """没有取到帧时的错误码：回放源已全部输出返回END_OF_STREAM，否则为超时"""
+        return self.END_OF_STREAM if self.finished else 0x80000007  # MV_E_NODATA
+    
+    def get_image_buffer(self, out_frame, timeout):
+        if not self._grabbing or self._callback is not None:
+            return 0x80000004  # MV_E_CALLORDER
+        if len(self._busy_nodes) >= self._image_node_num:
+            return 0x8000000D  # MV_E_NOOUTBUF
+        
+        item = self._next_frame(timeout)
+        if item is None:
+            return self._no_frame_code()
+        
+        node = (ctypes.c_ubyte * self.frame_len)()
+        self._write_frame(item, node)
+        self._fill_frame_info(out_frame.stFrameInfo, item)
+        self._busy_nodes[ctypes.addressof(node)] = node
+        out_frame.pBufAddr = ctypes.cast(node, ctypes.POINTER(ctypes.c_ubyte))
+        return 0
+    
+    def free_image_buffer(self, out_frame):
+        if not out_frame.pBufAddr:
+            return 0x80000005  # MV_E_PARAMETER
+        address = ctypes.cast(out_frame.pBufAddr, ctypes.c_void_p).value
+        if self._busy_nodes.pop(address, None) is None:
+            return 0x80000005  # MV_E_PARAMETER
+        out_frame.pBufAddr = None
+        return 0
+    
+    def register_image_callback(self, callback):
+        if self._grabbing:
+            return 0x80000004  # MV_E_CALLORDER
+        self._callback = callback
+        return 0
+    
+    def _callback_loop(self):
+        """按回放节奏调用注册的图像回调"""
+        buffer = (ctypes.c_ubyte * self.frame_len)()
+        while self._grabbing:
+            item = self._next_frame(100)
+            if item is None:
+                if self.finished:
+                    logger.info("回放源已全部输出")
+                    return
+                continue
+            frame_info = MV_FRAME_OUT_INFO_EX()
+            self._write_frame(item, buffer)
+            self._fill_frame_info(frame_info, item)
+            self._callback(buffer, frame_info)
+
+
+class ReplayCameraLinux(HikvisionCameraLinux):
+    """回放相机 - 接口与HikvisionCameraLinux相同，图像来自录像文件或图像目录
+    
+    取流、帧分发、去畸变、录像和连续拍照都走与真实相机相同的流程，
+    用于离线按生产帧率分析和回归测试处理流程
+    """
+    
+    def __init__(self, source, calibration=None, pacing='realtime', fps=None, loop=False):
+        HikvisionCameraLinux.__init__(self, calibration, ReplayBackend(source, pacing, fps, loop))
+    
+    @property
+    def replay_finished(self):
+        """回放源是否已全部输出"""
+        return self.backend.finished
+    
+    def get_camera_info(self):
+        """获取相机信息，附加回放源和回放节奏"""
+        info = HikvisionCameraLinux.get_camera_info(self)
+        if info is not None:
+            info['replay_source'] = self.backend.source.path
+            info['replay_pacing'] = self.backend.pacing
+        return info
+
+
+class SharedFrameRing:
+    """共享内存帧环形缓冲 - 固定数量、固定大小的槽位，工作进程写入，主进程按槽位索引读取"""
+    
+    def __init__(self, slots, slot_size, name=None, create=False):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=slots * slot_size)
+    
+    @property
+    def name(self):
+        return self.shm.name
+    
+    def view(self, slot, shape):
+        """返回槽位的uint8图像视图"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_size)
+    
+    def write(self, slot, image):
+        """将图像拷贝到槽位，图像超过槽位大小返回False"""
+        if image.nbytes > self.slot_size:
+            return False
+        np.copyto(self.view(slot, image.shape), image)
+        return True
+    
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有帧引用共享内存，交由进程退出时回收
+            logger.warning("共享内存仍被帧引用，延迟释放")
+    
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _camera_worker_main(device_index, calibration, options, ring_slots, commands, events, free_slots, stop_event):
+    """相机工作进程：在独立解释器中取流、转换和去畸变，图像写入共享内存，只把槽位索引和帧信息发回主进程"""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    camera = HikvisionCameraLinux(calibration, options.get('backend'))
+    # 由主进程统一处理Ctrl+C并通知工作进程退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    if not camera.discover_devices(options.get('device_cache', False)) or not MultiCameraManager.setup_camera(camera, device_index, options):
+        camera.disconnect()
+        events.put(('error', f"相机 [{device_index}] 初始化失败"))
+        return
+    
+    # 共享内存由主进程按槽位大小创建并负责回收，工作进程只挂载
+    geometry = camera.get_image_geometry()
+    slot_size = geometry['width'] * geometry['height'] * 3
+    events.put(('ready', slot_size))
+    try:
+        _, _, (name,), _ = commands.get(timeout=30)
+    except Empty:
+        logger.error("等待共享内存超时")
+        camera.disconnect()
+        return
+    ring = SharedFrameRing(ring_slots, slot_size, name=name)
+    frame_queue = camera.subscribe('worker', queue_size=2, drop_policy='drop_oldest')
+
+    ring_dropped = 0
+    
+    def send_status():
+        stats = camera.get_frame_stats()
+        stats['ring_dropped'] = ring_dropped
+        events.put(('status', stats, {
+            'is_recording': camera.is_recording,
+            'continuous_capture': camera.continuous_capture,
+            'capture_active': camera.capture_active,
+        }))
+    
+    try:
+        last_status = time.time()
+        while not stop_event.is_set():
+            # 处理主进程的方法调用
+            while True:
+                try:
+                    call_id, method, args, kwargs = commands.get_nowait()
+                except Empty:
+                    break
+                try:
+                    result = getattr(camera, method)(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"工作进程执行 {method} 出错: {e}")
+                    result = None
+                send_status()
+                events.put(('result', call_id, result))
             
-            return image
+            frame = frame_queue.get(timeout=0.05)
+            if frame is not None:
+                frame = camera._undistort_frame(frame)
+                image = frame.image
+                try:
+                    slot = free_slots.get_nowait()
+                except Empty:
+                    # 主进程没有及时归还槽位
+                    ring_dropped += 1
+                else:
+                    if ring.write(slot, image):
+                        fields = {name: getattr(frame, name) for name in Frame.__slots__ if name != 'image'}
+                        fields['width'], fields['height'] = image.shape[1], image.shape[0]
+                        events.put(('frame', slot, image.shape, fields))
+                    else:
+                        free_slots.put(slot)
+                        ring_dropped += 1
+                        logger.warning(f"图像 {image.shape} 超过共享内存槽位大小，已丢弃")
             
-        except Exception as e:
-            logger.error(f"捕获图像时发生错误：{e}")
-            return None
+            if time.time() - last_status >= 1.0:
+                send_status()
+                last_status = time.time()
+    finally:
+        camera.unsubscribe('worker')
+        camera.disconnect()
+        send_status()
+        events.put(('stopped',))
+        ring.close()
+
+
+class CameraWorkerProcess:
+    """相机工作进程代理 - 每台相机在独立进程中运行HikvisionCameraLinux
     
-    def start_video_recording(self, output_path, fps=30, codec='XVID'):
-        """开始录像"""
-        if self.is_recording:
-            logger.warning("正在录像中")
-            return False
+    取流、像素转换和去畸变不再受主进程GIL限制；图像经共享内存环形缓冲传递，
+    主进程只接收槽位索引和帧信息，通过frame_callback收到SharedMemoryFrame，用完后须release()
+    """
+    
+    def __init__(self, device_index, calibration=None, options=None, ring_slots=16, frame_callback=None):
+        self.device_index = device_index
+        self.calibration = calibration
+        self.options = dict(options or {})
+        self.ring_slots = ring_slots
+        self.frame_callback = frame_callback
         
-        if not self.is_grabbing:
-            logger.error("设备未开始取流")
+        self.process = None
+        self.ring = None
+        self.frame_stats = {}
+        self.status = {'is_recording': False, 'continuous_capture': False, 'capture_active': False}
+        
+        # SDK不能安全地跨fork继承，工作进程使用spawn方式启动
+        self._context = multiprocessing.get_context('spawn')
+        self._commands = None
+        self._events = None
+        self._free_slots = None
+        self._stop_event = None
+        self._reader_thread = None
+        self._results = {}
+        self._results_condition = threading.Condition()
+        self._next_call_id = 0
+        self._stopped = threading.Event()
+    
+    def start(self, timeout=30.0):
+        """启动工作进程，等待相机开始取流"""
+        self._commands = self._context.Queue()
+        self._events = self._context.Queue()
+        self._free_slots = self._context.Queue()
+        self._stop_event = self._context.Event()
+        for slot in range(self.ring_slots):
+            self._free_slots.put(slot)
+        
+        self.process = self._context.Process(
+            target=_camera_worker_main, name=f"camera-worker-{self.device_index}", daemon=True,
+            args=(self.device_index, self.calibration, self.options, self.ring_slots,
+                  self._commands, self._events, self._free_slots, self._stop_event))
+        self.process.start()
+        
+        try:
+            message = self._events.get(timeout=timeout)
+        except Empty:
+            logger.error(f"相机 [{self.device_index}] 工作进程启动超时")
+            self.stop()
             return False
         
-        # 获取一帧图像以确定尺寸
-        test_image = self.capture_image(apply_calibration=False)
-        if test_image is None:
-            logger.error("无法获取图像尺寸")
+        if message[0] != 'ready':
+            logger.error(message[1] if message[0] == 'error' else f"工作进程返回异常消息: {message[0]}")
+            self.stop()
             return False
         
-        height, width = test_image.shape[:2]
+        self.ring = SharedFrameRing(self.ring_slots, message[1], create=True)
+        self._commands.put((None, 'attach', (self.ring.name,), {}))
+        self._reader_thread = threading.Thread(target=self._event_loop, name=f"camera-worker-events-{self.device_index}",
+                                               daemon=True)
+        self._reader_thread.start()
+        logger.info(f"相机 [{self.device_index}] 工作进程已启动 (pid {self.process.pid})")
+        return True
+    
+    def _event_loop(self):
+        """接收工作进程发回的帧、状态和调用结果"""
+        while True:
+            try:
+                message = self._events.get(timeout=0.1)
+            except Empty:
+                if self._stopped.is_set() or not self.process.is_alive():
+                    break
+                continue
+            
+            kind = message[0]
+            if kind == 'frame':
+                _, slot, shape, fields = message
+                frame = SharedMemoryFrame(self, slot, self.ring.view(slot, shape), **fields)
+                if self.frame_callback:
+                    self.frame_callback(frame)
+                else:
+                    frame.release()
+            elif kind == 'status':
+                self.frame_stats, self.status = message[1], message[2]
+            elif kind == 'result':
+                with self._results_condition:
+                    self._results[message[1]] = message[2]
+                    self._results_condition.notify_all()
+            elif kind == 'stopped':
+                break
         
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+        self._stopped.set()
+        with self._results_condition:
+            self._results_condition.notify_all()
+    
+    def release_slot(self, slot):
+        """归还槽位给工作进程"""
+        if not self._stopped.is_set():
+            self._free_slots.put(slot)
+    
+    def call(self, method, *args, timeout=10.0, **kwargs):
+        """在工作进程中调用HikvisionCameraLinux的方法并返回结果，超时返回None"""
+        if self._stopped.is_set() or self.process is None:
+            logger.error(f"相机 [{self.device_index}] 工作进程未运行")
+            return None
         
-        # 创建视频写入器
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-        self.video_writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        with self._results_condition:
+            call_id = self._next_call_id
+            self._next_call_id += 1
+        self._commands.put((call_id, method, args, kwargs))
         
-        if not self.video_writer.isOpened():
-            logger.error("无法创建视频文件")
-            return False
+        deadline = time.time() + timeout
+        with self._results_condition:
+            while call_id not in self._results:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stopped.is_set():
+                    logger.error(f"相机 [{self.device_index}] 调用 {method} 超时")
+                    return None
+                self._results_condition.wait(remaining)
+            return self._results.pop(call_id)
+    
+    def apply_parameters(self, parameters):
+        return self.call('apply_parameters', parameters)
+    
+    def set_calibration(self, calibration, background=False):
+        self.calibration = calibration
+        return self.call('set_calibration', calibration, background)
+    
+    def set_trigger_mode(self, mode, source='Line0', activation='RisingEdge'):
+        return self.call('set_trigger_mode', mode, source, activation)
+    
+    def start_video_recording(self, output_path, fps=30, codec='XVID'):
+        return self.call('start_video_recording', output_path, fps, codec)
+    
+    def stop_video_recording(self):
+        return self.call('stop_video_recording')
+    
+    def set_encoding(self, profile='balanced', **settings):
+        return self.call('set_encoding', profile, **settings)
+    
+    def start_continuous_capture(self, output_dir, interval=1.0, format='jpg', max_count=None, encoding=None):
+        return self.call('start_continuous_capture', output_dir, interval, format, max_count, False, encoding)
+    
+    def stop_continuous_capture(self):
+        return self.call('stop_continuous_capture')
+    
+    @property
+    def is_recording(self):
+        return self.status['is_recording']
+    
+    @property
+    def continuous_capture(self):
+        return self.status['continuous_capture']
+    
+    @property
+    def capture_active(self):
+        return self.status['capture_active']
+    
+    def get_frame_stats(self):
+        """最近一次由工作进程上报的帧统计（含共享内存槽位不足导致的丢帧）"""
+        return dict(self.frame_stats)
+    
+    def stop(self, timeout=10.0):
+        """通知工作进程停止并等待退出"""
+        if self.process is None:
+            return
         
-        self.is_recording = True
-        self.stop_event.clear()
+        self._stop_event.set()
+        if self._reader_thread is not None:
+            self._reader_thread.join(timeout)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning(f"相机 [{self.device_index}] 工作进程未按时退出，强制结束")
+            self.process.terminate()
+            self.process.join()
+        self._stopped.set()
         
-        # 启动录像线程
-        self.record_thread = threading.Thread(target=self._recording_loop)
-        self.record_thread.start()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+        self.process = None
+        logger.info(f"相机 [{self.device_index}] 工作进程已停止")
+    
+    def disconnect(self):
+        self.stop()
+
+
+class MultiCameraManager:
+    """多相机管理器 - 同时打开多台设备，每台相机有独立的取流线程
+
+    汇总各相机帧率和丢帧统计，并按设备时间戳给出各相机最接近的一组同步帧
+    """
+    
+    # 设备时间戳频率读取失败时的默认值（纳秒计数）
+    DEFAULT_TICK_FREQUENCY = 1000000000
+    
+    def __init__(self, calibration=None, history=8, fps_window=30, process_mode=False, backend=None,
+                 device_cache=False):
+        self.calibration = calibration
+        # 相机后端名称（见CAMERA_BACKENDS），每台相机创建各自的后端实例
+        self.backend = backend
+        # 使用磁盘缓存的设备列表，见HikvisionCameraLinux.discover_devices
+        self.device_cache = device_cache
+        self.history = history
+        self.fps_window = fps_window
+        # process_mode为True时每台相机在独立工作进程中运行，图像经共享内存传回
+        self.process_mode = process_mode
+        self.cameras = {}
+        self.device_list = None
+        self.device_list_cached = False
         
-        logger.info(f"开始录像：{output_path} (FPS: {fps}, 编码: {codec})")
-        return True
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._arrivals = {}
+        self._tick_frequency = {}
     
-    def _recording_loop(self):
-        """录像循环"""
-        frame_count = 0
-        start_time = time.time()
+    def discover_devices(self):
+        """枚举设备，返回设备数量；只创建用于枚举的后端，不创建相机实例（不打开设备、不注册信号处理器）"""
+        try:
+            backend = create_backend(self.backend)
+        except Exception as e:
+            logger.error(f"相机后端创建失败: {e}")
+            return 0
         
-        while self.is_recording and not self.stop_event.is_set():
-            image = self.capture_image(apply_calibration=True)
-            if image is not None:
-                self.video_writer.write(image)
-                frame_count += 1
-                
-                # 每100帧输出一次状态
-                if frame_count % 100 == 0:
-                    elapsed = time.time() - start_time
-                    fps = frame_count / elapsed
-                    logger.info(f"录像进行中... 帧数: {frame_count}, 实际FPS: {fps:.2f}")
-            else:
-                time.sleep(0.01)  # 避免CPU占用过高
+        devices, cached = discover_devices(backend, self.device_cache)
+        if devices is None:
+            return 0
+        self.device_list = devices
+        self.device_list_cached = cached
+        return len(self.device_list)
     
-    def stop_video_recording(self):
-        """停止录像"""
-        if not self.is_recording:
-            logger.warning("未在录像")
+    def open(self, device_indices=None, acquisition_mode='poll', frame_queue_size=None,
+             record_drop_policy=None, image_node_num=None, grab_strategy=None,
+             output_queue_size=None, geometry=None, zero_copy=False, undistort_frames=True,
+             output_profile=None, writer_options=None, encoding=None):
+        """打开并开始取流，device_indices为None时打开全部设备；任一相机失败则全部关闭"""
+        if self.device_list is None and not self.discover_devices():
             return False
         
-        self.is_recording = False
-        self.stop_event.set()
+        if device_indices is None:
+            device_indices = list(range(len(self.device_list)))
         
-        if self.record_thread:
-            self.record_thread.join()
+        options = {
+            'acquisition_mode': acquisition_mode,
+            'frame_queue_size': frame_queue_size,
+            'record_drop_policy': record_drop_policy,
+            'image_node_num': image_node_num,
+            'grab_strategy': grab_strategy,
+            'output_queue_size': output_queue_size,
+            'geometry': geometry,
+            'zero_copy': zero_copy,
+            'undistort_frames': undistort_frames,
+            'output_profile': output_profile,
+            'writer_options': writer_options,
+            'encoding': encoding,
+            'backend': self.backend,
+            'device_cache': self.device_cache,
+        }
         
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
+        for index in device_indices:
+            # 每台相机的图像几何可能不同，校准参数各用一份副本
+            calibration = copy.deepcopy(self.calibration) if self.calibration else None
+            self._frames[index] = deque(maxlen=self.history)
+            self._arrivals[index] = deque(maxlen=self.fps_window)
+            
+            logger.info(f"打开相机 [{index}]")
+            if self.process_mode:
+                # 主进程持有的历史帧之外再留出同样多的空闲槽位给工作进程
+                # 工作进程已按undistort_frames去畸变后再写入共享内存
+                camera = CameraWorkerProcess(index, calibration, options, ring_slots=self.history * 2,
+                                             frame_callback=lambda frame, index=index: self._on_frame(index, frame))
+                self.cameras[index] = camera
+                if not camera.start():
+                    self.close()
+                    return False
+                frequency = camera.call('get_parameter', "GevTimestampTickFrequency")
+            else:
+                camera = HikvisionCameraLinux(calibration, self.backend)
+                camera.device_list = self.device_list
+                camera.device_list_cached = self.device_list_cached
+                self.cameras[index] = camera
+                if not self.setup_camera(camera, index, options):
+                    self.close()
+                    return False
+                frequency = camera.get_parameter("GevTimestampTickFrequency")
+                # 订阅者收到的是原始帧，在回调线程中去畸变，与多进程模式的工作进程保持一致
+                camera.subscribe('sync', queue_size=self.history, drop_policy='drop_oldest',
+                                 callback=lambda frame, index=index, camera=camera:
+                                 self._on_frame(index, camera._undistort_frame(frame)))
+            
+            self._tick_frequency[index] = frequency or self.DEFAULT_TICK_FREQUENCY
+
+        # 各相机实例会注册自己的信号处理器，这里统一改为停止全部相机
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
         
-        logger.info("录像已停止")
+        logger.info(f"已打开 {len(self.cameras)} 台相机: {list(self.cameras)}")
         return True
     
-    def start_continuous_capture(self, output_dir, interval=1.0, format='jpg', max_count=None):
-        """开始连续拍照"""
-        if self.continuous_capture:
-            logger.warning("正在连续拍照中")
+    @staticmethod
+    def setup_camera(camera, index, options):
+        """连接并配置单台相机，然后开始取流"""
+        if not (camera.connect(index, options.get('image_node_num'), options.get('grab_strategy'),
+                               options.get('output_queue_size'))
+                and camera.set_acquisition_mode(options.get('acquisition_mode', 'poll'))
+                and camera.configure_subscriber('recorder', options.get('frame_queue_size'),
+                                                options.get('record_drop_policy'))):
+            logger.error(f"相机 [{index}] 初始化失败")
             return False
         
-        if not self.is_grabbing:
-            logger.error("设备未开始取流")
+        camera.zero_copy = options.get('zero_copy', False)
+        camera.undistort_frames = options.get('undistort_frames', True)
+        camera.output_profile = options.get('output_profile')
+        if options.get('writer_options'):
+            camera.configure_writer(**options['writer_options'])
+        if options.get('encoding') and not camera.set_encoding(**options['encoding']):
             return False
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        self.continuous_capture = True
-        self.capture_interval = interval
-        self.capture_count = 0
-        self.stop_event.clear()
-        
-        # 启动连续拍照线程
-        self.capture_thread = threading.Thread(
-            target=self._continuous_capture_loop, 
-            args=(output_dir, format, max_count)
-        )
-        self.capture_thread.start()
-        
-        logger.info(f"开始连续拍照：间隔 {interval}s，格式 {format}，目录 {output_dir}")
-        if max_count:
-            logger.info(f"最大拍照数量: {max_count}")
-        return True
+        geometry = options.get('geometry')
+        if geometry and not camera.set_image_geometry(**geometry):
+            return False
+        return camera.start_grabbing()
     
-    def _continuous_capture_loop(self, output_dir, format, max_count):
-        """连续拍照循环"""
-        while self.continuous_capture and not self.stop_event.is_set():
-            if max_count and self.capture_count >= max_count:
-                logger.info(f"已达到最大拍照数量 {max_count}，停止连续拍照")
-                break
+    def _signal_handler(self, signum, frame):
+        """信号处理器"""
+        logger.info(f"接收到信号 {signum}，正在安全退出...")
+        self.stop_all_operations()
+        sys.exit(0)
+    
+    def _on_frame(self, index, frame):
+        """记录每台相机最近的帧和到达时间"""
+        with self._lock:
+            frames = self._frames.get(index)
+            if frames is None:
+                # 相机已关闭
+                if isinstance(frame, SharedMemoryFrame):
+                    frame.release()
+                return
+            evicted = frames[0] if len(frames) == frames.maxlen else None
+            frames.append(frame)
+            self._arrivals[index].append(time.time())
+            # 共享内存帧移出历史后归还槽位
+            if isinstance(evicted, SharedMemoryFrame):
+                evicted.release()
+
+    def _frame_time(self, index, frame, timestamp):
+        """帧时间（秒）：'device' 按设备时间戳，'host' 按主机时间戳"""
+        if timestamp == 'device' and frame.device_timestamp:
+            return frame.device_timestamp / self._tick_frequency[index]
+        return frame.host_timestamp
+    
+    def get_synchronized_frames(self, max_skew=None, timestamp='device'):
+        """返回各相机时间戳最接近的一组帧 {设备索引: Frame}
+
+        以各相机最新帧中最早的一帧为基准，其余相机取与之最接近的帧。
+        max_skew（秒）非空时，组内时间差超过该值返回None。
+        设备时间戳只在相机时钟同步（如PTP）时可跨相机比较，否则使用timestamp='host'。
+        单线程和多进程模式下均按open()的undistort_frames返回去畸变后的帧（frame.calibration_version
+        记录所用校准版本），undistort_frames为False时返回原始帧。
+        多进程模式下返回的帧已拷贝出共享内存，可长期持有
+        """
+        with self._lock:
+            history = {index: list(frames) for index, frames in self._frames.items()}
+            if not history or not all(history.values()):
+                return None
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-            filename = f"capture_{timestamp}.{format}"
-            filepath = os.path.join(output_dir, filename)
+            times = {index: [self._frame_time(index, frame, timestamp) for frame in frames]
+                     for index, frames in history.items()}
+            reference = min(times, key=lambda index: times[index][-1])
+            reference_time = times[reference][-1]
             
-            image = self.capture_image(filepath, apply_calibration=True)
-            if image is not None:
-                self.capture_count += 1
-                logger.info(f"拍照 #{self.capture_count}: {filename}")
+            group = {}
+            group_times = []
+            for index, frames in history.items():
+                best = min(range(len(frames)), key=lambda i: abs(times[index][i] - reference_time))
+                group[index] = frames[best]
+                group_times.append(times[index][best])
             
-            time.sleep(self.capture_interval)
-        
-        self.continuous_capture = False
+            skew = max(group_times) - min(group_times)
+            if max_skew is not None and skew > max_skew:
+                logger.debug(f"同步帧时间差 {skew * 1000:.2f}ms 超过 {max_skew * 1000:.2f}ms")
+                return None
+            
+            # 只拷贝返回的帧；在锁内拷贝，避免与新帧到达时的槽位归还冲突
+            for frame in group.values():
+                if isinstance(frame, SharedMemoryFrame):
+                    frame.detach()
+        return group
     
-    def stop_continuous_capture(self):
-        """停止连续拍照"""
-        if not self.continuous_capture:
-            logger.warning("未在连续拍照")
-            return False
-        
-        self.continuous_capture = False
-        self.stop_event.set()
+    def get_stats(self):
+        """各相机帧率和丢帧统计，以及汇总"""
+        stats = {}
+        with self._lock:
+            arrivals = {index: list(times) for index, times in self._arrivals.items()}
         
-        if self.capture_thread:
-            self.capture_thread.join()
+        total = {'fps': 0.0, 'received': 0, 'dropped': 0, 'lost_packets': 0,
+                 'incomplete_frames': 0, 'queue_dropped': 0}
+        for index, camera in self.cameras.items():
+            camera_stats = camera.get_frame_stats()
+            times = arrivals.get(index, [])
+            elapsed = times[-1] - times[0] if len(times) > 1 else 0
+            camera_stats['fps'] = (len(times) - 1) / elapsed if elapsed > 0 else 0.0
+            stats[index] = camera_stats
+            for key in total:
+                total[key] += camera_stats.get(key, 0)
         
-        logger.info(f"连续拍照已停止，共拍摄 {self.capture_count} 张图片")
-        return True
+        stats['total'] = total
+        return stats
+    
+    def start_video_recording(self, output_path, fps=30, codec='XVID'):
+        """所有相机开始录像，文件名追加 _cam<索引>"""
+        base, ext = os.path.splitext(output_path)
+        success = True
+        for index, camera in self.cameras.items():
+            if not camera.start_video_recording(f"{base}_cam{index}{ext or '.avi'}", fps, codec):
+                success = False
+        return success
+    
+    def stop_video_recording(self):
+        """所有相机停止录像"""
+        for camera in self.cameras.values():
+            if camera.is_recording:
+                camera.stop_video_recording()
+    
+    def start_continuous_capture(self, output_dir, interval=1.0, format='jpg', max_count=None):
+        """所有相机开始连续拍照，每台相机保存到 output_dir/cam<索引>"""
+        success = True
+        for index, camera in self.cameras.items():
+            camera_dir = os.path.join(output_dir, f"cam{index}")
+            if not camera.start_continuous_capture(camera_dir, interval, format, max_count):
+                success = False
+        return success
+    
+    def stop_continuous_capture(self):
+        """所有相机停止连续拍照"""
+        for camera in self.cameras.values():
+            if camera.capture_active:
+                camera.stop_continuous_capture()
+    
+    @property
+    def is_recording(self):
+        return any(camera.is_recording for camera in self.cameras.values())
+    
+    @property
+    def continuous_capture(self):
+        return any(camera.continuous_capture for camera in self.cameras.values())
+    
+    def set_calibration(self, calibration, background=True):
+        """所有相机更换校准参数，每台相机使用各自的副本（图像几何可能不同），默认后台准备后替换"""
+        self.calibration = calibration
+        for camera in self.cameras.values():
+            camera.set_calibration(copy.deepcopy(calibration) if calibration else None, background)
     
     def stop_all_operations(self):
-        """停止所有操作"""
+        """停止所有相机的录像和连续拍照"""
         self.stop_video_recording()
         self.stop_continuous_capture()
     
-    def disconnect(self):
-        """断开设备连接"""
+    def close(self):
+        """停止所有操作并断开全部相机"""
         self.stop_all_operations()
+        # 先归还共享内存帧，工作进程退出时共享内存不再被引用
+        with self._lock:
+            for frames in self._frames.values():
+                for frame in frames:
+                    if isinstance(frame, SharedMemoryFrame):
+                        frame.release()
+            self._frames.clear()
+            self._arrivals.clear()
         
-        if self.is_grabbing:
-            self.stop_grabbing()
-        
-        if self.is_connected:
-            ret = self.camera.MV_CC_CloseDevice()
-            if ret != 0:
-                logger.error(f"关闭设备失败，错误码：{ret:x}")
-            
-            ret = self.camera.MV_CC_DestroyHandle()
-            if ret != 0:
-                logger.error(f"销毁设备句柄失败，错误码：{ret:x}")
-            
-            self.is_connected = False
-            logger.info("设备已断开")
+        for camera in self.cameras.values():
+            if isinstance(camera, HikvisionCameraLinux):
+                camera.unsubscribe('sync')
+            camera.disconnect()
+        self.cameras.clear()
 
 
 class CameraControllerLinux:
     """相机控制器主类 - Linux版本"""
     
+    # --output-width 对应的校准输出配置名称
+    OUTPUT_PROFILE = 'output'
+    
     def __init__(self):
         self.camera = None
         self.calibration = None
+        self.zero_copy = False
+        self.undistort_frames = True
+        # 相机后端名称，None为海康威视SDK
+        self.backend = None
+        # 使用磁盘缓存的设备列表，跳过枚举
+        self.device_cache = False
+        # 去畸变映射表缓存到校准文件所在目录
+        self.cache_maps = False
+        # 去畸变输出选项，见CameraCalibration.set_undistort_options
+        self.undistort_alpha = None
+        self.undistort_crop = False
+        # 分带去畸变线程数和OpenCV线程数，见CameraCalibration.set_parallel
+        self.undistort_threads = 0
+        self.opencv_threads = None
+        # 录像和拍照的输出宽度，去畸变与缩放合并为一次remap，None为原尺寸
+        self.output_width = None
+        # 后台保存参数，见HikvisionCameraLinux.configure_writer，None为默认值
+        self.writer_options = None
+        # 保存图像的编码配置，见HikvisionCameraLinux.set_encoding，None为balanced
+        self.encoding = None
+        # 回放参数（source/pacing/fps/loop），设置后用回放源代替相机
+        self.replay = None
         
     def load_calibration(self, calibration_file):
-        """加载校准文件"""
-        self.calibration = CameraCalibration(calibration_file)
+        """加载校准文件；相机取流中时在后台生成映射表后替换，不中断取流和录像"""
+        calibration = CameraCalibration(calibration_file, self.cache_maps)
+        if calibration.version is None:
+            return False
+        calibration.set_undistort_options(self.undistort_alpha, self.undistort_crop)
+        calibration.set_parallel(self.undistort_threads, self.opencv_threads)
+        if self.output_width:
+            calibration.set_output_profile(self.OUTPUT_PROFILE, width=self.output_width)
+        self.calibration = calibration
         if self.camera:
-            self.camera.calibration = self.calibration
+            self.camera.set_calibration(calibration, background=self.camera.is_grabbing)
+        return True
     
-    def initialize_camera(self, device_index=0):
-        """初始化相机"""
+    def replay_finished(self):
+        """回放模式下回放源是否已全部输出"""
+        return isinstance(self.camera, ReplayCameraLinux) and self.camera.replay_finished
+    
+    def initialize_camera(self, device_index=0, acquisition_mode='poll', frame_queue_size=None,
+                          record_drop_policy=None, image_node_num=None, grab_strategy=None,
+                          output_queue_size=None, geometry=None):
+        """初始化相机
+
+        geometry: 可选，传给set_image_geometry的ROI/合并参数字典，在开始取流前设置
+        """
         # 避免重复创建相机实例
-        if self.camera is None:
-            self.camera = HikvisionCameraLinux(self.calibration)
+        if self.camera is None and self.replay:
+            try:
+                self.camera = ReplayCameraLinux(calibration=self.calibration, **self.replay)
+            except (OSError, ValueError) as e:
+                logger.error(f"打开回放源失败: {e}")
+                return False
+        elif self.camera is None:
+            self.camera = HikvisionCameraLinux(self.calibration, self.backend)
         else:
             logger.warning("相机实例已存在，将重用现有实例")
             # 更新校准参数
             if self.calibration:
-                self.camera.calibration = self.calibration
+                self.camera.set_calibration(self.calibration)
         
         # 发现设备
-        if not self.camera.discover_devices():
+        if not self.camera.discover_devices(self.device_cache):
+            return False
+        
+        # 输出配置在连接前设置，连接时按它预生成映射表
+        self.camera.output_profile = self.OUTPUT_PROFILE if self.output_width else None
+        if self.writer_options:
+            self.camera.configure_writer(**self.writer_options)
+        if self.encoding and not self.camera.set_encoding(**self.encoding):
             return False
         
         # 连接指定设备
-        if not self.camera.connect(device_index):
+        if not self.camera.connect(device_index, image_node_num, grab_strategy, output_queue_size):
+            return False
+        
+        # 设置取图方式
+        if not self.camera.set_acquisition_mode(acquisition_mode):
+            return False
+        if not self.camera.configure_subscriber('recorder', frame_queue_size, record_drop_policy):
+            return False
+        self.camera.zero_copy = self.zero_copy
+        self.camera.undistort_frames = self.undistort_frames
+        
+        # 设置ROI和合并/抽样
+        if geometry and not self.camera.set_image_geometry(**geometry):
             return False
         
         # 开始取流
@@ -866,6 +5539,11 @@ class CameraControllerLinux:
         print("  stop_record - 停止录像")
         print("  continuous [directory] [interval] [format] [max_count] - 开始连续拍照")
         print("  stop_continuous - 停止连续拍照")
+        print("  trigger [off|software|line] [source] [activation] - 设置触发模式")
+        print("  burst [count] [interval] [directory] [format] - 触发连拍")
+        print("  roi [width] [height] [offset_x|center] [offset_y] - 设置ROI")
+        print("  binning [n] [decimation] - 设置合并/抽样倍数")
+        print("  param [name] [value] - 读取/设置相机参数")
         print("  calibration [file] - 加载校准文件")
         print("  info - 显示相机信息")
         print("  status - 显示当前状态")
@@ -916,6 +5594,41 @@ class CameraControllerLinux:
                 elif cmd == 'stop_continuous':
                     self.camera.stop_continuous_capture()
                 
+                elif cmd == 'trigger':
+                    mode = command[1] if len(command) > 1 else 'software'
+                    source = command[2] if len(command) > 2 else 'Line0'
+                    activation = command[3] if len(command) > 3 else 'RisingEdge'
+                    self.camera.set_trigger_mode(mode, source, activation)
+                
+                elif cmd == 'roi':
+                    width = int(command[1]) if len(command) > 1 else None
+                    height = int(command[2]) if len(command) > 2 else None
+                    center = len(command) > 3 and command[3] == 'center'
+                    offset_x = int(command[3]) if len(command) > 3 and not center else None
+                    offset_y = int(command[4]) if len(command) > 4 else None
+                    self.camera.set_image_geometry(width, height, offset_x, offset_y, center=center)
+                
+                elif cmd == 'binning':
+                    binning = int(command[1]) if len(command) > 1 else 1
+                    decimation = int(command[2]) if len(command) > 2 else None
+                    self.camera.set_image_geometry(binning=binning, decimation=decimation)
+                
+                elif cmd == 'param':
+                    if len(command) < 2:
+                        for name, value in self.camera.parameters.snapshot().items():
+                            print(f"  {name}: {value}")
+                    elif len(command) == 2:
+                        print(f"  {command[1]}: {self.camera.get_parameter(command[1], refresh=True)}")
+                    else:
+                        self.camera.set_parameter(command[1], parse_parameter_value(command[2]))
+                
+                elif cmd == 'burst':
+                    count = int(command[1]) if len(command) > 1 else 5
+                    interval = float(command[2]) if len(command) > 2 else 0.0
+                    directory = command[3] if len(command) > 3 else "burst_capture"
+                    format = command[4] if len(command) > 4 else 'jpg'
+                    self._handle_burst(count, interval, directory, format)
+                
                 elif cmd == 'calibration':
                     if len(command) > 1:
                         self.load_calibration(command[1])
@@ -970,6 +5683,36 @@ class CameraControllerLinux:
   stop_continuous
     - 停止连续拍照
   
+  trigger [off|software|line] [source] [activation]
+    - 设置触发模式，默认 software
+    - source: 线路触发源，默认 Line0
+    - activation: 触发沿，默认 RisingEdge (支持: RisingEdge, FallingEdge, LevelHigh, LevelLow)
+    - 触发模式下连续拍照每个间隔只触发一帧
+    - 示例: trigger line Line0 FallingEdge
+  
+  burst [count] [interval] [directory] [format]
+    - 触发模式下按顺序连拍指定数量的图片
+    - count: 可选，数量，默认 5
+    - interval: 可选，触发间隔（秒），默认 0
+    - directory: 可选，保存目录，默认 burst_capture
+    - 示例: burst 10 0.05 burst jpg
+  
+  roi [width] [height] [offset_x|center] [offset_y]
+    - 设置ROI，只传输所需区域以降低带宽
+    - 尺寸和偏移按相机步长向下对齐，取流中会自动停止、重配并恢复取流
+    - 录像进行中不能修改
+    - 示例: roi 1024 768 center
+  
+  binning [n] [decimation]
+    - 设置水平/垂直合并倍数，可选抽样倍数，设置后ROI复位为最大尺寸
+    - 示例: binning 2
+  
+  param [name] [value]
+    - 不带参数时列出已缓存的相机参数
+    - 只带name时从设备重新读取该参数
+    - 带value时写入参数，与缓存值相同则跳过写入
+    - 示例: param ExposureTime 5000
+  
   calibration [file]
     - 加载相机校准文件（支持 .json 和 .xml）
     - 示例: calibration camera_parameters.xml
@@ -1008,6 +5751,12 @@ class CameraControllerLinux:
             print("-" * 30)
             print(f"  图像尺寸: {self.calibration.image_width}x{self.calibration.image_height}")
             print(f"  重投影误差: {self.calibration.reprojection_error:.6f}")
+            if self.calibration.alpha is not None:
+                new_camera_matrix = self.calibration.get_new_camera_matrix()
+                print(f"  去畸变alpha: {self.calibration.alpha}{'（裁剪到有效区域）' if self.calibration.crop else ''}")
+                if new_camera_matrix is not None:
+                    print(f"  新内参: fx={new_camera_matrix[0, 0]:.2f} fy={new_camera_matrix[1, 1]:.2f} "
+                          f"cx={new_camera_matrix[0, 2]:.2f} cy={new_camera_matrix[1, 2]:.2f}")
         else:
             print("\n未加载校准参数")
     
@@ -1021,11 +5770,34 @@ class CameraControllerLinux:
         print("-" * 30)
         print(f"  连接状态: {'已连接' if self.camera.is_connected else '未连接'}")
         print(f"  取流状态: {'进行中' if self.camera.is_grabbing else '已停止'}")
+        print(f"  取图方式: {self.camera.acquisition_mode}")
+        print(f"  触发模式: {self.camera.trigger_mode}")
+        param_stats = self.camera.parameters.get_stats()
+        print(f"  参数缓存: {param_stats['cached']} 项, 命中 {param_stats['hits']}, "
+              f"未命中 {param_stats['misses']}, 跳过写入 {param_stats['skipped_writes']}")
+        geometry = self.camera.get_image_geometry()
+        print(f"  图像几何: {geometry['width']}x{geometry['height']} "
+              f"偏移({geometry['offset_x']}, {geometry['offset_y']}) "
+              f"合并{geometry['binning_x']}x{geometry['binning_y']} "
+              f"抽样{geometry['decimation_x']}x{geometry['decimation_y']}")
+        print(f"  取图策略: {self.camera.grab_strategy or 'SDK默认'}")
+        print(f"  缓存节点数: {self.camera.image_node_num or 'SDK默认'}")
+        if self.camera.output_queue_size:
+            print(f"  输出队列大小: {self.camera.output_queue_size}")
         print(f"  录像状态: {'进行中' if self.camera.is_recording else '已停止'}")
         print(f"  连续拍照: {'进行中' if self.camera.continuous_capture else '已停止'}")
         if self.camera.continuous_capture:
             print(f"  已拍摄: {self.camera.capture_count} 张")
         print(f"  校准状态: {'已加载' if self.calibration else '未加载'}")
+        for name, stats in self.camera.get_dispatch_stats().items():
+            print(f"  订阅者 {name}: 已投递 {stats['delivered']} 帧, 丢弃 {stats['dropped']} 帧, "
+                  f"积压 {stats['pending']}/{stats['queue_size']} ({stats['drop_policy']})")
+        frame_stats = self.camera.get_frame_stats()
+        print(f"  帧统计: 接收 {frame_stats['received']} 帧, 相机丢帧 {frame_stats['dropped']}, "
+              f"丢包 {frame_stats['lost_packets']}, 残帧 {frame_stats['incomplete_frames']}")
+        pool_stats = self.camera.get_buffer_pool_stats()
+        print(f"  缓冲池: 命中 {pool_stats['hits']} 次, 未命中 {pool_stats['misses']} 次, "
+              f"重新分配 {pool_stats['resizes']} 次")
     
     def _handle_capture(self, filename):
         """处理拍照命令"""
@@ -1037,11 +5809,30 @@ class CameraControllerLinux:
         if not any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']):
             filename += '.jpg'
         
-        image = self.camera.capture_image(filename)
-        if image is not None:
+        frame = self.camera.capture_frame()
+        if frame is None:
+            print("拍照失败")
+            return
+        
+        results, flushed = self._save_images([(frame.image, filename)])
+        error = results.get(filename)
+        if error is None:
             print(f"拍照成功: {filename}")
+        elif flushed:
+            print(f"拍照失败: {filename} {error}")
         else:
-            print("拍照失败")
+            print(f"拍照已提交，但保存未在超时内完成: {filename}")
+    
+    def _save_images(self, images):
+        """提交(image, path)列表并等待写入，返回 ({path: 错误信息}, 是否在超时内写完)；成功写入的path错误信息为None"""
+        results = {}
+        for image, path in images:
+            # 回调未到达前视为未完成，写入成功时被置为None
+            results[path] = "保存未完成"
+            if not self.camera.save_image(image, path, callback=results.__setitem__):
+                results[path] = "保存队列已满，已丢弃"
+        flushed = self.camera.flush_writer()
+        return results, flushed
     
     def _handle_record(self, filename, fps, codec):
         """处理录像命令"""
@@ -1055,6 +5846,30 @@ class CameraControllerLinux:
         else:
             print("启动录像失败")
     
+    def _handle_burst(self, count, interval, directory, format):
+        """处理连拍命令"""
+        frames = self.camera.capture_burst(count, interval)
+        if frames is None:
+            print("连拍失败")
+            return False
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        results, flushed = self._save_images(
+            [(frame.image, os.path.join(directory, f"burst_{timestamp}_{i:03d}.{format}"))
+             for i, frame in enumerate(frames)])
+        errors = {path: error for path, error in results.items() if error is not None}
+        saved = len(results) - len(errors)
+        if not errors:
+            print(f"连拍成功: {saved} 张图片已保存到 {directory}")
+            return True
+        
+        print(f"连拍部分失败: {saved}/{len(results)} 张图片已保存到 {directory}")
+        for path, error in errors.items():
+            print(f"  {os.path.basename(path)}: {error}")
+        if not flushed:
+            print("  保存未在超时内完成，剩余图像仍在后台写入")
+        return False
+    
     def _handle_continuous(self, directory, interval, format, max_count):
         """处理连续拍照命令"""
         if self.camera.start_continuous_capture(directory, interval, format, max_count):
@@ -1069,13 +5884,115 @@ class CameraControllerLinux:
             print("启动连续拍照失败")
 
 
+def parse_parameter_value(text):
+    """解析命令行中的参数值：整数、浮点数、true/false，其余按枚举字符串处理"""
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_device_indices(values):
+    """解析--device参数：'all' 返回None，否则返回索引列表，格式错误返回False"""
+    if [value.lower() for value in values] == ['all']:
+        return None
+    
+    indices = []
+    try:
+        for value in values:
+            indices.extend(int(item) for item in value.split(',') if item.strip())
+    except ValueError:
+        return False
+    return indices or False
+
+
+def writer_options(args):
+    """由命令行参数生成后台保存参数"""
+    return {'workers': args.writer_threads, 'queue_size': args.writer_queue, 'drop_policy': args.writer_policy}
+
+
+def encoding_options(args):
+    """由命令行参数生成编码配置，未指定的单项参数使用--encode-profile的值"""
+    return {'profile': args.encode_profile, 'jpeg_quality': args.jpeg_quality,
+            'jpeg_optimize': args.jpeg_optimize, 'jpeg_progressive': args.jpeg_progressive,
+            'png_compression': args.png_compression, 'webp_quality': args.webp_quality,
+            'tiff_compression': args.tiff_compression}
+
+
+def run_multi_camera(args, calibration, devices, geometry, parameters):
+    """多相机录像/连续拍照"""
+    manager = MultiCameraManager(calibration, process_mode=args.multi_process, backend=args.backend,
+                                 device_cache=args.device_cache)
+    if not manager.open(devices, args.acquisition, args.frame_queue_size, args.record_drop_policy,
+                        args.image_nodes, args.grab_strategy, args.output_queue_size, geometry,
+                        args.zero_copy, not args.raw_frames,
+                        CameraControllerLinux.OUTPUT_PROFILE if args.output_width else None,
+                        writer_options(args), encoding_options(args)):
+        logger.error("相机初始化失败")
+        sys.exit(1)
+    
+    try:
+        for index, camera in manager.cameras.items():
+            if parameters and not camera.apply_parameters(parameters):
+                logger.warning(f"相机 [{index}] 部分参数设置失败")
+            if args.trigger != 'off' and not camera.set_trigger_mode(args.trigger, args.trigger_source,
+                                                                     args.trigger_activation):
+                logger.error(f"相机 [{index}] 设置触发模式失败")
+                return
+        
+        if args.record:
+            started = manager.start_video_recording(args.record, args.fps, args.codec)
+            is_running = lambda: manager.is_recording
+            mode = "录像"
+        else:
+            started = manager.start_continuous_capture(args.continuous, args.interval, args.format, args.max_count)
+            is_running = lambda: manager.continuous_capture
+            mode = "连续拍照"
+        
+        if not started:
+            logger.error(f"部分相机启动{mode}失败")
+        
+        if args.duration:
+            logger.info(f"{len(manager.cameras)} 台相机{mode}将持续 {args.duration} 秒...")
+        else:
+            logger.info(f"{len(manager.cameras)} 台相机{mode}进行中，按 Ctrl+C 停止...")
+        
+        start_time = time.time()
+        try:
+            while is_running():
+                if args.duration and time.time() - start_time >= args.duration:
+                    break
+                time.sleep(1)
+                stats = manager.get_stats()
+                summary = ", ".join(f"[{index}] {camera_stats['fps']:.1f}fps 丢帧{camera_stats['dropped']}"
+                                    for index, camera_stats in stats.items() if index != 'total')
+                logger.info(f"帧率: {summary}")
+        except KeyboardInterrupt:
+            pass
+        
+        stats = manager.get_stats()['total']
+        logger.info(f"合计: 接收 {stats['received']} 帧, 相机端丢帧 {stats['dropped']}, "
+                    f"丢包 {stats['lost_packets']}, 队列丢帧 {stats['queue_dropped']}")
+    finally:
+        manager.close()
+
+
 def main():
     """主函数"""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    # 设置环境变量以避免X11相关错误
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    os.environ['DISPLAY'] = ''
+    
     parser = argparse.ArgumentParser(description='海康威视相机控制程序 - Linux版本')
     parser.add_argument('--calibration', '-c', type=str, 
                        help='校准文件路径 (.json 或 .xml)')
-    parser.add_argument('--device', '-d', type=int, default=0,
-                       help='设备索引，默认0')
+    parser.add_argument('--device', '-d', type=str, nargs='+', default=['0'],
+                       help='设备索引，默认0；录像和连续拍照模式下可指定多个索引（如 0 1 或 0,1）或 all 同时使用多台相机')
     parser.add_argument('--capture', type=str, nargs='?', const='auto',
                        help='拍照模式，可指定文件名')
     parser.add_argument('--record', type=str, nargs='?', const='video.avi',
@@ -1089,11 +6006,101 @@ def main():
     parser.add_argument('--interval', type=float, default=1.0,
                        help='连续拍照间隔（秒），默认1.0')
     parser.add_argument('--format', type=str, default='jpg',
-                       help='连续拍照格式，默认jpg')
+                       help='连续拍照格式（jpg/png/webp/tiff/bmp），默认jpg')
+    parser.add_argument('--encode-profile', type=str, default='balanced', choices=list(ENCODE_PROFILES),
+                       help='保存图像的编码配置: fast 编码最快, balanced 与OpenCV默认画质相当, '
+                            'archival 画质/压缩率优先（PNG、TIFF、WebP明显变慢），默认balanced')
+    parser.add_argument('--jpeg-quality', type=int, default=None,
+                       help='JPEG质量 0~100，默认取编码配置的值')
+    parser.add_argument('--jpeg-optimize', action='store_true', default=None,
+                       help='JPEG使用优化的霍夫曼表（文件更小，编码更慢）')
+    parser.add_argument('--jpeg-progressive', action='store_true', default=None,
+                       help='保存渐进式JPEG')
+    parser.add_argument('--png-compression', type=int, default=None,
+                       help='PNG压缩级别 0~9，指定后不再使用OpenCV的快速默认设置，默认取编码配置的值')
+    parser.add_argument('--webp-quality', type=int, default=None,
+                       help='WebP质量 1~100，大于100为无损，默认取编码配置的值')
+    parser.add_argument('--tiff-compression', type=str, default=None, choices=list(TIFF_COMPRESSION),
+                       help='TIFF压缩方式，默认取编码配置的值')
     parser.add_argument('--max-count', type=int, default=None,
                        help='连续拍照最大数量，默认无限制')
+    parser.add_argument('--trigger', type=str, default='off', choices=['off', 'software', 'line'],
+                       help='触发模式，默认off（自由取流）；触发模式下连续拍照每个间隔只触发一帧')
+    parser.add_argument('--trigger-source', type=str, default='Line0',
+                       help='线路触发源，默认Line0')
+    parser.add_argument('--trigger-activation', type=str, default='RisingEdge',
+                       choices=['RisingEdge', 'FallingEdge', 'LevelHigh', 'LevelLow'],
+                       help='线路触发沿，默认RisingEdge')
+    parser.add_argument('--burst', type=int, default=None,
+                       help='触发连拍模式，指定连拍数量（未指定--trigger时使用软触发）')
+    parser.add_argument('--burst-interval', type=float, default=0.0,
+                       help='连拍触发间隔（秒），默认0')
+    parser.add_argument('--burst-dir', type=str, default='burst_capture',
+                       help='连拍保存目录，默认burst_capture')
     parser.add_argument('--duration', type=int, default=None,
                        help='录像或连续拍照持续时间（秒），默认无限制')
+    parser.add_argument('--acquisition', type=str, default='poll', choices=['poll', 'callback'],
+                       help='取图方式: poll 轮询取图, callback SDK回调推送新帧，默认poll')
+    parser.add_argument('--frame-queue-size', type=int, default=None,
+                       help='录像订阅队列深度，默认32')
+    parser.add_argument('--record-drop-policy', type=str, default=None,
+                       choices=['drop_oldest', 'drop_newest', 'block'],
+                       help='录像订阅队列满时的丢帧策略，默认block')
+    parser.add_argument('--zero-copy', action='store_true',
+                       help='轮询模式下通过SDK图像缓冲区零拷贝取图')
+    parser.add_argument('--image-nodes', type=int, default=None,
+                       help='SDK内部缓存节点数，录像时可加大以缓冲编码卡顿，默认使用SDK默认值')
+    parser.add_argument('--grab-strategy', type=str, default=None,
+                       choices=list(HikvisionCameraLinux.GRAB_STRATEGIES),
+                       help='SDK取图策略: one_by_one 逐帧, latest_only 只取最新帧, '
+                            'latest_n 最新N帧, upcoming 等待下一帧，默认使用SDK默认值')
+    parser.add_argument('--output-queue-size', type=int, default=None,
+                       help='latest_n策略下保留的帧数')
+    parser.add_argument('--roi', type=int, nargs='+', metavar='N', default=None,
+                       help='ROI: 宽 高 [偏移X 偏移Y]，默认全幅')
+    parser.add_argument('--roi-center', action='store_true',
+                       help='ROI居中，忽略偏移')
+    parser.add_argument('--binning', type=int, default=None,
+                       help='水平/垂直合并倍数，如2')
+    parser.add_argument('--decimation', type=int, default=None,
+                       help='水平/垂直抽样倍数，如2')
+    parser.add_argument('--multi-process', action='store_true',
+                       help='多相机模式下每台相机在独立进程中运行，图像经共享内存传回')
+    parser.add_argument('--param', type=str, action='append', default=[], metavar='NAME=VALUE',
+                       help='连接后批量设置相机参数，可重复，如 --param ExposureTime=5000 --param GainAuto=Off')
+    parser.add_argument('--backend', type=str, default='hikvision', choices=list(CAMERA_BACKENDS),
+                       help='相机后端: hikvision 海康威视MVS SDK, opencv OpenCV/V4L2（UVC相机），默认hikvision')
+    parser.add_argument('--undistort-alpha', type=float, default=None,
+                       help='去畸变新内参的alpha(0~1)：0 只保留有效像素，1 保留全部像素，默认沿用原内参')
+    parser.add_argument('--undistort-crop', action='store_true',
+                       help='去畸变输出裁剪到有效区域（需配合--undistort-alpha），减小录像和保存的图像')
+    parser.add_argument('--undistort-threads', type=int, default=0,
+                       help='分带并行去畸变的线程数，0为整帧调用cv2.remap（由OpenCV内部并行），默认0')
+    parser.add_argument('--opencv-threads', type=int, default=None,
+                       help='OpenCV内部线程数(cv2.setNumThreads)，分带去畸变时建议设为1')
+    parser.add_argument('--cache-maps', action='store_true',
+                       help='去畸变映射表以.npy保存在校准文件所在目录，下次启动直接内存映射加载')
+    parser.add_argument('--raw-frames', action='store_true',
+                       help='录像和拍照保存未去畸变的原始帧，测量点坐标通过校准参数单独校正')
+    parser.add_argument('--output-width', type=int, default=None,
+                       help='录像和拍照输出宽度（高度按比例），缩放与去畸变合并为一次remap，需要校准文件')
+    parser.add_argument('--writer-threads', type=int, default=2,
+                       help='拍照后台保存的编码线程数，默认2')
+    parser.add_argument('--writer-queue', type=int, default=16,
+                       help='拍照后台保存队列深度，默认16')
+    parser.add_argument('--writer-policy', type=str, default='block', choices=FrameQueue.DROP_POLICIES,
+                       help='保存队列满时的策略: block 阻塞拍照线程（超时后丢弃）, drop_newest 丢弃新图像, '
+                            'drop_oldest 丢弃最旧的图像，默认block')
+    parser.add_argument('--device-cache', action='store_true',
+                       help='使用磁盘缓存的设备列表跳过枚举，GigE相机按IP直连（打开失败时自动重新枚举）')
+    parser.add_argument('--replay', type=str, default=None, metavar='PATH',
+                       help='回放录像文件或图像目录代替相机，用于离线测试处理流程')
+    parser.add_argument('--replay-pacing', type=str, default='realtime', choices=ReplayBackend.PACING_MODES,
+                       help='回放节奏: realtime 按原始帧间隔, fast 尽快输出, fixed 按--replay-fps，默认realtime')
+    parser.add_argument('--replay-fps', type=float, default=None,
+                       help='回放帧率，fixed节奏和没有时间戳的图像目录使用，默认取录像帧率或30')
+    parser.add_argument('--replay-loop', action='store_true',
+                       help='回放源结束后从头循环')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='详细输出模式')
     
@@ -1105,6 +6112,29 @@ def main():
     
     # 创建控制器
     controller = CameraControllerLinux()
+    controller.cache_maps = args.cache_maps
+    if args.undistort_alpha is not None and not 0 <= args.undistort_alpha <= 1:
+        parser.error('--undistort-alpha 应在 0~1 之间')
+    if args.undistort_crop and args.undistort_alpha is None:
+        parser.error('--undistort-crop 需要同时指定 --undistort-alpha')
+    controller.undistort_alpha = args.undistort_alpha
+    controller.undistort_crop = args.undistort_crop
+    if args.undistort_threads < 0:
+        parser.error('--undistort-threads 不能为负数')
+    controller.undistort_threads = args.undistort_threads
+    controller.opencv_threads = args.opencv_threads
+    if args.output_width is not None and args.output_width <= 0:
+        parser.error('--output-width 必须为正数')
+    controller.output_width = args.output_width
+    if args.writer_threads < 1 or args.writer_queue < 1:
+        parser.error('--writer-threads 和 --writer-queue 必须为正整数')
+    controller.writer_options = writer_options(args)
+    try:
+        for format in ('jpg', 'png', 'webp', 'tiff', args.format):
+            encode_params(format, **encoding_options(args))
+    except ValueError as e:
+        parser.error(str(e))
+    controller.encoding = encoding_options(args)
     
     # 加载校准文件
     if args.calibration:
@@ -1124,14 +6154,72 @@ def main():
                 controller.load_calibration(cal_file)
                 break
     
+    controller.zero_copy = args.zero_copy
+    controller.undistort_frames = not args.raw_frames
+    controller.backend = args.backend
+    controller.device_cache = args.device_cache
+    if args.replay:
+        if args.replay_pacing == 'fixed' and not args.replay_fps:
+            parser.error('--replay-pacing fixed 需要指定 --replay-fps')
+        controller.replay = {'source': args.replay, 'pacing': args.replay_pacing,
+                             'fps': args.replay_fps, 'loop': args.replay_loop}
+    
+    geometry = None
+    if args.roi or args.roi_center or args.binning or args.decimation:
+        if args.roi and len(args.roi) not in (2, 4):
+            parser.error('--roi 需要 2 个(宽 高)或 4 个(宽 高 偏移X 偏移Y)参数')
+        roi = list(args.roi or []) + [None] * 4
+        geometry = {'width': roi[0], 'height': roi[1], 'offset_x': roi[2], 'offset_y': roi[3],
+                    'binning': args.binning, 'decimation': args.decimation, 'center': args.roi_center}
+    
+    # 批量设置的相机参数
+    parameters = {}
+    for item in args.param:
+        name, sep, value = item.partition('=')
+        if not sep:
+            parser.error(f'--param 格式应为 NAME=VALUE: {item}')
+        parameters[name.strip()] = parse_parameter_value(value.strip())
+    
+    # 多相机模式
+    devices = parse_device_indices(args.device)
+    if devices is False:
+        parser.error(f'无效的设备索引: {" ".join(args.device)}')
+    if devices is None or len(devices) > 1:
+        if args.replay:
+            parser.error('回放模式只支持单个设备')
+        if not (args.record or args.continuous):
+            parser.error('多相机模式仅支持 --record 和 --continuous')
+        run_multi_camera(args, controller.calibration, devices, geometry, parameters)
+        return
+    
     # 初始化相机
-    if not controller.initialize_camera(args.device):
+    if not controller.initialize_camera(devices[0], args.acquisition, args.frame_queue_size,
+                                        args.record_drop_policy, args.image_nodes,
+                                        args.grab_strategy, args.output_queue_size, geometry):
         logger.error("相机初始化失败")
         sys.exit(1)
     
+    # 批量设置相机参数
+    if parameters:
+        if not controller.camera.apply_parameters(parameters):
+            logger.warning("部分相机参数设置失败")
+    
+    # 设置触发模式
+    trigger_mode = args.trigger
+    if args.burst and trigger_mode == 'off':
+        trigger_mode = 'software'
+    if trigger_mode != 'off':
+        if not controller.camera.set_trigger_mode(trigger_mode, args.trigger_source, args.trigger_activation):
+            logger.error("设置触发模式失败")
+            controller.camera.disconnect()
+            sys.exit(1)
+    
     # 根据参数执行操作
     try:
-        if args.capture:
+        if args.burst:
+            controller._handle_burst(args.burst, args.burst_interval, args.burst_dir, args.format)
+        
+        elif args.capture:
             filename = args.capture if args.capture != 'auto' else None
             controller._handle_capture(filename)
         
@@ -1145,8 +6233,9 @@ def main():
             else:
                 logger.info("录像进行中，按 Ctrl+C 停止...")
                 try:
-                    while controller.camera.is_recording:
+                    while controller.camera.is_recording and not controller.replay_finished():
                         time.sleep(1)
+                    controller.camera.stop_video_recording()
                 except KeyboardInterrupt:
                     controller.camera.stop_video_recording()
         
@@ -1160,8 +6249,9 @@ def main():
             else:
                 logger.info("连续拍照进行中，按 Ctrl+C 停止...")
                 try:
-                    while controller.camera.continuous_capture:
+                    while controller.camera.continuous_capture and not controller.replay_finished():
                         time.sleep(1)
+                    controller.camera.stop_continuous_capture()
                 except KeyboardInterrupt:
                     controller.camera.stop_continuous_capture()
         
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+模拟相机冒烟测试脚本
+在没有相机和SDK的机器上，用模拟相机(HIK_MOCK=1)跑一遍单相机、多相机、多进程、回放和后台保存流程，
+用于修改主程序后快速验证各条取流路径是否正常
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+# 须在导入主程序前设置，多进程模式的工作进程也会继承这些环境变量
+os.environ['HIK_MOCK'] = '1'
+os.environ.setdefault('HIK_MOCK_DEVICES', '2')
+os.environ.setdefault('HIK_MOCK_WIDTH', '1440')
+os.environ.setdefault('HIK_MOCK_HEIGHT', '1080')
+os.environ.setdefault('HIK_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hikvision_camera_test_mock'))
+
+import cv2
+import numpy as np
+
+import hikvision_camera_controller_linux as camera_module
+from hikvision_camera_controller_linux import (CameraCalibration, HikvisionCameraLinux, ImageWriter,
+                                               MultiCameraManager, ReplayCameraLinux)
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "../calibration/20250910_232046/calibration_result.json")
+
+def load_calibration():
+    """加载仓库自带的校准文件，不存在时返回None（只测试未去畸变的流程）"""
+    if not os.path.exists(CALIBRATION_FILE):
+        logger.warning(f"未找到校准文件: {CALIBRATION_FILE}")
+        return None
+    return CameraCalibration(CALIBRATION_FILE)
+
+def test_single_camera(work_dir):
+    """单相机：取流、去畸变、帧号连续和拍照保存"""
+    logger.info("\n单相机测试:")
+    logger.info("-" * 30)
+    
+    camera = HikvisionCameraLinux(load_calibration())
+    try:
+        if not (camera.discover_devices() and camera.connect(0) and camera.start_grabbing()):
+            logger.error("✗ 模拟相机打开失败")
+            return False
+        
+        frame = camera.capture_frame()
+        if frame is None:
+            logger.error("✗ 取图失败")
+            return False
+        logger.info(f"✓ 取图成功: {frame.image.shape}, 校准版本 {frame.calibration_version}")
+        
+        numbers = []
+        for _ in range(10):
+            frame = camera.get_image_buffer(zero_copy=False)
+            if frame is not None:
+                numbers.append(frame.frame_number)
+        if numbers != list(range(numbers[0], numbers[0] + 10)):
+            logger.error(f"✗ 帧号不连续: {numbers}")
+            return False
+        logger.info(f"✓ 帧号连续: {numbers[0]}~{numbers[-1]}")
+        
+        path = os.path.join(work_dir, "single.jpg")
+        if camera.capture_image(path) is None or not camera.flush_writer() or not os.path.exists(path):
+            logger.error("✗ 拍照保存失败")
+            return False
+        logger.info(f"✓ 拍照已保存: {path}")
+        return True
+    finally:
+        camera.disconnect()
+
+def test_timeout_injection():
+    """注入取图超时：超时的帧留到下一次取图，帧号不跳变"""
+    logger.info("\n超时注入测试:")
+    logger.info("-" * 30)
+    
+    camera_module.MockMvCamera.configure(timeout_every=4)
+    camera = HikvisionCameraLinux()
+    try:
+        if not (camera.discover_devices() and camera.connect(0) and camera.start_grabbing()):
+            logger.error("✗ 模拟相机打开失败")
+            return False
+        
+        results = [camera.get_image_buffer(timeout=200, zero_copy=False) for _ in range(12)]
+        numbers = [frame.frame_number for frame in results if frame is not None]
+        timeouts = results.count(None)
+        if not timeouts or numbers != list(range(numbers[0], numbers[0] + len(numbers))):
+            logger.error(f"✗ 超时 {timeouts} 次, 帧号: {numbers}")
+            return False
+        logger.info(f"✓ 超时 {timeouts} 次, 帧号连续: {numbers[0]}~{numbers[-1]}")
+        return True
+    finally:
+        camera.disconnect()
+        camera_module.MockMvCamera.configure(timeout_every=0)
+
+def test_multi_camera(process_mode):
+    """多相机：同时打开全部模拟设备并取同步帧"""
+    mode = "多进程" if process_mode else "多线程"
+    logger.info(f"\n多相机测试（{mode}）:")
+    logger.info("-" * 30)
+    
+    manager = MultiCameraManager(load_calibration(), process_mode=process_mode)
+    try:
+        if not manager.open():
+            logger.error("✗ 打开相机失败")
+            return False
+        
+        group = None
+        deadline = time.time() + 5.0
+        while group is None and time.time() < deadline:
+            time.sleep(0.2)
+            group = manager.get_synchronized_frames(timestamp='host')
+        if group is None or len(group) != len(manager.cameras):
+            logger.error(f"✗ 未取到 {len(manager.cameras)} 台相机的同步帧")
+            return False
+        
+        for index, frame in sorted(group.items()):
+            logger.info(f"  [{index}] {frame.image.shape}, 帧号 {frame.frame_number}, "
+                        f"校准版本 {frame.calibration_version}")
+        stats = manager.get_stats()['total']
+        logger.info(f"✓ 同步帧 {len(group)} 台相机, 合计 {stats['fps']:.1f} fps, 丢帧 {stats['dropped']}")
+        return True
+    finally:
+        manager.close()
+
+def test_replay(work_dir):
+    """回放：用合成图像目录代替相机，按fast节奏取完全部帧"""
+    logger.info("\n回放测试:")
+    logger.info("-" * 30)
+    
+    source = os.path.join(work_dir, "replay")
+    os.makedirs(source)
+    count = 5
+    for i in range(count):
+        image = np.full((480, 640, 3), i * 40, np.uint8)
+        cv2.imwrite(os.path.join(source, f"frame_{i:03d}.png"), image)
+    
+    camera = ReplayCameraLinux(source, pacing='fast')
+    try:
+        if not (camera.discover_devices() and camera.connect(0) and camera.start_grabbing()):
+            logger.error("✗ 打开回放源失败")
+            return False
+        
+        frames = []
+        while not camera.replay_finished and len(frames) < count * 2:
+            frame = camera.capture_frame()
+            if frame is not None:
+                frames.append(frame)
+        if len(frames) != count or frames[0].image.shape != (480, 640, 3):
+            logger.error(f"✗ 回放帧数 {len(frames)}，应为 {count}")
+            return False
+        logger.info(f"✓ 回放 {len(frames)} 帧: {frames[0].image.shape}")
+        return True
+    finally:
+        camera.disconnect()
+
+def test_writer(work_dir):
+    """后台保存：全部写入，以及队列满时按drop_newest丢弃"""
+    logger.info("\n后台保存测试:")
+    logger.info("-" * 30)
+    
+    image = np.zeros((1080, 1440, 3), np.uint8)
+    writer = ImageWriter(workers=2, queue_size=4, drop_policy='block')
+    paths = [os.path.join(work_dir, "writer", f"{i:03d}.png") for i in range(8)]
+    for path in paths:
+        writer.submit(image, path)
+    flushed = writer.flush(timeout=30)
+    writer.close()
+    stats = writer.get_stats()
+    if not flushed or stats['written'] != len(paths) or not all(os.path.exists(path) for path in paths):
+        logger.error(f"✗ 保存不完整: {stats}")
+        return False
+    logger.info(f"✓ 已保存 {stats['written']} 张")
+    
+    results = {}
+    writer = ImageWriter(workers=1, queue_size=1, drop_policy='drop_newest')
+    accepted = sum(writer.submit(image, os.path.join(work_dir, "dropped", f"{i:03d}.png"),
+                                 callback=results.__setitem__) for i in range(10))
+    writer.close()
+    stats = writer.get_stats()
+    if stats['written'] + stats['dropped'] != 10 or len(results) != 10 or accepted != stats['written']:
+        logger.error(f"✗ 丢弃统计不一致: 接受 {accepted}, 回调 {len(results)}, {stats}")
+        return False
+    logger.info(f"✓ 队列满时丢弃 {stats['dropped']} 张, 保存 {stats['written']} 张")
+    return True
+
+def main():
+    """主函数"""
+    logger.info("开始模拟相机冒烟测试...")
+    
+    work_dir = tempfile.mkdtemp(prefix='hik_test_mock_')
+    tests = [
+        ("单相机", lambda: test_single_camera(work_dir)),
+        ("超时注入", test_timeout_injection),
+        ("多相机", lambda: test_multi_camera(False)),
+        ("多进程", lambda: test_multi_camera(True)),
+        ("回放", lambda: test_replay(work_dir)),
+        ("后台保存", lambda: test_writer(work_dir)),
+    ]
+    
+    results = {}
+    try:
+        for name, test in tests:
+            try:
+                results[name] = test()
+            except Exception as e:
+                logger.error(f"✗ {name}测试出错: {e}")
+                results[name] = False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    logger.info("\n" + "=" * 50)
+    for name, passed in results.items():
+        logger.info(f"{'✓' if passed else '✗'} {name}")
+    logger.info("测试完成")
+    logger.info("=" * 50)
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
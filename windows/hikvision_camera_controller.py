@@ -41,6 +41,8 @@ class CameraCalibration:
         self.image_width = None
         self.image_height = None
         self.reprojection_error = None
+        # (输入尺寸, 输出尺寸) -> 去畸变并缩放的映射表
+        self._maps = {}
         
         if calibration_file:
             self.load_calibration(calibration_file)
@@ -54,6 +56,7 @@ class CameraCalibration:
                 self._load_from_xml(calibration_file)
             else:
                 raise ValueError("不支持的校准文件格式")
+            self._maps = {}
             
             print(f"成功加载校准参数：{calibration_file}")
             print(f"图像尺寸：{self.image_width} x {self.image_height}")
@@ -88,12 +91,31 @@ class CameraCalibration:
         
         fs.release()
     
-    def undistort_image(self, image):
-        """图像去畸变"""
+    def undistort_image(self, image, output_size=None):
+        """图像去畸变，指定output_size (宽, 高)时缩放合并在同一次remap中完成"""
         if self.camera_matrix is None or self.distortion_coefficients is None:
+            if output_size and output_size != (image.shape[1], image.shape[0]):
+                return cv2.resize(image, output_size, interpolation=cv2.INTER_AREA)
             return image
         
-        return cv2.undistort(image, self.camera_matrix, self.distortion_coefficients)
+        if output_size is None:
+            return cv2.undistort(image, self.camera_matrix, self.distortion_coefficients)
+        
+        size = (image.shape[1], image.shape[0])
+        maps = self._maps.get((size, output_size))
+        if maps is None:
+            # 输出内参按缩放比例换算（像素中心对齐），映射表直接从原始像素采样到输出尺寸
+            scale_x = output_size[0] / size[0]
+            scale_y = output_size[1] / size[1]
+            new_camera_matrix = self.camera_matrix.copy()
+            new_camera_matrix[0, :2] *= scale_x
+            new_camera_matrix[1, 1] *= scale_y
+            new_camera_matrix[0, 2] = (self.camera_matrix[0, 2] + 0.5) * scale_x - 0.5
+            new_camera_matrix[1, 2] = (self.camera_matrix[1, 2] + 0.5) * scale_y - 0.5
+            maps = cv2.initUndistortRectifyMap(self.camera_matrix, self.distortion_coefficients, None,
+                                               new_camera_matrix, output_size, cv2.CV_16SC2)
+            self._maps[(size, output_size)] = maps
+        return cv2.remap(image, maps[0], maps[1], cv2.INTER_LINEAR)
 
 
 class HikvisionCamera:
@@ -210,8 +232,11 @@ class HikvisionCamera:
             print("停止取流")
         return True
     
-    def capture_image(self, save_path=None, apply_calibration=True):
-        """捕获单张图像"""
+    def capture_image(self, save_path=None, apply_calibration=True, max_width=None):
+        """捕获单张图像
+
+        max_width: 宽度超过时按比例缩小（预览用），Mono8/RGB8先在原始数据上去畸变并缩放，再对缩小后的图像转换颜色
+        """
         if not self.is_grabbing:
             print("设备未开始取流")
             return None
@@ -231,15 +256,24 @@ class HikvisionCamera:
             # 转换为numpy数组
             image_data = np.frombuffer(pData, dtype=np.uint8, count=stFrameInfo.nFrameLen)
             
-            # 根据像素格式转换图像
+            # 输出尺寸
+            output_size = None
+            if max_width and stFrameInfo.nWidth > max_width:
+                output_size = (max_width, int(stFrameInfo.nHeight * max_width / stFrameInfo.nWidth))
+            calibration = self.calibration if apply_calibration else None
+            
+            # 根据像素格式转换图像，去畸变和缩放在颜色转换之前完成
             if stFrameInfo.enPixelType == PixelType_Gvsp_Mono8:
                 image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth))
+                image = self._undistort_resize(image, calibration, output_size)
                 image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
             elif stFrameInfo.enPixelType == PixelType_Gvsp_RGB8_Packed:
                 image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
+                image = self._undistort_resize(image, calibration, output_size)
                 image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
             elif stFrameInfo.enPixelType == PixelType_Gvsp_BGR8_Packed:
                 image = image_data.reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
+                image = self._undistort_resize(image, calibration, output_size)
             else:
                 # 其他格式转换为BGR
                 nConvertSize = stFrameInfo.nWidth * stFrameInfo.nHeight * 3
@@ -262,10 +296,7 @@ class HikvisionCamera:
                     return None
                 
                 image = np.frombuffer(pConvertData, dtype=np.uint8).reshape((stFrameInfo.nHeight, stFrameInfo.nWidth, 3))
-            
-            # 应用校准参数进行去畸变
-            if apply_calibration and self.calibration:
-                image = self.calibration.undistort_image(image)
+                image = self._undistort_resize(image, calibration, output_size)
             
             # 保存图像
             if save_path:
@@ -278,6 +309,14 @@ class HikvisionCamera:
             print(f"捕获图像时发生错误：{e}")
             return None
     
+    def _undistort_resize(self, image, calibration, output_size):
+        """去畸变并缩放到output_size，两者合并为一次remap"""
+        if calibration:
+            return calibration.undistort_image(image, output_size)
+        if output_size:
+            return cv2.resize(image, output_size, interpolation=cv2.INTER_AREA)
+        return image
+    
     def start_video_recording(self, output_path, fps=30, codec='XVID'):
         """开始录像"""
         if self.is_recording:
@@ -596,16 +635,9 @@ class CameraController:
         print("进入预览模式，按 'q' 键退出...")
         
         while True:
-            image = self.camera.capture_image(apply_calibration=True)
+            # 缩放到适应显示的宽度，与去畸变在同一次remap中完成
+            image = self.camera.capture_image(apply_calibration=True, max_width=1280)
             if image is not None:
-                # 缩放图像以适应显示
-                height, width = image.shape[:2]
-                if width > 1280:
-                    scale = 1280 / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    image = cv2.resize(image, (new_width, new_height))
-                
                 cv2.imshow('Camera Preview', image)
                 
                 if cv2.waitKey(1) & 0xFF == ord('q'):